@@ -0,0 +1,77 @@
+"""
+factories
+------------
+
+Rows shared by the tests of `django-inspire-eu`.
+"""
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.utils import timezone
+
+from inspire_eu.models import ApplicationSchema, CodeList, CodeListValue, Status, UnitOfMeasure
+
+
+def create_code_list_values(schema_code, values):
+    """Code list values of a ``{code_list: [code, ...]}`` dict, by code"""
+    status, _created = Status.objects.get_or_create(
+        slug="valid",
+        defaults=dict({"label": "valid", "link": "https://example.com/valid"}),
+    )
+    schema = ApplicationSchema.objects.create(
+        code=schema_code,
+        label=schema_code,
+        link=f"https://example.com/{schema_code}",
+        status=status,
+    )
+    created = dict()
+    for code_list_code, codes in values.items():
+        code_list = CodeList.objects.create(
+            code=code_list_code,
+            label=code_list_code,
+            link=f"https://example.com/{code_list_code}",
+            status=status,
+            application_schema=schema,
+        )
+        for code in codes:
+            created[code] = CodeListValue.objects.create(
+                code_list=code_list,
+                code=code,
+                label=code,
+                link=f"https://example.com/{code_list_code}/{code}",
+                status=status,
+            )
+    return created
+
+
+def create_building_code_list_values():
+    UnitOfMeasure.objects.get_or_create(symbol="m", defaults=dict({"name": "metre", "measure_type": "length"}))
+    return create_code_list_values(
+        "bu",
+        dict(
+            {
+                "ConditionOfConstructionValue": ["functional"],
+                "CurrentUseValue": ["residential", "commerceAndServices"],
+                "ElevationReferenceValue": ["generalRoof", "lowestGroundPoint"],
+                "HeightStatusValue": ["measured"],
+                "HorizontalGeometryReferenceValue": ["footPrint"],
+                "OtherConstructionNatureValue": ["bridge"],
+            },
+        ),
+    )
+
+
+def create_building(namespace, values, local_id, bbox=(-3.7, 40.4, -3.699, 40.401), **kwargs):
+    """Building saved with the values of :func:`create_building_code_list_values`"""
+    from inspire_eu.models.buildings import Building
+
+    kwargs.setdefault("begin_lifespan_version", timezone.now())
+    return Building.objects.create(
+        namespace=namespace,
+        local_id=local_id,
+        condition_of_construction=values["functional"],
+        geometry=MultiPolygon(Polygon.from_bbox(bbox), srid=4326),
+        reference_geometry=True,
+        horizontal_geometry_reference=values["footPrint"],
+        horizontal_geometry_estimated_accuracy=1,
+        **kwargs,
+    )
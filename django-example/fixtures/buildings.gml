@@ -0,0 +1,121 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:base="http://inspire.ec.europa.eu/schemas/base/3.3"
+    xmlns:bu-base="http://inspire.ec.europa.eu/schemas/bu-base/4.0"
+    xmlns:bu-core2d="http://inspire.ec.europa.eu/schemas/bu-core2d/4.0"
+    xmlns:bu-ext2d="http://inspire.ec.europa.eu/schemas/bu-ext2d/4.0">
+  <gml:featureMember>
+    <bu-core2d:Building gml:id="ES.SDGC.BU.B1">
+      <bu-base:inspireId>
+        <base:Identifier>
+          <base:localId>B1</base:localId>
+          <base:namespace>ES.SDGC.BU</base:namespace>
+        </base:Identifier>
+      </bu-base:inspireId>
+      <bu-base:beginLifespanVersion>2020-01-01T00:00:00</bu-base:beginLifespanVersion>
+      <bu-base:conditionOfConstruction xlink:href="http://inspire.ec.europa.eu/codelist/ConditionOfConstructionValue/functional"/>
+      <bu-base:currentUse>
+        <bu-base:CurrentUse>
+          <bu-base:currentUse xlink:href="http://inspire.ec.europa.eu/codelist/CurrentUseValue/residential"/>
+          <bu-base:percentage>100</bu-base:percentage>
+        </bu-base:CurrentUse>
+      </bu-base:currentUse>
+      <bu-base:numberOfFloorsAboveGround>3</bu-base:numberOfFloorsAboveGround>
+      <bu-core2d:geometry2D>
+        <bu-base:BuildingGeometry2D>
+          <bu-base:geometry>
+            <gml:MultiSurface srsName="EPSG:4326">
+              <gml:surfaceMember>
+                <gml:Polygon>
+                  <gml:exterior>
+                    <gml:LinearRing>
+                      <gml:posList>-3.7 40.4 -3.699 40.4 -3.699 40.401 -3.7 40.401 -3.7 40.4</gml:posList>
+                    </gml:LinearRing>
+                  </gml:exterior>
+                </gml:Polygon>
+              </gml:surfaceMember>
+            </gml:MultiSurface>
+          </bu-base:geometry>
+          <bu-base:referenceGeometry>true</bu-base:referenceGeometry>
+          <bu-base:horizontalGeometryReference xlink:href="http://inspire.ec.europa.eu/codelist/HorizontalGeometryReferenceValue/footPrint"/>
+          <bu-base:horizontalGeometryEstimatedAccuracy uom="m">0.5</bu-base:horizontalGeometryEstimatedAccuracy>
+        </bu-base:BuildingGeometry2D>
+      </bu-core2d:geometry2D>
+      <bu-core2d:parts xlink:href="#ES.SDGC.BU.B1_part1"/>
+      <bu-core2d:parts>
+        <bu-core2d:BuildingPart gml:id="ES.SDGC.BU.B1_part2">
+          <bu-base:inspireId>
+            <base:Identifier>
+              <base:localId>B1_part2</base:localId>
+              <base:namespace>ES.SDGC.BU</base:namespace>
+            </base:Identifier>
+          </bu-base:inspireId>
+          <bu-base:beginLifespanVersion>2020-01-01T00:00:00</bu-base:beginLifespanVersion>
+          <bu-base:conditionOfConstruction xlink:href="http://inspire.ec.europa.eu/codelist/ConditionOfConstructionValue/functional"/>
+          <bu-core2d:geometry2D>
+            <bu-base:BuildingGeometry2D>
+              <bu-base:geometry>
+                <gml:MultiSurface srsName="EPSG:4326">
+                  <gml:surfaceMember>
+                    <gml:Polygon>
+                      <gml:exterior>
+                        <gml:LinearRing>
+                          <gml:posList>-3.6995 40.4 -3.699 40.4 -3.699 40.401 -3.6995 40.401 -3.6995 40.4</gml:posList>
+                        </gml:LinearRing>
+                      </gml:exterior>
+                    </gml:Polygon>
+                  </gml:surfaceMember>
+                </gml:MultiSurface>
+              </bu-base:geometry>
+              <bu-base:referenceGeometry>true</bu-base:referenceGeometry>
+              <bu-base:horizontalGeometryReference xlink:href="http://inspire.ec.europa.eu/codelist/HorizontalGeometryReferenceValue/footPrint"/>
+            </bu-base:BuildingGeometry2D>
+          </bu-core2d:geometry2D>
+        </bu-core2d:BuildingPart>
+      </bu-core2d:parts>
+    </bu-core2d:Building>
+  </gml:featureMember>
+  <gml:featureMember>
+    <bu-core2d:BuildingPart gml:id="ES.SDGC.BU.B1_part1">
+      <bu-base:inspireId>
+        <base:Identifier>
+          <base:localId>B1_part1</base:localId>
+          <base:namespace>ES.SDGC.BU</base:namespace>
+        </base:Identifier>
+      </bu-base:inspireId>
+      <bu-base:beginLifespanVersion>2020-01-01T00:00:00</bu-base:beginLifespanVersion>
+      <bu-base:conditionOfConstruction xlink:href="http://inspire.ec.europa.eu/codelist/ConditionOfConstructionValue/functional"/>
+      <bu-core2d:geometry2D>
+        <bu-base:BuildingGeometry2D>
+          <bu-base:geometry>
+            <gml:MultiSurface srsName="EPSG:4326">
+              <gml:surfaceMember>
+                <gml:Polygon>
+                  <gml:exterior>
+                    <gml:LinearRing>
+                      <gml:posList>-3.7 40.4 -3.6995 40.4 -3.6995 40.401 -3.7 40.401 -3.7 40.4</gml:posList>
+                    </gml:LinearRing>
+                  </gml:exterior>
+                </gml:Polygon>
+              </gml:surfaceMember>
+            </gml:MultiSurface>
+          </bu-base:geometry>
+          <bu-base:referenceGeometry>true</bu-base:referenceGeometry>
+          <bu-base:horizontalGeometryReference xlink:href="http://inspire.ec.europa.eu/codelist/HorizontalGeometryReferenceValue/footPrint"/>
+        </bu-base:BuildingGeometry2D>
+      </bu-core2d:geometry2D>
+    </bu-core2d:BuildingPart>
+  </gml:featureMember>
+  <gml:featureMember>
+    <bu-ext2d:OtherConstruction gml:id="ES.SDGC.BU.OC1">
+      <bu-base:inspireId>
+        <base:Identifier>
+          <base:localId>OC1</base:localId>
+          <base:namespace>ES.SDGC.BU</base:namespace>
+        </base:Identifier>
+      </bu-base:inspireId>
+      <bu-base:conditionOfConstruction xlink:href="http://inspire.ec.europa.eu/codelist/ConditionOfConstructionValue/functional"/>
+      <bu-ext2d:otherConstructionNature xlink:href="http://inspire.ec.europa.eu/codelist/OtherConstructionNatureValue/bridge"/>
+    </bu-ext2d:OtherConstruction>
+  </gml:featureMember>
+</gml:FeatureCollection>
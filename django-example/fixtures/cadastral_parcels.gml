@@ -0,0 +1,119 @@
+<?xml version="1.0" encoding="UTF-8"?>
+<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml/3.2" xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:base="http://inspire.ec.europa.eu/schemas/base/3.3" xmlns:cp="http://inspire.ec.europa.eu/schemas/cp/4.0">
+  <gml:featureMember>
+    <cp:CadastralZoning gml:id="ES.SDGC.CP.Z.Z1">
+      <cp:beginLifespanVersion>2020-01-01T00:00:00</cp:beginLifespanVersion>
+      <cp:estimatedAccuracy uom="m">0.5</cp:estimatedAccuracy>
+      <cp:geometry>
+        <gml:MultiSurface srsName="EPSG:4326">
+          <gml:surfaceMember>
+            <gml:Polygon>
+              <gml:exterior>
+                <gml:LinearRing>
+                  <gml:posList>-3.71 40.39 -3.69 40.39 -3.69 40.41 -3.71 40.41 -3.71 40.39</gml:posList>
+                </gml:LinearRing>
+              </gml:exterior>
+            </gml:Polygon>
+          </gml:surfaceMember>
+        </gml:MultiSurface>
+      </cp:geometry>
+      <cp:inspireId>
+        <base:Identifier>
+          <base:localId>Z1</base:localId>
+          <base:namespace>ES.SDGC.CP.Z</base:namespace>
+        </base:Identifier>
+      </cp:inspireId>
+      <cp:label>Z1</cp:label>
+      <cp:nationalCadastalZoningReference>Z1</cp:nationalCadastalZoningReference>
+    </cp:CadastralZoning>
+  </gml:featureMember>
+  <gml:featureMember>
+    <cp:CadastralZoning gml:id="ES.SDGC.CP.Z.Z2">
+      <cp:beginLifespanVersion>2020-01-01T00:00:00</cp:beginLifespanVersion>
+      <cp:estimatedAccuracy uom="m">0.5</cp:estimatedAccuracy>
+      <cp:geometry>
+        <gml:MultiSurface srsName="EPSG:4326">
+          <gml:surfaceMember>
+            <gml:Polygon>
+              <gml:exterior>
+                <gml:LinearRing>
+                  <gml:posList>-3.71 40.39 -3.7 40.39 -3.7 40.4 -3.71 40.4 -3.71 40.39</gml:posList>
+                </gml:LinearRing>
+              </gml:exterior>
+            </gml:Polygon>
+          </gml:surfaceMember>
+        </gml:MultiSurface>
+      </cp:geometry>
+      <cp:inspireId>
+        <base:Identifier>
+          <base:localId>Z2</base:localId>
+          <base:namespace>ES.SDGC.CP.Z</base:namespace>
+        </base:Identifier>
+      </cp:inspireId>
+      <cp:label>Z2</cp:label>
+      <cp:nationalCadastalZoningReference>Z2</cp:nationalCadastalZoningReference>
+      <cp:upperLevelUnit xlink:href="#ES.SDGC.CP.Z.Z1"/>
+    </cp:CadastralZoning>
+  </gml:featureMember>
+  <gml:featureMember>
+    <cp:CadastralParcel gml:id="ES.SDGC.CP.P1">
+      <cp:areaValue uom="m2">100</cp:areaValue>
+      <cp:beginLifespanVersion>2020-01-01T00:00:00</cp:beginLifespanVersion>
+      <cp:geometry>
+        <gml:MultiSurface srsName="EPSG:4326">
+          <gml:surfaceMember>
+            <gml:Polygon>
+              <gml:exterior>
+                <gml:LinearRing>
+                  <gml:posList>-3.709 40.391 -3.708 40.391 -3.708 40.392 -3.709 40.392 -3.709 40.391</gml:posList>
+                </gml:LinearRing>
+              </gml:exterior>
+            </gml:Polygon>
+          </gml:surfaceMember>
+        </gml:MultiSurface>
+      </cp:geometry>
+      <cp:inspireId>
+        <base:Identifier>
+          <base:localId>P1</base:localId>
+          <base:namespace>ES.SDGC.CP</base:namespace>
+        </base:Identifier>
+      </cp:inspireId>
+      <cp:label>1</cp:label>
+      <cp:nationalCadastralReference>P1</cp:nationalCadastralReference>
+      <cp:referencePoint>
+        <gml:Point srsName="EPSG:4326">
+          <gml:pos>-3.7085 40.3915</gml:pos>
+        </gml:Point>
+      </cp:referencePoint>
+      <cp:zoning xlink:href="#ES.SDGC.CP.Z.Z2"/>
+    </cp:CadastralParcel>
+  </gml:featureMember>
+  <gml:featureMember>
+    <cp:CadastralParcel gml:id="ES.SDGC.CP.P2">
+      <cp:areaValue uom="m2">100</cp:areaValue>
+      <cp:beginLifespanVersion>2020-01-01T00:00:00</cp:beginLifespanVersion>
+      <cp:geometry>
+        <gml:MultiSurface srsName="EPSG:4326">
+          <gml:surfaceMember>
+            <gml:Polygon>
+              <gml:exterior>
+                <gml:LinearRing>
+                  <gml:posList>-3.699 40.401 -3.698 40.401 -3.698 40.402 -3.699 40.402 -3.699 40.401</gml:posList>
+                </gml:LinearRing>
+              </gml:exterior>
+            </gml:Polygon>
+          </gml:surfaceMember>
+        </gml:MultiSurface>
+      </cp:geometry>
+      <cp:inspireId>
+        <base:Identifier>
+          <base:localId>P2</base:localId>
+          <base:namespace>ES.SDGC.CP</base:namespace>
+        </base:Identifier>
+      </cp:inspireId>
+      <cp:label>2</cp:label>
+      <cp:nationalCadastralReference>P2</cp:nationalCadastralReference>
+    </cp:CadastralParcel>
+  </gml:featureMember>
+</gml:FeatureCollection>
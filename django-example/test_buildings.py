@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_buildings
+------------
+
+Tests for `django-inspire-eu` buildings theme.
+"""
+
+import datetime
+import io
+from unittest import mock
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase
+
+from inspire_eu.models import Namespace
+from inspire_eu.models.buildings import (
+    Building,
+    BuildingCurrentUse,
+    BuildingHeightAboveGround,
+    BuildingSummary,
+)
+from inspire_eu.models.buildings.managers import BuildingQuerySet
+from inspire_eu.models.buildings.summary import (
+    INSPIRE_EU_BUILDING_SUMMARY,
+    building_changed,
+    building_child_changed,
+    connect_signals,
+    summary_signals_disabled,
+)
+from inspire_eu.models.cache import code_list_value_cache
+from inspire_eu.models.cadastral_parcels import CadastralParcel
+
+from .factories import create_building, create_building_code_list_values
+
+
+class BuildingTestCase(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        self.values = create_building_code_list_values()
+        self.namespace = Namespace.objects.create(code="ES.SDGC.BU")
+
+    def create_building(self, local_id, **kwargs):
+        return create_building(self.namespace, self.values, local_id, **kwargs)
+
+    def add_height(self, building, value):
+        return BuildingHeightAboveGround.objects.create(
+            building=building,
+            height_reference=self.values["generalRoof"],
+            low_reference=self.values["lowestGroundPoint"],
+            status=self.values["measured"],
+            value=value,
+        )
+
+    def add_current_use(self, building, code, percentage):
+        return BuildingCurrentUse.objects.create(
+            building=building,
+            current_use=self.values[code],
+            percentage=percentage,
+        )
+
+
+class TestBuildingSummary(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        if not INSPIRE_EU_BUILDING_SUMMARY:
+            connect_signals()
+            self.addCleanup(self.disconnect_signals)
+
+    def disconnect_signals(self):
+        post_save.disconnect(building_changed, sender=Building, dispatch_uid="inspire_eu_bu_summary")
+        for model in (BuildingCurrentUse, BuildingHeightAboveGround):
+            uid = f"inspire_eu_bu_summary_{model._meta.model_name}"
+            post_save.disconnect(building_child_changed, sender=model, dispatch_uid=uid)
+            post_delete.disconnect(building_child_changed, sender=model, dispatch_uid=uid)
+
+    def test_refresh(self):
+        building = self.create_building("1", number_of_floors_above_ground=3)
+        self.add_current_use(building, "residential", 20)
+        self.add_current_use(building, "commerceAndServices", 80)
+        self.add_height(building, 10)
+        self.add_height(building, 12)
+        BuildingSummary.objects.refresh()
+        summary = BuildingSummary.objects.get()
+        self.assertEqual(summary.building_id, building.pk)
+        self.assertEqual(summary.local_id, "1")
+        self.assertEqual(summary.condition_of_construction, "functional")
+        self.assertEqual(summary.current_use, "commerceAndServices")
+        self.assertEqual(summary.height_above_ground, 12)
+        self.assertEqual(summary.number_of_floors_above_ground, 3)
+        self.assertGreater(summary.footprint_area, 0)
+
+    def test_refreshed_once_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            building = self.create_building("1")
+        self.assertEqual(BuildingSummary.objects.get().height_above_ground, None)
+        with mock.patch.object(BuildingSummary.objects, "refresh", wraps=BuildingSummary.objects.refresh) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for value in (10, 15, 12):
+                        self.add_height(building, value)
+                    self.add_current_use(building, "residential", 100)
+                    # Not refreshed before the commit
+                    refresh.assert_not_called()
+        refresh.assert_called_once_with([building.pk])
+        summary = BuildingSummary.objects.get()
+        self.assertEqual(summary.height_above_ground, 15)
+        self.assertEqual(summary.current_use, "residential")
+
+    def test_deleted_building(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            building = self.create_building("1")
+            self.add_height(building, 10)
+            self.add_current_use(building, "residential", 100)
+        self.assertEqual(BuildingSummary.objects.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                BuildingHeightAboveGround.objects.filter(building=building).delete()
+                BuildingCurrentUse.objects.filter(building=building).delete()
+                building.delete()
+        self.assertFalse(BuildingSummary.objects.exists())
+
+    def test_signals_disabled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            building = self.create_building("1")
+        with mock.patch.object(BuildingSummary.objects, "refresh") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                with summary_signals_disabled():
+                    self.add_height(building, 10)
+        refresh.assert_not_called()
+
+
+class TestLinkCadastralParcels(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.new = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.building = self.create_building("1", bbox=(0, 0, 2, 2), begin_lifespan_version=self.old)
+        self.other = self.create_building("2", bbox=(10, 10, 11, 11), begin_lifespan_version=self.new)
+        self.left = self.create_parcel("1", (0, 0, 1, 2))
+        self.right = self.create_parcel("2", (1, 0, 2, 2))
+        self.under_other = self.create_parcel("3", (10, 10, 12, 12))
+
+    def create_parcel(self, local_id, bbox):
+        return CadastralParcel.objects.create(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.old,
+            label=local_id,
+            national_cadastral_reference=local_id,
+            geometry=MultiPolygon(Polygon.from_bbox(bbox), srid=4326),
+        )
+
+    def get_links(self, building):
+        return set(building.cadastral_parcels.values_list("pk", flat=True))
+
+    def test_link(self):
+        stats = Building.objects.link_cadastral_parcels()
+        self.assertEqual((stats["read"], stats["created"], stats["removed"]), (2, 3, 0))
+        self.assertEqual(self.get_links(self.building), {self.left.pk, self.right.pk})
+        self.assertEqual(self.get_links(self.other), {self.under_other.pk})
+        # Nothing written again
+        stats = Building.objects.link_cadastral_parcels()
+        self.assertEqual((stats["created"], stats["removed"]), (0, 0))
+        # Each parcel covers half of the building
+        stats = Building.objects.link_cadastral_parcels(min_overlap=0.6, remove=False)
+        self.assertEqual(self.get_links(self.building), {self.left.pk, self.right.pk})
+        stats = Building.objects.link_cadastral_parcels(min_overlap=0.6)
+        self.assertEqual(stats["removed"], 2)
+        self.assertEqual(self.get_links(self.building), set())
+
+    def test_changed_since(self):
+        since = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(list(Building.objects.changed_since(since)), [self.other])
+        CadastralParcel.objects.filter(pk=self.left.pk).update(begin_lifespan_version=self.new)
+        self.assertIn(self.building, Building.objects.changed_since(since))
+        stats = Building.objects.link_cadastral_parcels(since=since)
+        self.assertEqual(self.get_links(self.building), {self.left.pk, self.right.pk})
+        self.assertEqual(stats["read"], Building.objects.changed_since(since).count())
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command("link_cadastral_parcels", "building", "--since", "2023-01-01", stdout=stdout)
+        self.assertIn("Building: 1 read, 1 links created", stdout.getvalue())
+        self.assertEqual(self.get_links(self.other), {self.under_other.pk})
+        with self.assertRaises(CommandError):
+            call_command("link_cadastral_parcels", "--since", "yesterday", stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command("link_cadastral_parcels", "parcel", stdout=io.StringIO())
+
+
+class TestFullGraph(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        parcel = CadastralParcel.objects.create(
+            namespace=self.namespace,
+            local_id="1",
+            begin_lifespan_version=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+            label="1",
+            national_cadastral_reference="1",
+            geometry=MultiPolygon(Polygon.from_bbox((0, 0, 1, 1)), srid=4326),
+        )
+        for i in range(3):
+            building = self.create_building(str(i))
+            building.cadastral_parcels.add(parcel)
+            self.add_height(building, 10 + i)
+            self.add_current_use(building, "residential", 100)
+            self.create_building(f"{i}.1", parent=building, is_building_part=True)
+
+    def walk(self, building):
+        """Everything serialised of a building"""
+        return (
+            building.local_id,
+            building.namespace.code,
+            building.condition_of_construction.code,
+            building.horizontal_geometry_reference.code,
+            [(h.value, h.height_reference.code, h.status.code) for h in building.buildingheightaboveground_set.all()],
+            [(u.current_use.code, u.percentage) for u in building.buildingcurrentuse_set.all()],
+            [part.local_id for part in building.parts.all()],
+            [parcel.local_id for parcel in building.cadastral_parcels.all()],
+            list(building.buildingdocument_set.all()),
+        )
+
+    def test_queries(self):
+        qs = Building.objects.filter(parent__isnull=True).order_by("local_id")
+        expected = [self.walk(building) for building in qs]
+        # One query for the buildings and one per relation, whatever the number of buildings
+        with self.assertNumQueries(1 + len(BuildingQuerySet.full_graph)):
+            self.assertEqual([self.walk(building) for building in qs.with_full_graph()], expected)
+        self.assertEqual(expected[0][4:8], ([(10, "generalRoof", "measured")], [("residential", 100)], ["0.1"], ["1"]))
+
+
+class TestBuildingTrees(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.create_building("1")
+        self.part = self.create_part("1.1", self.root)
+        self.subpart = self.create_part("1.1.1", self.part)
+        self.other = self.create_building("2")
+
+    def create_part(self, local_id, parent):
+        return self.create_building(local_id, parent=parent, is_building_part=True)
+
+    def get_roots(self):
+        return dict(Building.objects.values_list("local_id", "root_building__local_id"))
+
+    def test_with_parts(self):
+        self.assertEqual(
+            sorted(Building.objects.filter(pk=self.root.pk).with_parts().values_list("local_id", flat=True)),
+            ["1", "1.1", "1.1.1"],
+        )
+        self.assertEqual(list(Building.objects.filter(pk=self.other.pk).with_parts()), [self.other])
+
+    def test_load_trees(self):
+        with self.assertNumQueries(1):
+            roots = Building.objects.filter(pk__in=[self.root.pk, self.part.pk]).load_trees()
+            # Parts of a building of the queryset are not roots
+            self.assertEqual(roots, [self.root])
+            (part,) = roots[0].parts.all()
+            (subpart,) = part.parts.all()
+            self.assertEqual((subpart.local_id, list(subpart.parts.all())), ("1.1.1", []))
+            self.assertIs(subpart.parent.parent, roots[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.subpart.get_tree(), self.root)
+
+    def test_root_building(self):
+        self.assertEqual(self.get_roots(), {"1": None, "1.1": "1", "1.1.1": "1", "2": None})
+        # Moved with its parts
+        self.part.parent = self.other
+        self.part.save()
+        self.assertEqual(self.get_roots(), {"1": None, "1.1": "2", "1.1.1": "2", "2": None})
+        self.part.parent = None
+        self.part.save(update_fields=["parent"])
+        self.assertEqual(self.get_roots(), {"1": None, "1.1": None, "1.1.1": "1.1", "2": None})
+
+    def test_cycle(self):
+        self.root.parent = self.subpart
+        with self.assertRaises(ValueError):
+            self.root.save()
+        with self.assertRaises(ValidationError):
+            self.root.clean()
+        self.root.parent = self.root
+        with self.assertRaises(ValueError):
+            self.root.save()
+
+    def test_rebuild_roots(self):
+        roots = self.get_roots()
+        # Bulk writes do not call save()
+        Building.objects.update(root_building=None)
+        Building.objects.filter(pk=self.other.pk).update(root_building=self.root)
+        self.assertEqual(Building.objects.rebuild_roots(), 3)
+        self.assertEqual(self.get_roots(), roots)
+        self.assertEqual(Building.objects.rebuild_roots(), 0)
+
+    def test_rebuild_roots_cycle(self):
+        Building.objects.filter(pk=self.root.pk).update(parent=self.subpart)
+        with self.assertLogs("inspire_eu", "WARNING"):
+            Building.objects.rebuild_roots()
+        roots = self.get_roots()
+        self.assertEqual(roots["2"], None)
+        # Taken as roots: none of them is left without one
+        self.assertEqual(len({roots[local_id] or local_id for local_id in ("1", "1.1", "1.1.1")}), 1)
+
+    def test_command(self):
+        Building.objects.update(root_building=None)
+        stdout = io.StringIO()
+        call_command("rebuild_building_roots", stdout=stdout)
+        self.assertIn("Building: 2 roots updated", stdout.getvalue())
+        self.assertEqual(self.get_roots()["1.1.1"], "1")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_importers
+------------
+
+Tests for `django-inspire-eu` importers.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from inspire_eu.importers.cadastral_parcels import CadastralParcelsImporter
+from inspire_eu.models import UnitOfMeasure
+from inspire_eu.models.buildings import Building, BuildingCurrentUse, OtherConstruction
+from inspire_eu.models.cache import code_list_value_cache
+from inspire_eu.models.cadastral_parcels import CadastralParcel, CadastralZoning
+
+from .factories import create_building_code_list_values
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class TestCadastralParcelsImporter(TestCase):
+    def setUp(self):
+        UnitOfMeasure.objects.create(symbol="m2", name="square metre", measure_type="area")
+
+    def load(self, *args):
+        path = os.path.join(FIXTURES, "cadastral_parcels.gml")
+        call_command("load_cadastral_parcels", path, *args, stdout=io.StringIO())
+
+    def check_features(self):
+        self.assertEqual(CadastralZoning.objects.count(), 2)
+        upper, lower = CadastralZoning.objects.order_by("local_id")
+        self.assertEqual(lower.upper_level_unit_id, upper.pk)
+        self.assertEqual(lower.namespace.code, "ES.SDGC.CP.Z")
+        first, second = CadastralParcel.objects.order_by("local_id")
+        self.assertEqual(first.cadastral_zoning_id, lower.pk)
+        self.assertEqual(first.area_value, 100)
+        self.assertEqual(first.area_value_uom.symbol, "m2")
+        self.assertEqual(first.reference_point.coords, (-3.7085, 40.3915))
+        self.assertEqual(first.geometry.extent, (-3.709, 40.391, -3.708, 40.392))
+        self.assertTrue(first.content_hash)
+        self.assertIsNone(second.cadastral_zoning_id)
+        self.assertIsNone(second.reference_point)
+
+    def test_import(self):
+        self.load()
+        self.check_features()
+        hashes = list(CadastralParcel.objects.order_by("pk").values_list("content_hash", flat=True))
+        # Already stored: skipped, or left untouched with update
+        self.load()
+        self.load("--update")
+        self.assertEqual(list(CadastralParcel.objects.order_by("pk").values_list("content_hash", flat=True)), hashes)
+        self.check_features()
+
+    def test_import_copy(self):
+        self.load("--copy")
+        self.check_features()
+
+    def test_options(self):
+        with self.assertRaises(CommandError):
+            call_command("load_cadastral_parcels", os.path.join(FIXTURES, "missing*.gml"), stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            self.load("--copy", "--drop-indexes", "--jobs", "2")
+        stdout = io.StringIO()
+        call_command("load_cadastral_parcels", os.path.join(FIXTURES, "cadastral_parcels.gml"), stdout=stdout)
+        self.assertIn("1 files, 4 features", stdout.getvalue())
+
+
+def import_path_failing(self, path, import_path=CadastralParcelsImporter.import_path):
+    if "bad" in os.path.basename(path):
+        raise RuntimeError("worker failed")
+    return import_path(self, path)
+
+
+class TestImportPaths(TransactionTestCase):
+    def setUp(self):
+        UnitOfMeasure.objects.create(symbol="m2", name="square metre", measure_type="area")
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for name in ("good.gml", "bad.gml"):
+            shutil.copy(os.path.join(FIXTURES, "cadastral_parcels.gml"), os.path.join(self.directory, name))
+
+    @mock.patch.object(CadastralParcelsImporter, "import_path", import_path_failing)
+    def test_jobs(self):
+        # Workers are forked: the patched method is theirs as well
+        importer = CadastralParcelsImporter()
+        with self.assertLogs("inspire_eu.importers.base", "ERROR"):
+            with importer:
+                importer.import_paths(
+                    [os.path.join(self.directory, name) for name in ("good.gml", "bad.gml")],
+                    jobs=2,
+                )
+        self.assertEqual(
+            [(os.path.basename(path), error) for path, error in importer.failed],
+            [("bad.gml", "worker failed")],
+        )
+        self.assertEqual(CadastralParcel.objects.count(), 2)
+
+
+class TestBuildingsImporter(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        create_building_code_list_values()
+
+    def load(self, *args, path=None):
+        path = path or os.path.join(FIXTURES, "buildings.gml")
+        call_command("load_buildings", path, *args, stdout=io.StringIO())
+
+    def test_parts(self):
+        self.load()
+        building = Building.objects.get(local_id="B1")
+        self.assertFalse(building.is_building_part)
+        self.assertIsNone(building.parent_id)
+        parts = Building.objects.filter(parent=building).order_by("local_id")
+        # Referenced and inline parts
+        self.assertEqual([part.local_id for part in parts], ["B1_part1", "B1_part2"])
+        self.assertTrue(all(part.is_building_part for part in parts))
+        self.assertTrue(all(part.root_building_id == building.pk for part in parts))
+        # The inline part is not read as a property of its building
+        self.assertEqual(BuildingCurrentUse.objects.filter(building=building).count(), 1)
+        self.assertEqual(OtherConstruction.objects.count(), 1)
+
+    def test_update(self):
+        self.load()
+        current_use = BuildingCurrentUse.objects.get()
+        self.load("--update")
+        self.assertEqual(Building.objects.count(), 3)
+        self.assertEqual(Building.objects.filter(parent__local_id="B1").count(), 2)
+        # Unchanged: the child rows are left as they are
+        self.assertEqual(list(BuildingCurrentUse.objects.values_list("pk", flat=True)), [current_use.pk])
+
+    def test_update_children(self):
+        self.load()
+        building = Building.objects.get(local_id="B1")
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "buildings.gml")
+        with open(os.path.join(FIXTURES, "buildings.gml")) as f:
+            data = f.read()
+        with open(path, "w") as f:
+            # Only a child row changes
+            f.write(data.replace(">100</bu-base:percentage>", ">60</bu-base:percentage>"))
+        self.load("--update", path=path)
+        self.assertNotEqual(Building.objects.get(pk=building.pk).content_hash, building.content_hash)
+        self.assertEqual(
+            list(BuildingCurrentUse.objects.values_list("building_id", "percentage")),
+            [(building.pk, 60)],
+        )
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_load_initial_inspire
+------------
+
+Tests for `django-inspire-eu` load_initial_inspire command.
+"""
+
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from inspire_eu.management.commands.load_initial_inspire import Command
+from inspire_eu.models import (
+    CodeList,
+    CodeListTranslation,
+    CodeListValue,
+    CodeListValueTranslation,
+    RegistrySyncCheckpoint,
+    RegistrySyncRun,
+    RegistrySyncState,
+    Theme,
+    ThemeTranslation,
+)
+from inspire_eu.models.cache import code_list_value_cache
+from inspire_eu.registry.fetch import RegistryFetcher, RegistryResponse
+from inspire_eu.registry.snapshot import SnapshotFetcher, SnapshotWriter
+
+REGISTRY = "https://inspire.ec.europa.eu"
+ID = "http://inspire.ec.europa.eu"
+VALID = dict({"id": f"{ID}/registry/status/valid", "label": {"text": "Valid"}})
+CODE_LISTS = ("ConditionOfConstructionValue", "CurrentUseValue")
+CURRENT_USE = f"{REGISTRY}/codelist/CurrentUseValue/CurrentUseValue.{{language}}.json"
+
+
+def get_documents(language):
+    """Documents of the registry of a tiny buildings theme"""
+
+    def text(value):
+        return dict({"text": f"{value} [{language}]"})
+
+    entries = "".join(
+        f"<entry><id>{ID}/codelist/{code_list}</id><title>{code_list}</title><summary>{code_list}</summary>"
+        "<updated>2024-01-01T00:00:00Z</updated>"
+        f'<link rel="alternate" href="{ID}/codelist/{code_list}"/>'
+        f'<link rel="related" href="{ID}/theme/bu"/><link rel="related" href="{ID}/applicationschema/bu-base"/>'
+        "</entry>"
+        for code_list in CODE_LISTS
+    )
+    return dict(
+        {
+            f"{REGISTRY}/theme/theme.{language}.json": {
+                "register": {
+                    "containeditems": [
+                        {
+                            "theme": {
+                                "id": f"{ID}/theme/bu",
+                                "status": VALID,
+                                "version": "1",
+                                "label": text("Buildings"),
+                            },
+                        },
+                    ],
+                },
+            },
+            f"{REGISTRY}/applicationschema/applicationschema.{language}.json": {
+                "register": {
+                    "containeditems": [
+                        {
+                            "applicationschema": {
+                                "id": f"{ID}/applicationschema/bu-base",
+                                "status": VALID,
+                                "version": "1",
+                                "label": text("Buildings base"),
+                                "themes": [{"theme": {"id": f"{ID}/theme/bu"}}],
+                            },
+                        },
+                    ],
+                },
+            },
+            f"{REGISTRY}/codelist/codelist.{language}.atom": (
+                '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f"<id>{ID}/codelist</id><title>Code lists</title><updated>2024-01-01T00:00:00Z</updated>"
+                f"{entries}</feed>"
+            ),
+            f"{REGISTRY}/codelist/CurrentUseValue/CurrentUseValue.{language}.json": {
+                "codelist": {
+                    "containeditems": [
+                        {
+                            "value": {
+                                "id": f"{ID}/codelist/CurrentUseValue/residential",
+                                "status": VALID,
+                                "label": text("Residential"),
+                            },
+                        },
+                        {
+                            "value": {
+                                "id": f"{ID}/codelist/CurrentUseValue/individualResidence",
+                                "status": VALID,
+                                "label": text("Individual residence"),
+                                "parents": [{"parent": {"id": f"{ID}/codelist/CurrentUseValue/residential"}}],
+                            },
+                        },
+                    ],
+                },
+            },
+            f"{REGISTRY}/codelist/ConditionOfConstructionValue/ConditionOfConstructionValue.{language}.json": {
+                "codelist": {
+                    "containeditems": [
+                        {
+                            "value": {
+                                "id": f"{ID}/codelist/ConditionOfConstructionValue/functional",
+                                "status": VALID,
+                                "label": text("Functional"),
+                            },
+                        },
+                    ],
+                },
+            },
+        },
+    )
+
+
+class LoadInitialInspireTestCase(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        self.directory = tempfile.mkdtemp()
+        self.archive = self.write_snapshot("registry.zip", self.get_documents())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_documents(self, *languages):
+        documents = dict()
+        for language in languages or ("en", "es"):
+            documents.update(get_documents(language))
+        return documents
+
+    def write_snapshot(self, name, documents, status=None):
+        """Archive with ``documents``, answered with a 200 unless their url is in ``status``"""
+        archive = os.path.join(self.directory, name)
+        with SnapshotWriter(archive) as snapshot:
+            for url, document in documents.items():
+                content = document if isinstance(document, str) else json.dumps(document)
+                snapshot.add(RegistryResponse(url, (status or dict()).get(url, 200), content.encode("utf-8")))
+        return archive
+
+    def load(self, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command("load_initial_inspire", "-l", "en,es", *args, verbosity=0)
+
+    def get_values(self):
+        return sorted(
+            CodeListValue.objects.values_list("code_list__code", "code", "label", "parent__code", "status__is_valid"),
+        )
+
+    def get_translations(self):
+        return sorted(CodeListValueTranslation.objects.values_list("code_list_value__code", "language", "label"))
+
+
+class TestSnapshot(LoadInitialInspireTestCase):
+    def test_snapshot_in(self):
+        self.load("--snapshot-in", self.archive)
+        self.assertEqual(Theme.objects.get().label, "Buildings [en]")
+        self.assertEqual(sorted(CodeList.objects.values_list("code", flat=True)), list(CODE_LISTS))
+        self.assertEqual(
+            self.get_values(),
+            [
+                ("ConditionOfConstructionValue", "functional", "Functional [en]", None, True),
+                ("CurrentUseValue", "individualResidence", "Individual residence [en]", "residential", True),
+                ("CurrentUseValue", "residential", "Residential [en]", None, True),
+            ],
+        )
+        self.assertIn(("residential", "es", "Residential [es]"), self.get_translations())
+
+    def test_round_trip(self):
+        self.load("--snapshot-in", self.archive)
+        values, translations = self.get_values(), self.get_translations()
+        # The registry answers from the fixture archive
+        fixture = SnapshotFetcher(self.archive)
+        archive = os.path.join(self.directory, "out.zip")
+        with mock.patch.object(RegistryFetcher, "get_response", lambda fetcher, url: fixture.get(url)):
+            self.load("--force", "--snapshot-out", archive)
+        fixture.close()
+        with SnapshotFetcher(archive) as snapshot:
+            self.assertEqual(set(snapshot.manifest), set(fixture.manifest))
+        # Children first: parents are protected
+        CodeListValue.objects.filter(parent__isnull=False).delete()
+        CodeListValue.objects.all().delete()
+        self.load("--force", "--snapshot-in", archive)
+        self.assertEqual(self.get_values(), values)
+        self.assertEqual(self.get_translations(), translations)
+
+
+class TestCodeListValues(LoadInitialInspireTestCase):
+    def get_item(self, code, label, parent=None):
+        item = dict({"id": f"{ID}/codelist/CurrentUseValue/{code}", "status": VALID, "label": {"text": label}})
+        if parent:
+            item["parents"] = [{"parent": {"id": f"{ID}/codelist/CurrentUseValue/{parent}"}}]
+        return dict({"value": item})
+
+    def test_update(self):
+        self.load("--snapshot-in", self.archive)
+        pks = dict(CodeListValue.objects.values_list("code", "pk"))
+        documents = self.get_documents()
+        items = documents[CURRENT_USE.format(language="en")]["codelist"]["containeditems"]
+        items[0]["value"]["label"]["text"] = "Housing [en]"
+        items.append(self.get_item("collectiveResidence", "Collective residence [en]", "residential"))
+        # Written once
+        items.append(items[1])
+        self.load("--snapshot-in", self.write_snapshot("changed.zip", documents))
+        self.assertEqual(
+            self.get_values(),
+            [
+                ("ConditionOfConstructionValue", "functional", "Functional [en]", None, True),
+                ("CurrentUseValue", "collectiveResidence", "Collective residence [en]", "residential", True),
+                ("CurrentUseValue", "individualResidence", "Individual residence [en]", "residential", True),
+                ("CurrentUseValue", "residential", "Housing [en]", None, True),
+            ],
+        )
+        # Updated in place
+        new_pks = dict(CodeListValue.objects.values_list("code", "pk"))
+        self.assertEqual({code: new_pks[code] for code in pks}, pks)
+        translations = self.get_translations()
+        self.assertIn(("residential", "en", "Housing [en]"), translations)
+        self.assertIn(("residential", "es", "Residential [es]"), translations)
+
+    def test_bulk_queries(self):
+        self.load("--snapshot-in", self.archive)
+        code_list = CodeList.objects.get(code="CurrentUseValue")
+
+        def count_queries(size):
+            items = [self.get_item(f"value{size}-{i}", str(i), "residential") for i in range(size)]
+            errors = dict({"key": [], "data": [], "multiple_parents": [], "no_data": []})
+            with CaptureQueriesContext(connection) as context:
+                created, _updated = Command().populate_code_list_values(code_list, CURRENT_USE, items, errors)
+            self.assertEqual((created, errors["data"]), (size, []))
+            return len(context)
+
+        # Not one query per value
+        self.assertEqual(count_queries(10), count_queries(100))
+        self.assertEqual(CodeListValue.objects.filter(code_list=code_list, parent__code="residential").count(), 111)
+
+    def test_bulk_fallback(self):
+        # One save per value when a bulk write fails
+        with mock.patch.object(CodeListValue.objects, "bulk_create", side_effect=DatabaseError):
+            self.load("--snapshot-in", self.archive)
+        self.assertEqual(
+            [code for _code_list, code, *_fields in self.get_values()],
+            ["functional", "individualResidence", "residential"],
+        )
+
+
+class TestIncrementalSync(LoadInitialInspireTestCase):
+    def get_fetched(self, *args, archive=None):
+        """Urls of the code list values fetched by a sync"""
+        with mock.patch.object(SnapshotFetcher, "get", autospec=True, side_effect=SnapshotFetcher.get) as get:
+            self.load("--snapshot-in", archive or self.archive, *args)
+        return sorted(c.args[1].split("/")[-1] for c in get.call_args_list if c.args[1].endswith("Value.en.json"))
+
+    def test_sync_state(self):
+        self.load("--snapshot-in", self.archive)
+        states = RegistrySyncState.objects.values_list("code_list__code", "language", "feed_updated")
+        updated = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(
+            sorted(states),
+            sorted((code, language, updated) for code in CODE_LISTS for language in ("en", "es")),
+        )
+        self.assertFalse(RegistrySyncState.objects.filter(payload_sha256="").exists())
+
+    def test_unchanged_payload(self):
+        self.load("--snapshot-in", self.archive)
+        with mock.patch.object(Command, "populate_code_list_values", return_value=(0, 0)) as populate:
+            self.load("--snapshot-in", self.archive)
+            populate.assert_not_called()
+            self.load("--snapshot-in", self.archive, "--force")
+            self.assertEqual(populate.call_count, len(CODE_LISTS))
+
+    def test_incremental(self):
+        self.load("--snapshot-in", self.archive)
+        # Not modified at the feed: not even downloaded
+        self.assertEqual(self.get_fetched("--incremental"), [])
+        self.assertEqual(len(self.get_fetched("--incremental", "--force")), len(CODE_LISTS))
+        documents = self.get_documents()
+        for language in ("en", "es"):
+            url = f"{REGISTRY}/codelist/codelist.{language}.atom"
+            documents[url] = documents[url].replace(
+                "<title>CurrentUseValue</title><summary>CurrentUseValue</summary><updated>2024-01-01",
+                "<title>CurrentUseValue</title><summary>CurrentUseValue</summary><updated>2024-02-01",
+            )
+        archive = self.write_snapshot("updated.zip", documents)
+        self.assertEqual(self.get_fetched("--incremental", archive=archive), ["CurrentUseValue.en.json"])
+        self.assertEqual(self.get_fetched("--incremental", archive=archive), [])
+
+
+class TestLanguages(LoadInitialInspireTestCase):
+    def test_single_pass(self):
+        with mock.patch.object(SnapshotFetcher, "get", autospec=True, side_effect=SnapshotFetcher.get) as get:
+            self.load("--snapshot-in", self.archive)
+        # Every document once
+        self.assertEqual(sorted(c.args[1] for c in get.call_args_list), sorted(self.get_documents()))
+        self.assertEqual(
+            sorted(ThemeTranslation.objects.values_list("language", "label")),
+            [("en", "Buildings [en]"), ("es", "Buildings [es]")],
+        )
+        self.assertEqual(CodeListTranslation.objects.filter(language="es").count(), len(CODE_LISTS))
+        self.assertEqual(
+            [(code, language) for code, language, _label in self.get_translations() if code == "functional"],
+            [("functional", "en"), ("functional", "es")],
+        )
+
+    def test_missing_language(self):
+        documents = self.get_documents()
+        del documents[CURRENT_USE.format(language="es")]
+        with self.assertLogs("inspire_eu", "WARNING"):
+            self.load("--snapshot-in", self.write_snapshot("missing.zip", documents))
+        # Written without the missing translations
+        self.assertEqual(len(self.get_values()), 3)
+        self.assertEqual(
+            [language for code, language, _label in self.get_translations() if code == "residential"],
+            ["en"],
+        )
+        self.assertIsNotNone(RegistrySyncRun.objects.get().finished_at)
+
+    def test_missing_main_language(self):
+        documents = self.get_documents()
+        del documents[f"{REGISTRY}/theme/theme.en.json"]
+        with self.assertLogs("inspire_eu", "WARNING"), self.assertRaises(CommandError):
+            self.load("--snapshot-in", self.write_snapshot("missing.zip", documents))
+
+    def test_main_language_error(self):
+        url = CURRENT_USE.format(language="en")
+        with self.assertLogs("inspire_eu", "WARNING"):
+            self.load("--snapshot-in", self.write_snapshot("error.zip", self.get_documents(), dict({url: 500})))
+        # Reported: the sync is not finished
+        self.assertEqual([code for code_list, code, *_fields in self.get_values()], ["functional"])
+        self.assertIsNone(RegistrySyncRun.objects.get().finished_at)
+
+
+class TestResume(LoadInitialInspireTestCase):
+    def get_checkpoints(self):
+        return sorted(RegistrySyncCheckpoint.objects.values_list("run_id", "code_list__code"))
+
+    def test_resume(self):
+        url = CURRENT_USE.format(language="en")
+        with self.assertLogs("inspire_eu", "WARNING"):
+            self.load("--snapshot-in", self.write_snapshot("error.zip", self.get_documents(), dict({url: 500})))
+        run = RegistrySyncRun.objects.get()
+        self.assertEqual((run.stage, run.finished_at), ("code_list_values", None))
+        self.assertEqual(self.get_checkpoints(), [(run.pk, "ConditionOfConstructionValue")])
+        populate = Command.populate_code_list_values
+        with mock.patch.object(Command, "populate_code_list_values", autospec=True, side_effect=populate) as mocked:
+            with contextlib.redirect_stdout(io.StringIO()):
+                # Languages of the run resumed
+                call_command("load_initial_inspire", "--resume", "--snapshot-in", self.archive, verbosity=0)
+        # Only the code list not completed
+        self.assertEqual([c.args[1].code for c in mocked.call_args_list], ["CurrentUseValue"])
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(self.get_checkpoints(), [(run.pk, code) for code in CODE_LISTS])
+        # Nothing left to resume
+        self.load("--resume", "--snapshot-in", self.archive)
+        self.assertEqual(RegistrySyncRun.objects.count(), 2)
+
+    def test_rollback(self):
+        translations = Command.populate_code_list_value_translations
+
+        def populate(command, code_list, responses):
+            if code_list.code == "CurrentUseValue":
+                raise KeyboardInterrupt
+            return translations(command, code_list, responses)
+
+        with mock.patch.object(Command, "populate_code_list_value_translations", autospec=True, side_effect=populate):
+            with self.assertRaises(KeyboardInterrupt):
+                self.load("--snapshot-in", self.archive)
+        # The code list interrupted is neither written nor checkpointed
+        self.assertEqual([code for code_list, code, *_fields in self.get_values()], ["functional"])
+        run = RegistrySyncRun.objects.get()
+        self.assertEqual(self.get_checkpoints(), [(run.pk, "ConditionOfConstructionValue")])
+        self.assertFalse(RegistrySyncState.objects.filter(code_list__code="CurrentUseValue").exists())
+        self.load("--resume", "--snapshot-in", self.archive)
+        self.assertEqual(len(self.get_values()), 3)
+        self.assertEqual(RegistrySyncRun.objects.get().pk, run.pk)
+
+    def test_resume_other_languages(self):
+        url = CURRENT_USE.format(language="en")
+        with self.assertLogs("inspire_eu", "WARNING"):
+            self.load("--snapshot-in", self.write_snapshot("error.zip", self.get_documents(), dict({url: 500})))
+        with self.assertRaises(CommandError):
+            call_command("load_initial_inspire", "-l", "en", "--resume", "--snapshot-in", self.archive, verbosity=0)
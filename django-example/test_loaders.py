@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_loaders
+------------
+
+Tests for `django-inspire-eu` importers.loaders module.
+"""
+
+from unittest import mock, skipUnless
+
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.utils import timezone
+
+from inspire_eu.importers.loaders import BulkCreateLoader, PostgresCopyLoader, get_loader
+from inspire_eu.models import Namespace
+from inspire_eu.models.buildings import Building
+from inspire_eu.models.cache import code_list_value_cache
+from inspire_eu.models.cadastral_parcels import CadastralParcel
+
+from .factories import create_building_code_list_values
+
+
+class TestLoaders(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        values = create_building_code_list_values()
+        self.namespace = Namespace.objects.create(code="ES.SDGC.BU")
+        self.row = dict(
+            {
+                "namespace_id": self.namespace.pk,
+                "version_id": "",
+                "begin_lifespan_version": timezone.now(),
+                "condition_of_construction_id": values["functional"].pk,
+                "geometry": MultiPolygon(Polygon.from_bbox((0, 0, 1, 1)), srid=4326),
+                "reference_geometry": True,
+                "horizontal_geometry_reference_id": values["footPrint"].pk,
+                "horizontal_geometry_estimated_accuracy": 1,
+            },
+        )
+
+    def load(self, loader_class, rows):
+        with loader_class(Building) as loader:
+            loader.add_many(dict(self.row, **row) for row in rows)
+        return loader.stats
+
+    def check_update_keeps_parent(self, loader_class):
+        self.load(loader_class, [{"local_id": "1"}, {"local_id": "2", "is_building_part": True}])
+        root, part = Building.objects.order_by("local_id")
+        part.parent = root
+        part.save()
+        stats = self.load(
+            loader_class,
+            [{"local_id": "1"}, {"local_id": "2", "is_building_part": True, "number_of_floors_above_ground": 2}],
+        )
+        self.assertEqual(stats, {"inserted": 0, "updated": 1, "skipped": 1})
+        part.refresh_from_db()
+        self.assertEqual(part.number_of_floors_above_ground, 2)
+        self.assertEqual(part.parent_id, root.pk)
+        self.assertEqual(part.root_building_id, root.pk)
+
+    def test_update_keeps_parent(self):
+        self.check_update_keeps_parent(get_loader(Building).__class__)
+
+    def test_bulk_create_update_keeps_parent(self):
+        self.check_update_keeps_parent(BulkCreateLoader)
+
+    def test_generalised_geometries(self):
+        with get_loader(CadastralParcel) as loader:
+            loader.add(
+                dict(
+                    {
+                        "namespace_id": self.namespace.pk,
+                        "local_id": "1",
+                        "version_id": "",
+                        "begin_lifespan_version": timezone.now(),
+                        "label": "1",
+                        "national_cadastral_reference": "1",
+                        "geometry": MultiPolygon(Point(-3.7, 40.4).buffer(0.01, quadsegs=256), srid=4326),
+                    },
+                ),
+            )
+        parcel = CadastralParcel.objects.get()
+        self.assertIsNotNone(parcel.geometry_low)
+        content_hash = parcel.content_hash
+        CadastralParcel.objects.set_content_hashes([parcel])
+        self.assertEqual(parcel.content_hash, content_hash)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copy_error_rolled_back(self):
+        loader = PostgresCopyLoader(Building, drop_indexes=True)
+        with mock.patch.object(loader, "rebuild_table_indexes", side_effect=DatabaseError("rebuild failed")):
+            with self.assertRaisesMessage(DatabaseError, "rebuild failed"):
+                with loader:
+                    loader.add(dict(self.row, local_id="1"))
+        # Rows and dropped indexes are rolled back, and the connection is still usable
+        self.assertFalse(Building.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_indexes WHERE tablename = %s",
+                [Building._meta.db_table],
+            )
+            self.assertGreater(cursor.fetchone()[0], 1)
@@ -8,9 +8,17 @@ test_django-inspire-eu
 Tests for `django-inspire-eu` models module.
 """
 
-from django.test import TestCase
+import datetime
 
-# from inspire_eu import models
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.test import TestCase, override_settings
+
+from inspire_eu.importers.loaders import BulkCreateLoader, get_loader
+from inspire_eu.models import CodeList, CodeListValue, Namespace, get_code_list_value_slug
+from inspire_eu.models.cache import CodeListValueCache, code_list_value_cache
+from inspire_eu.models.cadastral_parcels import CadastralParcel, CadastralZoning
+
+from .factories import create_code_list_values
 
 
 class TestInspire_eu(TestCase):
@@ -22,3 +30,334 @@ class TestInspire_eu(TestCase):
 
     def tearDown(self):
         pass
+
+
+class TestUpsertByIdentifier(TestCase):
+    def setUp(self):
+        self.namespace = Namespace.objects.create(code="ES.SDGC.CP")
+
+    def get_parcels(self, labels, geometry=None):
+        return [
+            CadastralParcel(
+                namespace=self.namespace,
+                geometry=geometry,
+                local_id=f"0000{i}",
+                begin_lifespan_version=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc),
+                label=label,
+                national_cadastral_reference=f"0000{i}",
+            )
+            for i, label in enumerate(labels)
+        ]
+
+    def test_hash_fields(self):
+        names = [f.name for f in CadastralZoning.objects.get_hash_fields()]
+        self.assertIn("geometry", names)
+        self.assertIn("geometry_low", names)
+        self.assertNotIn("content_hash", names)
+        self.assertNotIn("hierarchy_path", names)
+
+    def test_unchanged(self):
+        objs = self.get_parcels(["1", "2", "3"])
+        stats = CadastralParcel.objects.upsert_by_identifier(objs)
+        self.assertEqual(stats, {"inserted": 3, "updated": 0, "unchanged": 0})
+        objs = self.get_parcels(["1", "2", "3"])
+        stats = CadastralParcel.objects.upsert_by_identifier(objs)
+        self.assertEqual(stats["unchanged"], len(objs))
+        self.assertTrue(all(obj.pk for obj in objs))
+
+    def test_updated_and_inserted(self):
+        CadastralParcel.objects.upsert_by_identifier(self.get_parcels(["1", "2"]))
+        stats = CadastralParcel.objects.upsert_by_identifier(self.get_parcels(["1", "changed", "3"]))
+        self.assertEqual(stats, {"inserted": 1, "updated": 1, "unchanged": 1})
+        self.assertEqual(CadastralParcel.objects.get(local_id="00001").label, "changed")
+        self.assertEqual(CadastralParcel.objects.count(), 3)
+
+    def test_generalised_geometries(self):
+        geometry = MultiPolygon(Point(-3.7, 40.4).buffer(0.01, quadsegs=256), srid=4326)
+        objs = self.get_parcels(["1"], geometry=geometry)
+        CadastralParcel.objects.upsert_by_identifier(objs)
+        parcel = CadastralParcel.objects.get()
+        self.assertIsNotNone(parcel.geometry_low)
+        content_hash = parcel.content_hash
+        # rebuild_generalised_geometries gets the same hash
+        CadastralParcel.objects.set_content_hashes([parcel])
+        self.assertEqual(parcel.content_hash, content_hash)
+        objs = self.get_parcels(["1"], geometry=geometry)
+        self.assertEqual(CadastralParcel.objects.upsert_by_identifier(objs)["unchanged"], 1)
+
+
+@override_settings(CACHES=dict({"shared": dict({"BACKEND": "django.core.cache.backends.locmem.LocMemCache"})}))
+class TestCodeListValueCache(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        self.values = create_code_list_values(
+            "bu",
+            dict({"CurrentUseValue": ["residential", "industrial", "agriculture"]}),
+        )
+
+    def test_warmup(self):
+        cache = CodeListValueCache(maxsize=10, warmup_size=2)
+        with self.assertNumQueries(1):
+            value = cache.get("currentusevalue", "residential")
+        self.assertEqual(value.pk, self.values["residential"].pk)
+        # The first ones by primary key
+        self.assertEqual(set(cache._entries), {("currentusevalue", "residential"), ("currentusevalue", "industrial")})
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get("currentusevalue", "agriculture"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Without warmup
+        cache = CodeListValueCache(maxsize=10, warmup_size=0)
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.get("currentusevalue", "residential"))
+
+    def test_least_recently_used(self):
+        cache = CodeListValueCache(maxsize=2, warmup_size=0)
+        cache.get("currentusevalue", "residential")
+        for code in ("residential", "industrial", "agriculture"):
+            cache.set(self.values[code])
+        self.assertEqual(list(cache._entries), [("currentusevalue", "industrial"), ("currentusevalue", "agriculture")])
+        # A copy: callers may change it
+        value = cache.get("currentusevalue", "industrial")
+        value.label = "changed"
+        self.assertEqual(cache.get("currentusevalue", "industrial").label, "industrial")
+
+    def test_invalidation(self):
+        value = CodeListValue.search("residential", "CurrentUseValue")
+        self.assertIsNotNone(code_list_value_cache.get("currentusevalue", "residential"))
+        value.save()
+        self.assertNotIn(("currentusevalue", "residential"), code_list_value_cache._entries)
+        CodeListValue.search("industrial", "CurrentUseValue")
+        value.code_list.save()
+        self.assertNotIn(("currentusevalue", "industrial"), code_list_value_cache._entries)
+
+    def test_created_ad_hoc(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            CodeListValue.search("commerceAndServices", "CurrentUseValue")
+        # Cached once committed
+        self.assertIsNone(code_list_value_cache.get("currentusevalue", "commerceandservices"))
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(code_list_value_cache.get("currentusevalue", "commerceandservices"))
+
+    def test_shared(self):
+        worker = CodeListValueCache(maxsize=10, alias="shared", check_interval=0, warmup_size=0)
+        other = CodeListValueCache(maxsize=10, alias="shared", check_interval=0, warmup_size=0)
+        worker.set(self.values["residential"])
+        # From the shared tier
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get("currentusevalue", "residential").pk, self.values["residential"].pk)
+        # Invalidated by another worker
+        worker.invalidate(pk=self.values["residential"].pk)
+        self.assertIsNone(other.get("currentusevalue", "residential"))
+
+
+class TestResolveMany(TestCase):
+    def setUp(self):
+        code_list_value_cache.clear()
+        self.addCleanup(code_list_value_cache.clear)
+        self.values = create_code_list_values("bu", dict({"CurrentUseValue": ["residential", "industrial"]}))
+        self.link = "https://inspire.ec.europa.eu/codelist/CurrentUseValue/residential"
+
+    def test_resolve_many(self):
+        pairs = [
+            ("CurrentUseValue", "residential"),
+            ("CurrentUseValue", self.link),
+            ("CurrentUseValue", "industrial"),
+            ("CurrentUseValue", "missing"),
+        ]
+        # Cache warmup, and the missing values of the code list
+        with self.assertNumQueries(2):
+            result = CodeListValue.objects.resolve_many(pairs)
+        self.assertEqual(
+            result,
+            dict(
+                {
+                    pairs[0]: self.values["residential"].pk,
+                    pairs[1]: self.values["residential"].pk,
+                    pairs[2]: self.values["industrial"].pk,
+                },
+            ),
+        )
+        # Same values as search
+        self.assertEqual(CodeListValue.search(self.link, create=False).pk, result[pairs[1]])
+
+    def test_create(self):
+        result = CodeListValue.objects.resolve_many([("CurrentUseValue", "agriculture")], create=True)
+        created = CodeListValue.objects.get(pk=result[("CurrentUseValue", "agriculture")])
+        self.assertEqual((created.code_list.code, created.code), ("CurrentUseValue", "agriculture"))
+        with self.assertRaises(CodeList.DoesNotExist):
+            CodeListValue.objects.resolve_many([("MissingValue", "value")], create=True)
+
+    def test_long_code(self):
+        # Longer than the columns: cut when stored
+        code = "a" * 100
+        self.assertEqual(get_code_list_value_slug(code), code[:96])
+        value = create_code_list_values("long", dict({"LongValue": [code[:96]]}))[code[:96]]
+        result = CodeListValue.objects.resolve_many([("LongValue", code)])
+        self.assertEqual(result, dict({("LongValue", code): value.pk}))
+        self.assertEqual(CodeListValue.search(code, "LongValue", create=False).pk, value.pk)
+
+
+class TestAssignZonings(TestCase):
+    def setUp(self):
+        self.namespace = Namespace.objects.create(code="ES.SDGC.CP")
+        self.now = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.municipality = self.get_zoning("1", (0, 0, 10, 10))
+        self.block = self.get_zoning("2", (0, 0, 5, 5), upper_level_unit=self.municipality)
+
+    def get_zoning(self, local_id, bbox, upper_level_unit=None):
+        return CadastralZoning.objects.create(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.now,
+            estimated_accuracy=1,
+            geometry=MultiPolygon(Polygon.from_bbox(bbox), srid=4326),
+            upper_level_unit=upper_level_unit,
+        )
+
+    def get_parcel(self, local_id, bbox, reference_point=None):
+        return CadastralParcel.objects.create(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.now,
+            label=local_id,
+            national_cadastral_reference=local_id,
+            geometry=MultiPolygon(Polygon.from_bbox(bbox), srid=4326),
+            reference_point=reference_point,
+        )
+
+    def test_reference_point(self):
+        parcel = self.get_parcel("1", (1, 1, 2, 2))
+        other = self.get_parcel("2", (6, 6, 7, 7), reference_point=Point(6.5, 6.5, srid=4326))
+        stats = CadastralParcel.objects.assign_zonings()
+        self.assertEqual(stats["assigned"], 2)
+        parcel.refresh_from_db()
+        other.refresh_from_db()
+        # The lowest level zoning
+        self.assertEqual(parcel.cadastral_zoning_id, self.block.pk)
+        self.assertEqual(other.cadastral_zoning_id, self.municipality.pk)
+
+    def test_overlap_largest_area(self):
+        # Mostly out of the municipality, its largest part in the municipality and out of the block
+        parcel = self.get_parcel("1", (4, 0, 16, 2), reference_point=Point(15, 1, srid=4326))
+        CadastralParcel.objects.assign_zonings(overlap=False)
+        parcel.refresh_from_db()
+        self.assertIsNone(parcel.cadastral_zoning_id)
+        CadastralParcel.objects.assign_zonings()
+        parcel.refresh_from_db()
+        self.assertEqual(parcel.cadastral_zoning_id, self.municipality.pk)
+
+    def test_overlap_touching(self):
+        parcel = self.get_parcel("1", (10, 0, 12, 2))
+        stats = CadastralParcel.objects.assign_zonings()
+        self.assertEqual(stats["assigned"], 0)
+        parcel.refresh_from_db()
+        self.assertIsNone(parcel.cadastral_zoning_id)
+
+    def check_update_keeps_zoning(self, write):
+        parcel = self.get_parcel("1", (1, 1, 2, 2))
+        CadastralParcel.objects.assign_zonings()
+        # Changed in its dataset, which has no zoning
+        changed = CadastralParcel(
+            namespace=self.namespace,
+            local_id="1",
+            begin_lifespan_version=self.now,
+            label="changed",
+            national_cadastral_reference="1",
+            geometry=MultiPolygon(Polygon.from_bbox((1, 1, 2, 2)), srid=4326),
+        )
+        write(changed)
+        parcel.refresh_from_db()
+        self.assertEqual(parcel.label, "changed")
+        self.assertEqual(parcel.cadastral_zoning_id, self.block.pk)
+
+    def test_upsert_keeps_zoning(self):
+        self.check_update_keeps_zoning(lambda parcel: CadastralParcel.objects.upsert_by_identifier([parcel]))
+
+    def test_loaders_keep_zoning(self):
+        for loader_class in {get_loader(CadastralParcel).__class__, BulkCreateLoader}:
+            with self.subTest(loader=loader_class.__name__):
+                CadastralParcel.objects.all().delete()
+
+                def write(parcel):
+                    with loader_class(CadastralParcel) as loader:
+                        loader.add(parcel)
+
+                self.check_update_keeps_zoning(write)
+
+
+class TestZoningHierarchy(TestCase):
+    def setUp(self):
+        self.namespace = Namespace.objects.create(code="ES.SDGC.CP")
+        self.now = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.municipality = self.get_zoning("1")
+        self.sector = self.get_zoning("2", upper_level_unit=self.municipality)
+        self.block = self.get_zoning("3", upper_level_unit=self.sector)
+
+    def get_zoning(self, local_id, upper_level_unit=None, create=True):
+        zoning = CadastralZoning(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.now,
+            estimated_accuracy=1,
+            geometry=MultiPolygon(Polygon.from_bbox((0, 0, 1, 1)), srid=4326),
+            upper_level_unit=upper_level_unit,
+        )
+        if create:
+            zoning.save()
+        return zoning
+
+    def test_paths(self):
+        self.assertEqual(self.municipality.hierarchy_path, f"/{self.municipality.pk}/")
+        self.block.refresh_from_db()
+        self.assertEqual(self.block.hierarchy_path, f"/{self.municipality.pk}/{self.sector.pk}/{self.block.pk}/")
+        self.assertEqual(
+            list(CadastralZoning.objects.descendants(self.municipality)),
+            list(CadastralZoning.objects.filter(pk__in=[self.sector.pk, self.block.pk])),
+        )
+        self.assertEqual(list(self.block.get_ancestors()), [self.municipality, self.sector])
+        self.assertEqual(list(self.block.get_ancestors(include_self=True))[-1], self.block)
+
+    def test_move(self):
+        other = self.get_zoning("4")
+        self.sector.upper_level_unit = other
+        self.sector.save()
+        self.block.refresh_from_db()
+        self.assertEqual(self.block.hierarchy_path, f"/{other.pk}/{self.sector.pk}/{self.block.pk}/")
+        self.assertFalse(self.municipality.get_descendants().exists())
+        # Below itself
+        self.sector.upper_level_unit = self.block
+        with self.assertRaises(ValueError):
+            self.sector.save()
+
+    def test_upper_level_units_without_path(self):
+        # Written in bulk: no path yet
+        CadastralZoning.objects.update(hierarchy_path="")
+        zoning = self.get_zoning("4", upper_level_unit=self.block)
+        self.assertEqual(
+            zoning.hierarchy_path,
+            f"/{self.municipality.pk}/{self.sector.pk}/{self.block.pk}/{zoning.pk}/",
+        )
+        with self.assertRaises(ValueError):
+            CadastralZoning.objects.descendants(self.municipality.pk)
+
+    def test_rebuild_hierarchy(self):
+        CadastralZoning.objects.update(hierarchy_path="")
+        self.assertEqual(CadastralZoning.objects.rebuild_hierarchy(), 3)
+        self.assertEqual(CadastralZoning.objects.rebuild_hierarchy(), 0)
+        self.block.refresh_from_db()
+        self.assertEqual(self.block.hierarchy_path, f"/{self.municipality.pk}/{self.sector.pk}/{self.block.pk}/")
+
+    def test_parcels_within(self):
+        parcel = CadastralParcel.objects.create(
+            namespace=self.namespace,
+            local_id="1",
+            begin_lifespan_version=self.now,
+            label="1",
+            national_cadastral_reference="1",
+            geometry=MultiPolygon(Polygon.from_bbox((0, 0, 1, 1)), srid=4326),
+            cadastral_zoning=self.block,
+        )
+        self.assertEqual(list(self.municipality.get_parcels_within()), [parcel])
+        self.assertFalse(CadastralZoning.objects.parcels_within(self.get_zoning("4")).exists())
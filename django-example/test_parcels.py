@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_parcels
+------------
+
+Tests for `django-inspire-eu` point-in-parcel lookups.
+"""
+
+import datetime
+import json
+from unittest import mock
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.test import Client, SimpleTestCase, TestCase, modify_settings, override_settings
+
+from inspire_eu.models import Namespace
+from inspire_eu.models.cadastral_parcels import CadastralParcel, CadastralZoning, cache
+from inspire_eu.models.cadastral_parcels.cache import GeometryIndex, ParcelLookupCache, parcel_lookup_cache
+
+
+def square(xmin, ymin, xmax, ymax):
+    return MultiPolygon(Polygon.from_bbox((xmin, ymin, xmax, ymax)), srid=4326)
+
+
+class TestGeometryIndex(SimpleTestCase):
+    def check_query(self):
+        index = GeometryIndex([(1, square(0, 0, 2, 2)), (2, square(2, 0, 4, 2)), (3, None)])
+        self.assertEqual(len(index), 2)
+        # On the shared boundary: in neither
+        self.assertEqual(sorted(index.query([1, 3, 2, 5], [1, 1, 1, 1])), [(0, 1), (1, 2)])
+        self.assertEqual(index.query([], []), [])
+        self.assertEqual(GeometryIndex([]).query([1], [1]), [])
+
+    def test_query(self):
+        self.check_query()
+
+    def test_query_without_shapely(self):
+        with mock.patch.object(cache, "shapely", None):
+            self.check_query()
+
+
+class ParcelsTestCase(TestCase):
+    def setUp(self):
+        self.namespace = Namespace.objects.create(code="ES.SDGC.CP")
+        self.now = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        self.west = self.create_zoning("1", (0, 0, 4, 4))
+        self.east = self.create_zoning("2", (4, 0, 8, 4))
+        self.parcels = [
+            self.create_parcel("1", (0, 0, 2, 4), self.west),
+            self.create_parcel("2", (2, 0, 4, 4), self.west),
+            self.create_parcel("3", (4, 0, 8, 4), self.east),
+        ]
+        # The cache of the process, enabled
+        patcher = mock.patch.object(parcel_lookup_cache, "maxsize", 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        parcel_lookup_cache.clear()
+        self.addCleanup(parcel_lookup_cache.clear)
+
+    def create_zoning(self, local_id, bbox):
+        return CadastralZoning.objects.create(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.now,
+            estimated_accuracy=1,
+            geometry=square(*bbox),
+        )
+
+    def create_parcel(self, local_id, bbox, zoning):
+        return CadastralParcel.objects.create(
+            namespace=self.namespace,
+            local_id=local_id,
+            begin_lifespan_version=self.now,
+            label=local_id,
+            national_cadastral_reference=local_id,
+            geometry=square(*bbox),
+            cadastral_zoning=zoning,
+        )
+
+
+class TestParcelLookupCache(ParcelsTestCase):
+    def test_at_point(self):
+        hits = parcel_lookup_cache.hits
+        self.assertEqual(list(CadastralParcel.objects.at_point(1, 1)), [self.parcels[0]])
+        self.assertEqual(
+            CadastralParcel.objects.at_points([(1, 1), (3, 1), (5, 1), (1, 1)]),
+            [self.parcels[0], self.parcels[1], self.parcels[2], self.parcels[0]],
+        )
+        self.assertEqual(parcel_lookup_cache.hits - hits, 5)
+
+    def test_least_recently_used(self):
+        lookup_cache = ParcelLookupCache(maxsize=1, timeout=0)
+        self.assertEqual(lookup_cache.lookup([1, 5], [1, 1]), [[self.parcels[0].pk], [self.parcels[2].pk]])
+        # Only the last zoning is kept
+        self.assertEqual(list(lookup_cache._parcels), [self.east.pk])
+        # Out of every zoning: left to the database
+        self.assertEqual(lookup_cache.lookup([10], [10]), [None])
+        self.assertEqual((lookup_cache.hits, lookup_cache.misses), (2, 1))
+
+    def test_disabled(self):
+        lookup_cache = ParcelLookupCache(maxsize=0)
+        self.assertFalse(lookup_cache.enabled)
+        self.assertEqual(lookup_cache.lookup([1], [1]), [None])
+        with mock.patch.object(cache, "shapely", None):
+            self.assertFalse(ParcelLookupCache(maxsize=1).enabled)
+
+    def test_invalidation(self):
+        self.assertEqual(parcel_lookup_cache.lookup([1], [1]), [[self.parcels[0].pk]])
+        # Saved: its zoning is dropped
+        parcel = self.parcels[0]
+        parcel.geometry = square(0, 0, 1, 4)
+        parcel.save()
+        self.assertEqual(list(parcel_lookup_cache._parcels), [])
+        self.assertEqual(parcel_lookup_cache.lookup([0.5], [1]), [[parcel.pk]])
+        # Out of every parcel of its zoning: left to the database
+        self.assertEqual(parcel_lookup_cache.lookup([1.5], [1]), [None])
+        # A zoning saved: everything is dropped
+        self.west.save()
+        self.assertIsNone(parcel_lookup_cache._zonings)
+
+    def test_expired(self):
+        lookup_cache = ParcelLookupCache(maxsize=1, timeout=60)
+        zonings = lookup_cache.get_zonings()
+        self.assertIs(lookup_cache.get_zonings(), zonings)
+        lookup_cache._loaded_at -= 61
+        self.assertIsNot(lookup_cache.get_zonings(), zonings)
+
+
+@override_settings(ROOT_URLCONF="inspire_eu.urls")
+class TestAtPointView(ParcelsTestCase):
+    url = "/cadastral-parcels/at-point/"
+
+    def test_get(self):
+        response = self.client.get(self.url, {"lon": 5, "lat": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([parcel["local_id"] for parcel in response.json()["parcels"]], ["3"])
+        self.assertEqual(self.client.get(self.url, {"lon": "x", "lat": 1}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"lon": 1}).status_code, 400)
+
+    def test_post(self):
+        data = json.dumps({"points": [[1, 1], [5, 1]]})
+        response = self.client.post(self.url, data, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        parcels = response.json()["parcels"]
+        self.assertEqual([parcel["local_id"] for parcel in parcels], ["1", "3"])
+        self.assertEqual(parcels[0]["cadastral_zoning"], self.west.pk)
+        data = json.dumps({"points": [[1, 1]] * 1001})
+        self.assertEqual(self.client.post(self.url, data, content_type="application/json").status_code, 400)
+
+    @modify_settings(MIDDLEWARE={"append": "django.middleware.csrf.CsrfViewMiddleware"})
+    def test_post_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        data = json.dumps({"points": [[1, 1]]})
+        self.assertEqual(client.post(self.url, data, content_type="application/json").status_code, 403)
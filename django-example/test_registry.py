@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_registry
+------------
+
+Tests for `django-inspire-eu` registry downloads.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from inspire_eu.registry import fetch
+from inspire_eu.registry.cache import RegistryCache
+from inspire_eu.registry.fetch import HostRateLimiter, RegistryFetcher, RegistryResponse
+
+URL = "https://inspire.ec.europa.eu/codelist/codelist.en.json"
+
+
+class FakeResponse:
+    """Streamed response of requests"""
+
+    def __init__(self, status_code=200, content=b"{}", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or dict()
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        content = self.content
+        while content:
+            yield content[:chunk_size]
+            content = content[chunk_size:]
+
+    def close(self):
+        self.closed = True
+
+
+class FetcherTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(fetch.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_fetcher(self, responses, **kwargs):
+        kwargs.setdefault("rate", None)
+        session = mock.Mock(spec=requests.Session)
+        session.get.side_effect = responses
+        # Shared by the worker threads too
+        patcher = mock.patch.object(RegistryFetcher, "session", new_callable=mock.PropertyMock, return_value=session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return RegistryFetcher(**kwargs)
+
+
+class TestRegistryFetcher(FetcherTestCase):
+    def test_retries(self):
+        unavailable = FakeResponse(503)
+        fetcher = self.get_fetcher([unavailable, requests.ConnectionError("reset"), FakeResponse(200, b"[1]")])
+        with self.assertLogs(fetch.log, "WARNING") as logs:
+            response = fetcher.get(URL)
+        self.assertEqual((response.status_code, response.json()), (200, [1]))
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(unavailable.closed)
+        # backoff * 2 ** attempt
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [0.5, 1.0])
+
+    def test_retry_after(self):
+        fetcher = self.get_fetcher([FakeResponse(429, headers={"Retry-After": "7"}), FakeResponse(200)])
+        with self.assertLogs(fetch.log, "WARNING"):
+            self.assertEqual(fetcher.get(URL).status_code, 200)
+        self.sleep.assert_called_once_with(7.0)
+        # Only seconds are understood
+        self.assertEqual(fetcher.get_retry_delay(2, FakeResponse(429, headers={"Retry-After": "Fri"})), 2.0)
+
+    def test_gives_up(self):
+        fetcher = self.get_fetcher([FakeResponse(502)] * 3, retries=2)
+        with self.assertLogs(fetch.log, "WARNING"):
+            # The last response is handed back
+            self.assertEqual(fetcher.get(URL).status_code, 502)
+        self.assertEqual(fetcher.session.get.call_count, 3)
+        fetcher = self.get_fetcher([requests.Timeout("slow")] * 2, retries=1)
+        with self.assertLogs(fetch.log, "WARNING"), self.assertRaises(requests.Timeout):
+            fetcher.get(URL)
+
+    def test_not_retried(self):
+        fetcher = self.get_fetcher([FakeResponse(404)])
+        self.assertEqual(fetcher.get(URL).status_code, 404)
+        self.sleep.assert_not_called()
+
+    def test_fetch_many(self):
+        urls = [f"{URL}?page={i}" for i in range(5)]
+
+        def get(url, **kwargs):
+            if url.endswith("3"):
+                raise requests.ConnectionError("reset")
+            return FakeResponse(200, url.encode("utf-8"))
+
+        fetcher = self.get_fetcher(get, concurrency=2, retries=0)
+        with self.assertLogs(fetch.log, "ERROR"):
+            responses = dict(fetcher.fetch_many(urls))
+        self.assertEqual(sorted(responses), urls)
+        # Failed urls are given as None
+        self.assertIsNone(responses.pop(urls[3]))
+        self.assertEqual({url: response.text for url, response in responses.items()}, {url: url for url in responses})
+
+
+class TestRegistryResponse(FetcherTestCase):
+    document = dict({"codelist": {"containeditems": [{"value": {"id": str(i), "weight": 0.5}} for i in range(3)]}})
+
+    def check_iter_items(self, response):
+        items = list(response.iter_items("codelist", "containeditems"))
+        self.assertEqual([item["value"]["id"] for item in items], ["0", "1", "2"])
+        # Plain floats, not decimals
+        self.assertIs(type(items[0]["value"]["weight"]), float)
+        self.assertEqual(list(response.iter_items("register", "containeditems")), [])
+
+    def test_iter_items(self):
+        content = json.dumps(self.document).encode("utf-8")
+        self.check_iter_items(RegistryResponse(URL, 200, content=content))
+        with mock.patch.object(fetch, "ijson", None):
+            self.check_iter_items(RegistryResponse(URL, 200, content=content))
+
+    def test_spool(self):
+        content = json.dumps(self.document).encode("utf-8") * 1000
+        fetcher = self.get_fetcher([FakeResponse(200, content)])
+        with mock.patch.object(fetch, "SPOOL_MAX_SIZE", 1024), mock.patch.object(fetch, "CHUNK_SIZE", 1000):
+            response = fetcher.get(URL)
+        # Spooled to disk, hashed on the way
+        self.assertTrue(response.body._rolled)
+        self.assertEqual(response.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(response.content, content)
+        # Closing the file read leaves the body open
+        with response.open() as f:
+            f.read(10)
+        self.assertEqual(response.content, content)
+        response.close()
+        self.assertEqual(response.content, b"")
+
+
+class TestRegistryCache(FetcherTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = RegistryCache(directory)
+
+    def test_store(self):
+        self.assertEqual(self.cache.get_conditional_headers(URL), dict())
+        self.cache.store(URL, b"[1]", {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+        self.assertEqual(
+            self.cache.get_conditional_headers(URL),
+            {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"},
+        )
+        metadata = self.cache.get_metadata(URL)
+        self.assertEqual((metadata["url"], metadata["etag"]), (URL, '"v1"'))
+        with self.cache.open_body(URL) as f:
+            self.assertEqual(f.read(), b"[1]")
+        # Without its body, validators are useless
+        os.unlink(self.cache.get_path(URL, "body"))
+        self.assertEqual(self.cache.get_conditional_headers(URL), dict())
+        self.assertIsNone(self.cache.open_body(URL))
+
+    def test_not_modified(self):
+        fetcher = self.get_fetcher([FakeResponse(200, b"[1]", {"ETag": '"v1"'}), FakeResponse(304)], cache=self.cache)
+        response = fetcher.get(URL)
+        self.assertFalse(response.from_cache)
+        self.assertEqual(self.cache.get_metadata(URL)["sha256"], response.sha256)
+        response = fetcher.get(URL)
+        self.assertEqual(fetcher.session.get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        # Served from the cache
+        self.assertTrue(response.from_cache)
+        self.assertEqual((response.status_code, response.json()), (200, [1]))
+        response.close()
+
+    def test_vanished_body(self):
+        self.cache.store(URL, b"[1]", {"ETag": '"v1"'})
+        fetcher = self.get_fetcher([FakeResponse(304), FakeResponse(200, b"[2]", {"ETag": '"v2"'})], cache=self.cache)
+        with mock.patch.object(self.cache, "open_body", return_value=None):
+            response = fetcher.get(URL)
+        # Fetched again without validators
+        self.assertNotIn("headers", fetcher.session.get.call_args.kwargs)
+        self.assertEqual((response.from_cache, response.json()), (False, [2]))
+        self.assertEqual(self.cache.get_metadata(URL)["etag"], '"v2"')
+
+    def test_errors_not_stored(self):
+        fetcher = self.get_fetcher([FakeResponse(404, b"Not found")], cache=self.cache, retries=0)
+        self.assertEqual(fetcher.get(URL).status_code, 404)
+        self.assertIsNone(self.cache.open_body(URL))
+
+
+class TestHostRateLimiter(SimpleTestCase):
+    def test_wait(self):
+        limiter = HostRateLimiter(rate=2)
+        with mock.patch.object(fetch.time, "monotonic", return_value=100.0):
+            with mock.patch.object(fetch.time, "sleep") as sleep:
+                for url in (URL, URL, "https://example.com/", URL):
+                    limiter.wait(url)
+        # Half a second between the requests sent to the same host
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.5, 1.0])
+
+    def test_unlimited(self):
+        limiter = HostRateLimiter(rate=None)
+        with mock.patch.object(fetch.time, "sleep") as sleep:
+            limiter.wait(URL)
+            limiter.wait(URL)
+        sleep.assert_not_called()
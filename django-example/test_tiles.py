@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_tiles
+------------
+
+Tests for `django-inspire-eu` vector tiles.
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.gis.geos import LineString, MultiPoint, MultiPolygon, Point, Polygon
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.test import RequestFactory, SimpleTestCase
+
+from inspire_eu import views
+from inspire_eu.models.buildings import Building
+from inspire_eu.tiles import (
+    FileSystemTileCache,
+    LayerEncoder,
+    SQLiteTileCache,
+    cache,
+    encode_tile,
+    get_cached_tile,
+    get_tile_layers,
+    tile_range,
+)
+from inspire_eu.tiles.layers import to_web_mercator
+from inspire_eu.tiles.mvt import GeometryEncoder, TileTransform, encode_value
+
+from .test_buildings import BuildingTestCase
+
+EXTENT = 4096
+
+
+def to_tile(*coords):
+    # Tile grid coordinates (y axis down) in the CRS of bounds (0, 0, EXTENT, EXTENT)
+    return [(x, EXTENT - y) for x, y in coords]
+
+
+class TestMVTEncoder(SimpleTestCase):
+    def encode(self, geometry):
+        return GeometryEncoder(TileTransform((0, 0, EXTENT, EXTENT), EXTENT)).encode(geometry)
+
+    def test_geometries(self):
+        # Examples of the Mapbox Vector Tile specification 2.1, 4.3.5
+        self.assertEqual(self.encode(Point(to_tile((25, 17))[0])), (1, [9, 50, 34]))
+        self.assertEqual(
+            self.encode(MultiPoint(*(Point(p) for p in to_tile((5, 7), (3, 2))))),
+            (1, [17, 10, 14, 3, 9]),
+        )
+        self.assertEqual(
+            self.encode(LineString(to_tile((2, 2), (2, 10), (10, 10)))),
+            (2, [9, 4, 4, 18, 0, 16, 16, 0]),
+        )
+        self.assertEqual(
+            self.encode(Polygon(to_tile((3, 6), (8, 12), (20, 34), (3, 6)))),
+            (3, [9, 6, 12, 18, 10, 12, 24, 44, 15]),
+        )
+
+    def test_ring_winding(self):
+        # Counter-clockwise on screen: reversed, as exterior rings are clockwise
+        _type, commands = self.encode(Polygon(to_tile((3, 6), (20, 34), (8, 12), (3, 6))))
+        # (8, 12), (20, 34), (3, 6)
+        self.assertEqual(commands, [9, 16, 24, 18, 24, 44, 33, 55, 15])
+
+    def test_vanishing(self):
+        # Smaller than a cell of the grid
+        self.assertEqual(self.encode(Polygon(((0, 0), (0.1, 0), (0.1, 0.1), (0, 0)))), (None, None))
+        self.assertEqual(self.encode(LineString((0, 0), (0.1, 0.1))), (None, None))
+
+    def test_values(self):
+        self.assertEqual(encode_value("a"), b"\x0a\x01a")
+        self.assertEqual(encode_value(True), b"\x38\x01")
+        self.assertEqual(encode_value(150), b"\x28\x96\x01")
+        self.assertEqual(encode_value(-1), b"\x30\x01")
+
+    def test_layer(self):
+        layer = LayerEncoder("parcels", (0, 0, EXTENT, EXTENT), EXTENT)
+        self.assertEqual(encode_tile([layer]), b"")
+        self.assertTrue(layer.add_feature(Point(1, 1), dict({"label": "1", "empty": None}), id=1))
+        self.assertTrue(layer.add_feature(Point(2, 2), dict({"label": "1"}), id=2))
+        self.assertFalse(layer.add_feature(Point(1, 1).buffer(0.01).difference(Point(1, 1).buffer(1))))
+        self.assertEqual(len(layer), 2)
+        # Keys and values shared by the features, empty values left out
+        self.assertEqual(list(layer.keys), ["label"])
+        self.assertEqual(list(layer.values), [encode_value("1")])
+        tile = encode_tile([layer, LayerEncoder("empty", (0, 0, EXTENT, EXTENT), EXTENT)])
+        self.assertEqual(tile[:1], b"\x1a")
+        self.assertIn(b"parcels", tile)
+        self.assertNotIn(b"empty", tile)
+
+
+class TestTileView(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.building = self.create_building("1")
+        self.factory = RequestFactory()
+        bounds = to_web_mercator(self.building.geometry.extent, self.building.geometry.srid)
+        self.z = 16
+        self.x, self.y, _xmax, _ymax = tile_range(bounds, self.z)
+
+    def get(self, layer, z, x, y, **headers):
+        return views.tile(self.factory.get("/", **headers), layer, str(z), str(x), str(y))
+
+    def test_tile(self):
+        response = self.get("buildings", self.z, self.x, self.y)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.mapbox-vector-tile")
+        self.assertEqual(response.content, get_tile_layers()["buildings"].get_tile(self.z, self.x, self.y))
+        self.assertIn(b"buildings", response.content)
+        self.assertIn("max-age=", response["Cache-Control"])
+        # Revalidation of an unchanged tile
+        response = self.get("buildings", self.z, self.x, self.y, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_empty(self):
+        # Out of the zoom levels of the layer
+        response = self.get("buildings", 3, 0, 0)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["ETag"], f'"{views.get_tile_digest(b"")}"')
+
+    def test_not_found(self):
+        for layer, z, x, y in (("unknown", 0, 0, 0), ("buildings", 1, 2, 0), ("buildings", 25, 0, 0)):
+            with self.subTest(layer=layer, z=z, x=x, y=y):
+                with self.assertRaises(views.Http404):
+                    self.get(layer, z, x, y)
+
+
+class TestFileSystemTileCache(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = self.get_cache()
+
+    def get_cache(self):
+        return FileSystemTileCache(os.path.join(self.directory, "tiles"))
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get("buildings", 1, 0, 1))
+        self.cache.set("buildings", 1, 0, 1, b"old")
+        self.cache.set("buildings", 1, 0, 1, b"tile")
+        # Tiles without features are cached too
+        self.cache.set("buildings", 1, 1, 1, b"")
+        self.assertEqual(self.cache.get("buildings", 1, 0, 1), b"tile")
+        self.assertEqual(self.cache.get("buildings", 1, 1, 1), b"")
+        self.assertIsNone(self.cache.get("cadastral-parcels", 1, 0, 1))
+
+    def test_delete_range(self):
+        for x in range(4):
+            for y in range(4):
+                self.cache.set("buildings", 2, x, y, b"tile")
+        self.cache.set("buildings", 3, 1, 1, b"tile")
+        self.cache.set("cadastral-parcels", 2, 1, 1, b"tile")
+        self.assertEqual(self.cache.delete_range("buildings", 2, 1, 1, 2, 3), 6)
+        self.assertEqual(
+            [(x, y) for x in range(4) for y in range(4) if self.cache.get("buildings", 2, x, y) is None],
+            [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)],
+        )
+        # Other zoom levels and layers are kept
+        self.assertEqual(self.cache.get("buildings", 3, 1, 1), b"tile")
+        self.assertEqual(self.cache.get("cadastral-parcels", 2, 1, 1), b"tile")
+        self.assertEqual(self.cache.delete_range("buildings", 5, 0, 0, 31, 31), 0)
+
+    def test_clear(self):
+        self.cache.set("buildings", 1, 0, 0, b"tile")
+        self.cache.set("cadastral-parcels", 1, 0, 0, b"tile")
+        self.cache.clear("buildings")
+        self.assertIsNone(self.cache.get("buildings", 1, 0, 0))
+        self.assertEqual(self.cache.get("cadastral-parcels", 1, 0, 0), b"tile")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("cadastral-parcels", 1, 0, 0))
+
+
+class TestSQLiteTileCache(TestFileSystemTileCache):
+    def get_cache(self):
+        return SQLiteTileCache(os.path.join(self.directory, "tiles.sqlite"))
+
+    def test_tms_rows(self):
+        self.cache.set("buildings", 2, 1, 0, b"tile")
+        # Counted from the bottom, as in MBTiles
+        row = self.cache.connection.execute("SELECT tile_column, tile_row FROM tiles").fetchone()
+        self.assertEqual(row, (1, 3))
+
+
+class TestTileCacheInvalidation(BuildingTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = FileSystemTileCache(directory)
+        patcher = mock.patch.object(cache, "get_tile_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tile_layer = get_tile_layers()["buildings"]
+        self.z = 16
+
+    def get_tile(self, bbox):
+        """Tile of the buildings layer with the center of ``bbox``"""
+        x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+        xmin, ymin, _xmax, _ymax = tile_range(to_web_mercator((x, y, x, y), 4326), self.z)
+        return self.z, xmin, ymin
+
+    def test_get_cached_tile(self):
+        z, x, y = self.get_tile((-3.7, 40.4, -3.699, 40.401))
+        self.create_building("1")
+        with mock.patch.object(self.tile_layer, "get_tile", wraps=self.tile_layer.get_tile) as get_tile:
+            data = get_cached_tile(self.tile_layer, z, x, y)
+            self.assertEqual(get_cached_tile(self.tile_layer, z, x, y), data)
+            self.assertEqual(get_tile.call_count, 1)
+            get_cached_tile(self.tile_layer, z, x, y, force=True)
+            self.assertEqual(get_tile.call_count, 2)
+            # Deeper than INSPIRE_EU_TILES_CACHE_MAX_ZOOM: never cached
+            get_cached_tile(self.tile_layer, 19, 0, 0)
+            get_cached_tile(self.tile_layer, 19, 0, 0)
+            self.assertEqual(get_tile.call_count, 4)
+        self.assertIn(b"buildings", self.cache.get("buildings", z, x, y))
+        self.assertIsNone(self.cache.get("buildings", 19, 0, 0))
+        # Out of the zoom levels of the layer
+        self.assertEqual(get_cached_tile(self.tile_layer, 3, 0, 0), b"")
+
+    def test_seed_tiles(self):
+        tile = self.get_tile((-3.7, 40.4, -3.699, 40.401))
+        self.create_building("1")
+        self.assertEqual(cache.seed_tiles("buildings", [tile, (16, 0, 0)]), {"built": 2, "empty": 1, "cached": 0})
+        self.assertEqual(cache.seed_tiles("buildings", [tile, (16, 0, 0)]), {"built": 0, "empty": 0, "cached": 2})
+        self.assertEqual(
+            cache.seed_tiles("buildings", [tile], force=True),
+            {"built": 1, "empty": 0, "cached": 0},
+        )
+
+    def test_signals(self):
+        for signal, receiver in (
+            (pre_save, cache.tiled_model_pre_save),
+            (post_save, cache.tiled_model_changed),
+            (post_delete, cache.tiled_model_changed),
+        ):
+            signal.connect(receiver, sender=Building, dispatch_uid="test_tiles")
+            self.addCleanup(signal.disconnect, sender=Building, dispatch_uid="test_tiles")
+        old, new, far = (-3.7, 40.4, -3.699, 40.401), (-3.6, 40.4, -3.599, 40.401), (2.1, 41.3, 2.101, 41.301)
+        building = self.create_building("1", bbox=old)
+        tiles = [self.get_tile(bbox) for bbox in (old, new, far)]
+        for z, x, y in tiles:
+            self.cache.set("buildings", z, x, y, b"tile")
+        building.geometry = MultiPolygon(Polygon.from_bbox(new), srid=4326)
+        building.save()
+        # Where it was and where it is now
+        self.assertEqual([self.cache.get("buildings", *tile) for tile in tiles], [None, None, b"tile"])
+        for z, x, y in tiles:
+            self.cache.set("buildings", z, x, y, b"tile")
+        building.delete()
+        self.assertEqual([self.cache.get("buildings", *tile) for tile in tiles], [b"tile", None, b"tile"])
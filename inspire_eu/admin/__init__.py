@@ -5,30 +5,57 @@ from django.contrib import admin
 from ..models import (
     INSPIRE_EU_THEMES,
     ApplicationSchema,
+    ApplicationSchemaTranslation,
     CodeList,
+    CodeListTranslation,
     CodeListValue,
+    CodeListValueTranslation,
     Namespace,
+    RegistrySyncCheckpoint,
+    RegistrySyncRun,
+    RegistrySyncState,
     Status,
     Theme,
+    ThemeTranslation,
     UnitOfMeasure,
 )
 
 log = logging.getLogger(__name__)
 
 
+class ApplicationSchemaTranslationInline(admin.TabularInline):
+    model = ApplicationSchemaTranslation
+    extra = 0
+
+
+class CodeListTranslationInline(admin.TabularInline):
+    model = CodeListTranslation
+    extra = 0
+
+
+class CodeListValueTranslationInline(admin.TabularInline):
+    model = CodeListValueTranslation
+    extra = 0
+
+
+class ThemeTranslationInline(admin.TabularInline):
+    model = ThemeTranslation
+    extra = 0
+
+
 @admin.register(ApplicationSchema)
 class ApplicationSchemaAdmin(admin.ModelAdmin):
-    pass
+    inlines = [ApplicationSchemaTranslationInline]
 
 
 @admin.register(CodeList)
 class CodeListAdmin(admin.ModelAdmin):
-    pass
+    inlines = [CodeListTranslationInline]
 
 
 @admin.register(CodeListValue)
 class CodeListValueAdmin(admin.ModelAdmin):
-    pass
+    inlines = [CodeListValueTranslationInline]
 
 
 @admin.register(Namespace)
@@ -36,6 +63,24 @@ class NamespaceAdmin(admin.ModelAdmin):
     pass
 
 
+class RegistrySyncCheckpointInline(admin.TabularInline):
+    model = RegistrySyncCheckpoint
+    extra = 0
+    raw_id_fields = ["code_list"]
+
+
+@admin.register(RegistrySyncRun)
+class RegistrySyncRunAdmin(admin.ModelAdmin):
+    list_display = ["started_at", "languages", "stage", "finished_at"]
+    inlines = [RegistrySyncCheckpointInline]
+
+
+@admin.register(RegistrySyncState)
+class RegistrySyncStateAdmin(admin.ModelAdmin):
+    list_display = ["code_list", "language", "feed_updated", "synced_at"]
+    list_filter = ["language"]
+
+
 @admin.register(Status)
 class StatusAdmin(admin.ModelAdmin):
     pass
@@ -43,7 +88,7 @@ class StatusAdmin(admin.ModelAdmin):
 
 @admin.register(Theme)
 class ThemeAdmin(admin.ModelAdmin):
-    pass
+    inlines = [ThemeTranslationInline]
 
 
 @admin.register(UnitOfMeasure)
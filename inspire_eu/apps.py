@@ -1,7 +1,40 @@
 # -*- coding: utf-8
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class InspireEuConfig(AppConfig):
     name = "inspire_eu"
     default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from .models import INSPIRE_EU_THEMES, CodeList, CodeListValue
+        from .models.cache import code_list_changed, code_list_value_changed
+
+        for signal in (post_save, post_delete):
+            signal.connect(code_list_value_changed, sender=CodeListValue, dispatch_uid="inspire_eu_clv_cache")
+            signal.connect(code_list_changed, sender=CodeList, dispatch_uid="inspire_eu_cl_cache")
+
+        if INSPIRE_EU_THEMES.get("cadastral_parcels"):
+            from .models.cadastral_parcels import CadastralParcel, CadastralZoning
+            from .models.cadastral_parcels.cache import cadastral_parcel_changed, cadastral_zoning_changed
+
+            for signal in (post_save, post_delete):
+                signal.connect(cadastral_parcel_changed, sender=CadastralParcel, dispatch_uid="inspire_eu_cp_cache")
+                signal.connect(cadastral_zoning_changed, sender=CadastralZoning, dispatch_uid="inspire_eu_cz_cache")
+
+        if INSPIRE_EU_THEMES.get("buildings"):
+            from .models.buildings.summary import INSPIRE_EU_BUILDING_SUMMARY, connect_signals
+
+            if INSPIRE_EU_BUILDING_SUMMARY:
+                connect_signals()
+
+        from .tiles.cache import get_tile_cache, tiled_model_changed, tiled_model_pre_save
+        from .tiles.layers import get_tile_layers
+
+        if get_tile_cache() is not None:
+            for model in {layer.get_model() for layer in get_tile_layers().values()}:
+                uid = f"inspire_eu_tiles_{model._meta.model_name}"
+                pre_save.connect(tiled_model_pre_save, sender=model, dispatch_uid=uid)
+                post_save.connect(tiled_model_changed, sender=model, dispatch_uid=uid)
+                post_delete.connect(tiled_model_changed, sender=model, dispatch_uid=uid)
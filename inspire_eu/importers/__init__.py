@@ -0,0 +1,12 @@
+"""Streaming importers of INSPIRE GML datasets into the theme models
+
+Theme importers (as :mod:`inspire_eu.importers.cadastral_parcels`) are only importable when their theme is
+enabled at ``INSPIRE_EU_THEMES``.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+from .base import FeatureImporter  # noqa
+from .gml import GeometryBuilder, expand_paths, iter_features, open_sources  # noqa
+from .loaders import BulkCreateLoader, PostgresCopyLoader, TableLoader, get_loader  # noqa
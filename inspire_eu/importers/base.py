@@ -0,0 +1,562 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree.ElementTree import ParseError
+
+import django
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ..models import (
+    INSPIRE_EU_DEFAULT_SRID,
+    INSPIRE_EU_THEMES,
+    CodeList,
+    CodeListValue,
+    Namespace,
+    UnitOfMeasure,
+    get_code_list_slug,
+    get_code_list_value_slug,
+)
+from ..tiles.cache import invalidate_tiles
+from .gml import GML_ID, GeometryBuilder, expand_paths, get_identifier, iter_features, local_name, open_sources
+from .loaders import get_loader
+
+log = logging.getLogger(__name__)
+
+
+class FeatureImporter:
+    """Feature Importer
+
+    Definition
+        Base class of the streaming importers of INSPIRE GML datasets.
+
+    Description
+        Subclasses map the local name of every feature type they read to a method building an unsaved model
+        instance from its element (``builders``). Instances are written with ``bulk_create`` every
+        ``batch_size`` features of the same model, so memory use does not depend on the size of the dataset.
+
+        ``Namespace``, code list values and units of measure are resolved through in-memory maps filled on
+        first use, the values of all the code lists of ``code_lists`` with one query. Features already stored
+        (same namespace, local id and version id) are skipped or, with ``update``, rewritten when their content
+        changed (see :meth:`~inspire_eu.models.abstract.IdentifierManager.upsert_by_identifier`).
+
+        With ``copy`` the models of ``copy_models`` are written through a
+        :class:`~inspire_eu.importers.loaders.TableLoader` instead (``COPY`` on PostgreSQL).
+
+        Importers are context managers: on exit the loaders are closed (rebuilding the indexes dropped with
+        ``drop_indexes``) and the references between features that could not be resolved while reading them
+        (``get_pending``) are resolved, as by then all of them are written.
+
+        :meth:`import_paths` spreads the files over a pool of processes, every one with its own importer and
+        database connection, and merges their statistics and unresolved references.
+    """
+
+    builders = dict()
+    batch_size = 1000
+    # Code lists whose values are read into memory at once, by code (``CurrentUseValue``)
+    code_lists = ()
+    # Models whose primary keys are not needed once written
+    copy_models = ()
+
+    def __init__(self, batch_size=None, source_srid=None, stdout=None, copy=False, drop_indexes=False, update=False):
+        if batch_size:
+            self.batch_size = batch_size
+        self.stdout = stdout
+        self.update = update
+        self.copy = copy
+        self.drop_indexes = drop_indexes
+        self.loaders = dict()
+        self.sources = list()
+        self.failed = list()
+        self.geometry_builder = GeometryBuilder(INSPIRE_EU_DEFAULT_SRID, source_srid)
+        self.now = timezone.now()
+        self.batches = dict()
+        self.stats = dict()
+        self.namespaces = None
+        self.code_list_values = dict()
+        self.code_list_index = None
+        self.units = None
+        self.extents = dict()
+        self._max_lengths = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type, exc_value, traceback)
+
+    # Maps ####################################################################
+
+    def get_namespace_id(self, code):
+        if self.namespaces is None:
+            self.namespaces = dict(Namespace.objects.values_list("code", "pk"))
+        code = code[:32]
+        if code not in self.namespaces:
+            self.namespaces[code] = self.create_namespace(code)
+        return self.namespaces[code]
+
+    def create_namespace(self, code):
+        """Namespace with that code, unless another process created it meanwhile"""
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                # Worker processes importing at the same time would create it twice
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"inspire_eu.namespace.{code}"])
+            pk = Namespace.objects.filter(code=code).order_by("pk").values_list("pk", flat=True).first()
+            if pk is None:
+                pk = Namespace.objects.create(code=code).pk
+        return pk
+
+    def get_code_list_value_id(self, href):
+        """Code list value of a registry link, created ad-hoc when it is missing (see ``CodeListValue.search``)"""
+        if not href:
+            return None
+        if href not in self.code_list_values:
+            path = href.rstrip("/").split("/")
+            pk = None
+            if len(path) > 1:
+                key = (get_code_list_slug(path[-2]), get_code_list_value_slug(path[-1]))
+                pk = self.load_code_list_values().get(key)
+            if pk is None:
+                try:
+                    pk = CodeListValue.search(href.rstrip("/")).pk
+                except (CodeList.DoesNotExist, IndexError) as e:
+                    log.warning(f"{href}: {e}")
+            self.code_list_values[href] = pk
+        return self.code_list_values[href]
+
+    def load_code_list_values(self):
+        """Primary keys of the values of ``code_lists``, by code list slug and value slug"""
+        if self.code_list_index is None:
+            self.code_list_index = dict()
+            if self.code_lists:
+                for code_list_slug, slug, pk in CodeListValue.objects.filter(
+                    code_list__slug__in=[get_code_list_slug(code) for code in self.code_lists],
+                ).values_list("code_list__slug", "slug", "pk"):
+                    self.code_list_index[(code_list_slug, slug)] = pk
+        return self.code_list_index
+
+    def get_unit_id(self, uom):
+        if not uom:
+            return None
+        if self.units is None:
+            self.units = dict()
+            for pk, symbol, name in UnitOfMeasure.objects.values_list("pk", "symbol", "name"):
+                self.units.setdefault(symbol, pk)
+                self.units.setdefault(name, pk)
+        return self.units.get(uom) or self.units.get(uom.split(":")[-1].split("/")[-1])
+
+    # Building ################################################################
+
+    def get_identifier_fields(self, elem):
+        namespace, local_id, version_id = get_identifier(elem)
+        if not namespace or not local_id:
+            gml_id = elem.get(GML_ID) or ""
+            namespace, _sep, local_id = gml_id.rpartition(".")
+        if not local_id:
+            return None
+        return dict(
+            {
+                "namespace_id": self.get_namespace_id(namespace or "-"),
+                "local_id": local_id,
+                "version_id": version_id,
+            },
+        )
+
+    def truncate(self, obj):
+        """Cut the strings longer than their column, which would make the whole batch fail"""
+        model = type(obj)
+        if model not in self._max_lengths:
+            self._max_lengths[model] = [
+                (f.attname, f.max_length)
+                for f in model._meta.concrete_fields
+                if isinstance(f, models.CharField) and f.max_length
+            ]
+        for attname, max_length in self._max_lengths[model]:
+            value = getattr(obj, attname)
+            if value and len(value) > max_length:
+                setattr(obj, attname, value[:max_length])
+        return obj
+
+    # Reading #################################################################
+
+    def get_stats(self, name):
+        """Statistics of a model, keyed by its name, which is also the name of its feature type"""
+        if not isinstance(name, str):
+            name = name._meta.object_name
+        return self.stats.setdefault(name, dict({"read": 0, "created": 0, "updated": 0, "skipped": 0, "errors": 0}))
+
+    def get_worker_kwargs(self):
+        """Arguments of the importers of the worker processes"""
+        return dict(
+            {
+                "batch_size": self.batch_size,
+                "source_srid": self.geometry_builder.default_source_srid,
+                "copy": self.copy,
+                "update": self.update,
+            },
+        )
+
+    def import_paths(self, paths, jobs=1):
+        """Import several GML or zip files, ``jobs`` of them at the same time in worker processes
+
+        Files that can not be read or parsed are logged and kept at ``failed`` as ``(path, error)``, and so are the
+        files whose worker failed, with any exception: the other files are imported all the same.
+        """
+        if jobs <= 1 or len(paths) <= 1:
+            for path in paths:
+                try:
+                    self.import_path(path)
+                except (OSError, ParseError) as e:
+                    log.error(f"{path}: {e}")
+                    self.failed.append((path, str(e)))
+            return self.stats
+        # Biggest files first, for the last ones not to keep a single worker busy
+        paths = sorted(paths, key=lambda path: os.path.getsize(path) if os.path.isfile(path) else 0, reverse=True)
+        # Connections must not be shared with the forked workers: each one opens its own
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+            futures = {
+                executor.submit(import_in_worker, type(self), self.get_worker_kwargs(), path): path for path in paths
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    sources, stats, pending = future.result()
+                except Exception as e:
+                    # Database errors, a worker killed (BrokenProcessPool), ...: the file is reported as failed
+                    log.exception(f"{path}: {e}")
+                    self.failed.append((path, str(e) or type(e).__name__))
+                    continue
+                for source in sources:
+                    self.report_source(*source)
+                for name, model_stats in stats.items():
+                    totals = self.get_stats(name)
+                    for key, value in model_stats.items():
+                        totals[key] += value
+                self.add_pending(pending)
+        if self.failed:
+            failed = ", ".join(path for path, _error in self.failed)
+            log.error(f"{len(self.failed)} of {len(paths)} files not imported: {failed}")
+        return self.stats
+
+    def import_path(self, path):
+        """Import every feature of a GML file, or of the GML files in a zip file
+
+        Returns:
+            dict: Statistics by model name
+        """
+        for name, f in open_sources(path):
+            started = time.monotonic()
+            count = 0
+            for elem in iter_features(f, self.builders):
+                count += 1
+                self.import_feature(elem)
+            self.flush_all()
+            self.report_source(name, count, time.monotonic() - started)
+        return self.stats
+
+    def report_source(self, name, count, elapsed):
+        self.sources.append((name, count, elapsed))
+        if self.stdout:
+            self.stdout.write(f"{name}: {count} features in {elapsed:.1f}s ({count / (elapsed or 1):.0f}/s)")
+
+    def import_feature(self, elem):
+        name = local_name(elem.tag)
+        try:
+            obj = getattr(self, self.builders[name])(elem)
+        except (GDALException, GEOSException, ValueError, TypeError) as e:
+            log.warning(f"{elem.get(GML_ID)}: {e}")
+            obj = None
+        if obj is None:
+            self.get_stats(name)["errors"] += 1
+            return
+        model = type(obj)
+        stats = self.get_stats(model)
+        stats["read"] += 1
+        self.extend_extent(obj)
+        batch = self.batches.setdefault(model, list())
+        batch.append(self.truncate(obj))
+        if len(batch) >= self.batch_size:
+            self.flush(model)
+
+    def extend_extent(self, obj):
+        """Grow the extent of the geometries read of a model: their cached tiles are dropped at the end"""
+        geometry = getattr(obj, "geometry", None)
+        if geometry is None or geometry.empty:
+            return
+        model = type(obj)
+        xmin, ymin, xmax, ymax = geometry.extent
+        if model in self.extents:
+            (x0, y0, x1, y1), _srid = self.extents[model]
+            xmin, ymin, xmax, ymax = min(xmin, x0), min(ymin, y0), max(xmax, x1), max(ymax, y1)
+        self.extents[model] = ((xmin, ymin, xmax, ymax), geometry.srid)
+
+    def get_pending(self):
+        """References not resolved yet, as a picklable dict"""
+        return dict()
+
+    def add_pending(self, pending):
+        """Take over the references left unresolved by another importer (a worker process)"""
+
+    def resolve_pending(self):
+        """Resolve the pending references, once all features are written"""
+
+    # Writing #################################################################
+
+    def flush_all(self):
+        for model in list(self.batches):
+            self.flush(model)
+
+    def flush(self, model):
+        """Write the pending instances of a model"""
+        objs = self.batches.pop(model, None)
+        if not objs:
+            return
+        if self.copy and model in self.copy_models:
+            self.get_loader(model).add_many(objs)
+            return
+        stats = self.get_stats(model)
+        if self.update:
+            self.upsert(model, objs, stats)
+        else:
+            objs = self.exclude_existing(model, objs, stats)
+            if objs:
+                model.objects.set_content_hashes(objs)
+                self.bulk_create(model, objs, stats)
+        self.after_flush(model, objs)
+
+    def exclude_existing(self, model, objs, stats):
+        """Drop the instances already stored (same namespace, local id and version id), one query per batch"""
+        existing = set(
+            model.objects.filter(local_id__in={obj.local_id for obj in objs}).values_list(
+                "namespace_id",
+                "local_id",
+                "version_id",
+            ),
+        )
+        keep = list()
+        seen = set()
+        for obj in objs:
+            key = (obj.namespace_id, obj.local_id, obj.version_id)
+            if key in existing or key in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(key)
+            keep.append(obj)
+        return keep
+
+    def upsert(self, model, objs, stats):
+        """upsert_by_identifier inside a savepoint, falling back to one object at a time when it fails"""
+        try:
+            with transaction.atomic():
+                result = model.objects.upsert_by_identifier(objs, batch_size=self.batch_size)
+        except DatabaseError as e:
+            log.warning(f"{model._meta.object_name}: {e}. Retrying row by row")
+            result = dict({"inserted": 0, "updated": 0, "unchanged": 0})
+            for obj in objs:
+                obj.pk = None
+                try:
+                    with transaction.atomic():
+                        for key, value in model.objects.upsert_by_identifier([obj]).items():
+                            result[key] += value
+                except DatabaseError as e:
+                    log.error(f"{model._meta.object_name} {obj.local_id}: {e}")
+                    stats["errors"] += 1
+        stats["created"] += result["inserted"]
+        stats["updated"] += result["updated"]
+        stats["skipped"] += result["unchanged"]
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.fill_pks(model, objs)
+
+    def bulk_create(self, model, objs, stats):
+        """bulk_create inside a savepoint, falling back to one query per row when it fails"""
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(objs, batch_size=self.batch_size)
+            stats["created"] += len(objs)
+        except DatabaseError as e:
+            log.warning(f"{model._meta.object_name}: {e}. Retrying row by row")
+            for obj in objs:
+                obj.pk = None
+                try:
+                    with transaction.atomic():
+                        obj.save(force_insert=True)
+                    stats["created"] += 1
+                except DatabaseError as e:
+                    log.error(f"{model._meta.object_name} {obj.local_id}: {e}")
+                    stats["errors"] += 1
+        if not connection.features.can_return_rows_from_bulk_insert:
+            self.fill_pks(model, objs)
+
+    def fill_pks(self, model, objs):
+        """Primary keys of instances created by backends that do not return them from bulk inserts"""
+        missing = {(obj.namespace_id, obj.local_id, obj.version_id): obj for obj in objs if obj.pk is None}
+        if not missing:
+            return
+        for pk, namespace_id, local_id, version_id in model.objects.filter(
+            local_id__in={key[1] for key in missing},
+        ).values_list("pk", "namespace_id", "local_id", "version_id"):
+            obj = missing.get((namespace_id, local_id, version_id))
+            if obj is not None:
+                obj.pk = pk
+
+    def after_flush(self, model, objs):
+        """Hook called with the instances just written, all of them with their primary key"""
+
+    def get_loader(self, model):
+        if model not in self.loaders:
+            loader = get_loader(model, update=self.update, drop_indexes=self.drop_indexes)
+            loader.open()
+            self.loaders[model] = loader
+        return self.loaders[model]
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        """Write what is still pending, close the loaders and resolve the pending references"""
+        if exc_type is None:
+            self.flush_all()
+        loaders, self.loaders = self.loaders, dict()
+        for model, loader in loaders.items():
+            loader.close(exc_type, exc_value, traceback)
+            stats = self.get_stats(model)
+            stats["created"] += loader.stats["inserted"]
+            stats["updated"] += loader.stats["updated"]
+            stats["skipped"] += loader.stats["skipped"]
+        if exc_type is None:
+            self.resolve_pending()
+            # Bulk writes do not send the signals which drop the cached tiles
+            for model, (extent, srid) in self.extents.items():
+                invalidate_tiles(model, extent, srid)
+            self.extents = dict()
+
+
+def init_worker():
+    # Spawned (not forked) workers start without any app loaded
+    django.setup()
+
+
+def import_in_worker(importer_class, kwargs, path):
+    """Import one file in a worker process
+
+    Returns:
+        tuple: ``(sources, stats, pending)``
+    """
+    importer = importer_class(**kwargs)
+    with importer:
+        importer.import_path(path)
+    return importer.sources, importer.stats, importer.get_pending()
+
+
+class ImportCommand(BaseCommand):
+    """Import Command
+
+    Definition
+        Base class of the management commands loading the GML datasets of a theme with a
+        :class:`FeatureImporter`.
+
+    Description
+        Subclasses set the key of the theme at ``INSPIRE_EU_THEMES`` (``theme``) and its name in the messages
+        (``theme_name``), the dotted path of the importer (``importer_class``, imported once the theme is known
+        to be enabled), what ``--copy`` writes (``copy_name``) and the message reporting every kind of
+        reference left unresolved, by key of :meth:`FeatureImporter.get_pending` (``pending_messages``).
+    """
+
+    theme = None
+    theme_name = None
+    importer_class = None
+    copy_name = None
+    pending_messages = dict()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="+",
+            type=str,
+            help=_("GML files, zip files with GML files, directories or glob patterns (quoted) of them"),
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of features written by every bulk insert (default: 1000)"),
+        )
+        parser.add_argument(
+            "-s",
+            "--source-srid",
+            type=int,
+            help=_("SRID of the geometries without srsName (default: INSPIRE_EU_DEFAULT_SRID)"),
+        )
+        parser.add_argument(
+            "-u",
+            "--update",
+            action="store_true",
+            help=_("Rewrite the features already stored whose content changed, instead of skipping them"),
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help=_("Number of files imported at the same time, each one by its own process (default: 1)"),
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help=_("Write %(models)s with COPY through a staging table (PostgreSQL; bulk inserts elsewhere)")
+            % {"models": self.copy_name},
+        )
+        parser.add_argument(
+            "--drop-indexes",
+            action="store_true",
+            help=_("With --copy, drop the indexes of %(models)s during the load and rebuild them afterwards")
+            % {"models": self.copy_name},
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get(self.theme):
+            raise CommandError(_("%(theme)s theme is not enabled at INSPIRE_EU_THEMES") % {"theme": self.theme_name})
+        if kwargs.get("drop_indexes") and kwargs.get("jobs") > 1:
+            raise CommandError(_("--drop-indexes can not be combined with --jobs"))
+        paths = expand_paths(kwargs.get("paths"))
+        if not paths:
+            raise CommandError(_("No file found"))
+
+        importer = import_string(self.importer_class)(
+            batch_size=kwargs.get("batch_size"),
+            source_srid=kwargs.get("source_srid"),
+            stdout=self.stdout if kwargs.get("verbosity") > 0 else None,
+            copy=kwargs.get("copy"),
+            update=kwargs.get("update"),
+            drop_indexes=kwargs.get("drop_indexes"),
+        )
+        started = time.monotonic()
+        with importer:
+            importer.import_paths(paths, jobs=kwargs.get("jobs"))
+        elapsed = time.monotonic() - started
+        # Features read from the files: child rows (heights, current uses, ...) are not features
+        read = sum(count for _name, count, _elapsed in importer.sources)
+        for name, stats in importer.stats.items():
+            self.stdout.write(
+                f"{name}: {stats['read']} read, {stats['created']} created, {stats['updated']} updated, "
+                f"{stats['skipped']} already stored, {stats['errors']} errors",
+            )
+        pending = importer.get_pending()
+        for key, message in self.pending_messages.items():
+            if pending.get(key):
+                self.stdout.write(f"{len(pending[key])} {message}")
+        self.stdout.write(f"{len(paths)} files, {read} features in {elapsed:.1f}s ({read / (elapsed or 1):.0f}/s)")
+        if importer.failed:
+            raise CommandError(
+                _("Files not imported: %(paths)s") % {"paths": ", ".join(path for path, _error in importer.failed)},
+            )
@@ -0,0 +1,427 @@
+import logging
+
+from django.db import DatabaseError, transaction
+
+from ..models.buildings import (
+    Building,
+    BuildingCurrentUse,
+    BuildingDocument,
+    BuildingElevation,
+    BuildingExternalReference,
+    BuildingGeographicalName,
+    BuildingHeightAboveGround,
+    BuildingNature,
+    BuildingSummary,
+    OtherConstruction,
+)
+from ..models.buildings.summary import INSPIRE_EU_BUILDING_SUMMARY, summary_signals_disabled
+from ..models.abstract import get_content_hash
+from .base import FeatureImporter
+from .gml import (
+    GML_ID,
+    XLINK_HREF,
+    find_child,
+    find_children,
+    find_path,
+    get_datetime,
+    get_href,
+    get_identifier,
+    get_number,
+    get_text,
+    iter_values,
+)
+
+log = logging.getLogger(__name__)
+
+# Properties of the constructions with the dates of an event, and the prefix of their fields
+EVENTS = (
+    ("dateOfConstruction", "date_of_construction"),
+    ("dateOfDemolition", "date_of_demolition"),
+    ("dateOfRenovation", "date_of_renovation"),
+)
+
+
+def get_free_text(elem, name):
+    """First text of a property which may be a ``gco:CharacterString`` or a ``gmd:PT_FreeText``"""
+    child = find_child(elem, name)
+    if child is None:
+        return ""
+    return next((t.text.strip() for t in child.iter() if t.text and t.text.strip()), "")
+
+
+class BuildingsImporter(FeatureImporter):
+    """Buildings Importer
+
+    Definition
+        Streaming importer of INSPIRE Buildings 2D (BU core 2D and extended 2D, 4.0) GML datasets:
+        ``bu-core2d:Building``, ``bu-core2d:BuildingPart`` and ``bu-ext2d:OtherConstruction`` members.
+
+    Description
+        Buildings and building parts are both written as :class:`~inspire_eu.models.buildings.Building` (parts with
+        ``is_building_part``). Their heights above ground, current uses, natures, elevations, documents, external
+        references and names are kept on the unsaved building while it waits in its batch: once the batch is
+        written, and every building has its primary key, they are written with one ``bulk_create`` per model.
+        They are part of ``content_hash`` of their building: with ``update`` they replace the ones stored of the
+        buildings inserted or updated, and the ones of unchanged buildings are left as they are.
+
+        Code list values are resolved through an index of the values of ``code_lists``, read with one query.
+
+        ``parts`` references (``xlink:href``, either ``#gml_id`` or an url ending with the identifier) are
+        resolved once all the files are imported, so parts may come before or after their building, or in
+        another file. Parts given inline are imported as the other ones, and linked by their identifier
+        (``namespace.local_id``, or ``gml:id`` when they have no ``inspireId``). ``root_building`` is rebuilt
+        afterwards (unless ``rebuild_roots=False``, as in the worker processes, whose parts are linked by the main
+        importer).
+
+        Other constructions can be written with ``COPY`` (``copy=True``): buildings can not, as their primary keys
+        are needed to write their child rows.
+
+    References
+        * https://inspire.ec.europa.eu/schemas/bu-core2d/4.0/BuildingsCore2D.xsd
+        * https://inspire.ec.europa.eu/schemas/bu-ext2d/4.0/BuildingsExtended2D.xsd
+    """
+
+    builders = dict(
+        {
+            "Building": "build_building",
+            "BuildingPart": "build_building_part",
+            "OtherConstruction": "build_other_construction",
+        },
+    )
+    copy_models = (OtherConstruction,)
+    code_lists = (
+        "BuildingNatureValue",
+        "ConditionOfConstructionValue",
+        "CurrentUseValue",
+        "ElevationReferenceValue",
+        "GrammaticalGenderValue",
+        "GrammaticalNumberValue",
+        "HeightStatusValue",
+        "HorizontalGeometryReferenceValue",
+        "NameStatusValue",
+        "NativenessValue",
+        "OtherConstructionNatureValue",
+        "SourceStatusValue",
+    )
+    # Models of the child rows of a building, replaced with update
+    child_models = (
+        BuildingCurrentUse,
+        BuildingDocument,
+        BuildingElevation,
+        BuildingExternalReference,
+        BuildingGeographicalName,
+        BuildingHeightAboveGround,
+        BuildingNature,
+    )
+
+    def __init__(self, *args, rebuild_roots=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rebuild_roots = rebuild_roots
+        self.pending_parts = list()
+        self.linked_parts = 0
+
+    def get_worker_kwargs(self):
+        kwargs = super().get_worker_kwargs()
+        kwargs["rebuild_roots"] = False
+        return kwargs
+
+    # Building ################################################################
+
+    def get_required_code_list_value_id(self, elem, name):
+        pk = self.get_code_list_value_id(get_href(elem, name))
+        if pk is None:
+            raise ValueError(f"without {name}")
+        return pk
+
+    def get_geometry_2d(self, elem):
+        """``BuildingGeometry2D`` of a construction: the reference one when there are several"""
+        geometries = list(iter_values(elem, "geometry2D"))
+        return next(
+            (geometry for geometry in geometries if get_text(geometry, "referenceGeometry") == "true"),
+            geometries[0] if geometries else None,
+        )
+
+    def build_construction(self, model, elem):
+        identifier = self.get_identifier_fields(elem)
+        if identifier is None:
+            log.warning(f"{elem.get(GML_ID)}: without inspireId")
+            return None
+        obj = model(**identifier)
+        obj.begin_lifespan_version = get_datetime(elem, "beginLifespanVersion") or self.now
+        obj.end_lifespan_version = get_datetime(elem, "endLifespanVersion")
+        obj.condition_of_construction_id = self.get_required_code_list_value_id(elem, "conditionOfConstruction")
+        for name, prefix in EVENTS:
+            event = find_path(elem, name, "DateOfEvent")
+            if event is not None:
+                setattr(obj, f"{prefix}_beginning", get_datetime(event, "beginning"))
+                setattr(obj, f"{prefix}_end", get_datetime(event, "end"))
+                setattr(obj, f"{prefix}_any_point", get_datetime(event, "anyPoint"))
+        return obj
+
+    def build_building(self, elem, is_building_part=False):
+        building = self.build_construction(Building, elem)
+        if building is None:
+            return None
+        building.is_building_part = is_building_part
+        geometry = self.get_geometry_2d(elem)
+        if geometry is None:
+            raise ValueError("without geometry2D")
+        building.geometry = self.geometry_builder.build_multipolygon(find_child(geometry, "geometry"))
+        building.reference_geometry = get_text(geometry, "referenceGeometry", "true") == "true"
+        building.horizontal_geometry_reference_id = self.get_required_code_list_value_id(
+            geometry,
+            "horizontalGeometryReference",
+        )
+        accuracy, uom = get_number(geometry, "horizontalGeometryEstimatedAccuracy")
+        building.horizontal_geometry_estimated_accuracy = accuracy or 0
+        building.horizontal_geometry_estimated_accuracy_uom_id = self.get_unit_id(uom)
+        building.vertical_geometry_reference_id = self.get_code_list_value_id(
+            get_href(geometry, "verticalGeometryReference"),
+        )
+        building.number_of_dwellings, _uom = get_number(elem, "numberOfDwellings", int)
+        building.number_of_building_units, _uom = get_number(elem, "numberOfBuildingUnits", int)
+        building.number_of_floors_above_ground, _uom = get_number(elem, "numberOfFloorsAboveGround", int)
+        building.number_of_floors_below_ground, _uom = get_number(elem, "numberOfFloorsBelowGround", int)
+        building.height_below_ground, uom = get_number(elem, "heightBelowGround")
+        building.height_below_ground_uom_id = self.get_unit_id(uom)
+        building._gml_id = elem.get(GML_ID)
+        building._parts = list(self.get_part_references(elem))
+        building._children = self.build_children(elem)
+        # Child rows are part of content_hash: a building is only rewritten, children included, when any changed
+        building._extra_hash_values = [self.get_children_hash(building._children)]
+        return building
+
+    def get_part_references(self, elem):
+        """``parts`` of a building: the ``xlink:href`` of the referenced ones, and the identifier
+        (``namespace.local_id``) of the ones given inline, which are imported on their own"""
+        for prop in find_children(elem, "parts"):
+            href = prop.get(XLINK_HREF)
+            if href:
+                yield href
+                continue
+            part = find_child(prop, "BuildingPart")
+            if part is None:
+                continue
+            namespace, local_id, _version_id = get_identifier(part)
+            if namespace and local_id:
+                yield f"{namespace}.{local_id}"
+            elif part.get(GML_ID):
+                yield part.get(GML_ID)
+
+    def build_building_part(self, elem):
+        return self.build_building(elem, is_building_part=True)
+
+    def build_other_construction(self, elem):
+        construction = self.build_construction(OtherConstruction, elem)
+        if construction is None:
+            return None
+        geometry = self.get_geometry_2d(elem)
+        if geometry is not None:
+            construction.geometry = self.geometry_builder.build_multipolygon(find_child(geometry, "geometry"))
+        construction.other_construction_nature_id = self.get_code_list_value_id(
+            get_href(elem, "otherConstructionNature"),
+        )
+        return construction
+
+    # Child rows ##############################################################
+
+    def build_children(self, elem):
+        """Unsaved child rows of a building, without it"""
+        children = list()
+        for prop in find_children(elem, "buildingNature"):
+            nature_id = self.get_code_list_value_id(prop.get(XLINK_HREF))
+            if nature_id is not None:
+                children.append(BuildingNature(nature_id=nature_id))
+        for name, method in (
+            ("currentUse", self.build_current_use),
+            ("heightAboveGround", self.build_height_above_ground),
+            ("elevation", self.build_elevation),
+            ("document", self.build_document),
+            ("externalReference", self.build_external_reference),
+            ("name", self.build_geographical_name),
+        ):
+            for value in iter_values(elem, name):
+                try:
+                    child = method(value)
+                except ValueError as e:
+                    log.warning(f"{elem.get(GML_ID)} {name}: {e}")
+                    child = None
+                if child is not None:
+                    children.append(self.truncate(child))
+        return children
+
+    def build_current_use(self, elem):
+        percentage, _uom = get_number(elem, "percentage", int)
+        return BuildingCurrentUse(
+            current_use_id=self.get_required_code_list_value_id(elem, "currentUse"),
+            percentage=percentage,
+        )
+
+    def build_height_above_ground(self, elem):
+        value, _uom = get_number(elem, "value")
+        if value is None:
+            raise ValueError("without value")
+        return BuildingHeightAboveGround(
+            height_reference_id=self.get_required_code_list_value_id(elem, "heightReference"),
+            low_reference_id=self.get_required_code_list_value_id(elem, "lowReference"),
+            status_id=self.get_required_code_list_value_id(elem, "status"),
+            value=round(value),
+        )
+
+    def build_elevation(self, elem):
+        value, uom = get_number(elem, "elevationValue")
+        if value is None:
+            raise ValueError("without elevationValue")
+        # Elevations are given in meters
+        value_uom_id = self.get_unit_id(uom or "m")
+        if value_uom_id is None:
+            raise ValueError(f"unknown unit of measure {uom or 'm'}")
+        position = find_child(elem, "elevationValue")
+        dimension = position.get("srsDimension")
+        return BuildingElevation(
+            reference_id=self.get_required_code_list_value_id(elem, "elevationReference"),
+            value=value,
+            value_uom_id=value_uom_id,
+            dimension=int(dimension) if dimension else None,
+        )
+
+    def build_document(self, elem):
+        document_link = get_text(elem, "documentLink")
+        if not document_link:
+            raise ValueError("without documentLink")
+        return BuildingDocument(
+            document_link=document_link,
+            date=get_datetime(elem, "date"),
+            document_description=get_free_text(elem, "documentDescription"),
+            source_status_id=self.get_required_code_list_value_id(elem, "sourceStatus"),
+        )
+
+    def build_external_reference(self, elem):
+        return BuildingExternalReference(
+            information_system=get_text(elem, "informationSystem"),
+            information_system_name=get_free_text(elem, "informationSystemName"),
+            reference=get_text(elem, "reference"),
+        )
+
+    def build_geographical_name(self, elem):
+        spelling = find_path(elem, "spelling", "SpellingOfName")
+        pronunciation = find_path(elem, "pronunciation", "PronunciationOfName")
+        return BuildingGeographicalName(
+            language=get_text(elem, "language"),
+            nativeness_id=self.get_code_list_value_id(get_href(elem, "nativeness")),
+            name_status_id=self.get_code_list_value_id(get_href(elem, "nameStatus")),
+            source_of_name=get_text(elem, "sourceOfName"),
+            pronunciation=get_text(pronunciation, "pronunciationIPA") if pronunciation is not None else "",
+            spelling=get_text(spelling, "text") if spelling is not None else "",
+            grammatical_gender_id=self.get_code_list_value_id(get_href(elem, "grammaticalGender")),
+            grammatical_number_id=self.get_code_list_value_id(get_href(elem, "grammaticalNumber")),
+        )
+
+    def get_children_hash(self, children):
+        values = list()
+        for child in children:
+            values.append(child._meta.label)
+            values.extend(
+                getattr(child, f.attname)
+                for f in child._meta.concrete_fields
+                if not f.primary_key and f.name != "building"
+            )
+        return get_content_hash(values)
+
+    # Writing #################################################################
+
+    def after_flush(self, model, objs):
+        if model is not Building:
+            return
+        buildings = [building for building in objs if building.pk is not None]
+        for building in buildings:
+            for href in building._parts:
+                self.pending_parts.append((building.pk, href))
+        if self.update:
+            # Buildings found unchanged by upsert_by_identifier keep their child rows, as those are hashed too
+            buildings = [
+                building
+                for building in buildings
+                if getattr(building, "_upsert_result", None) in ("inserted", "updated")
+            ]
+        children = dict()
+        for building in buildings:
+            for child in building._children:
+                child.building_id = building.pk
+                children.setdefault(type(child), list()).append(child)
+            # Written: the batch of children must not keep them alive
+            building._children = list()
+        # Summaries are refreshed once below, not on every child row deleted or saved
+        with summary_signals_disabled():
+            if self.update and buildings:
+                pks = [building.pk for building in buildings]
+                with transaction.atomic():
+                    for child_model in self.child_models:
+                        child_model.objects.filter(building_id__in=pks).delete()
+            for child_model, rows in children.items():
+                self.write_children(child_model, rows)
+        if INSPIRE_EU_BUILDING_SUMMARY and buildings:
+            # Bulk writes do not send the signals which keep them in sync
+            BuildingSummary.objects.refresh([building.pk for building in buildings], batch_size=self.batch_size)
+
+    def write_children(self, model, rows):
+        """bulk_create inside a savepoint, falling back to one query per row when it fails"""
+        stats = self.get_stats(model)
+        stats["read"] += len(rows)
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(rows, batch_size=self.batch_size)
+            stats["created"] += len(rows)
+        except DatabaseError as e:
+            log.warning(f"{model._meta.object_name}: {e}. Retrying row by row")
+            for row in rows:
+                row.pk = None
+                try:
+                    with transaction.atomic():
+                        row.save(force_insert=True)
+                    stats["created"] += 1
+                except DatabaseError as e:
+                    log.error(f"{model._meta.object_name} of building {row.building_id}: {e}")
+                    stats["errors"] += 1
+
+    # References ##############################################################
+
+    def get_pending(self):
+        return dict({"parts": self.pending_parts})
+
+    def add_pending(self, pending):
+        self.pending_parts.extend(pending.get("parts", []))
+
+    def resolve_pending(self):
+        """Link building parts with the buildings listing them, keeping the ones still unknown"""
+        pending = list()
+        for start in range(0, len(self.pending_parts), self.batch_size):
+            batch = self.pending_parts[start:start + self.batch_size]
+            keys = {href: href.rsplit("#", 1)[-1].rstrip("/").rsplit("/", 1)[-1] for _pk, href in batch}
+            local_ids = set(keys.values()) | {key.rpartition(".")[2] for key in keys.values()}
+            parts = dict()
+            # Latest version of every identifier
+            for pk, namespace, local_id, parent_id in (
+                Building.objects.filter(local_id__in=local_ids)
+                .order_by("pk")
+                .values_list("pk", "namespace__code", "local_id", "parent_id")
+            ):
+                parts[local_id] = parts[f"{namespace}.{local_id}"] = (pk, parent_id)
+            updates = list()
+            for parent_id, href in batch:
+                key = keys[href]
+                part = parts.get(key) or parts.get(key.rpartition(".")[2])
+                if part is None:
+                    pending.append((parent_id, href))
+                elif part[0] != parent_id and part[1] != parent_id:
+                    updates.append(Building(pk=part[0], parent_id=parent_id))
+            Building.objects.bulk_update(updates, ["parent"], batch_size=self.batch_size)
+            self.linked_parts += len(updates)
+        self.pending_parts = pending
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        super().close(exc_type, exc_value, traceback)
+        stats = self.get_stats(Building)
+        if exc_type is None and self.rebuild_roots and (self.linked_parts or stats["created"] or stats["updated"]):
+            updated = Building.objects.rebuild_roots(batch_size=self.batch_size)
+            log.info(f"Building: {updated} roots updated")
@@ -0,0 +1,196 @@
+import logging
+
+from ..models.cadastral_parcels import CadastralParcel, CadastralZoning
+from ..models.cadastral_parcels.cache import parcel_lookup_cache
+from .base import FeatureImporter
+from .gml import GML_ID, find_child, get_datetime, get_href, get_number, get_text, iter_descendants
+
+log = logging.getLogger(__name__)
+
+
+class CadastralParcelsImporter(FeatureImporter):
+    """Cadastral Parcels Importer
+
+    Definition
+        Streaming importer of INSPIRE Cadastral Parcels (CP 4.0) GML datasets: ``cp:CadastralZoning`` and
+        ``cp:CadastralParcel`` members.
+
+    Description
+        ``cp:zoning`` and ``cp:upperLevelUnit`` references (``xlink:href``, either ``#gml_id`` or an url ending
+        with the identifier) are resolved against the zonings already stored and the ones read so far, so zonings
+        should be imported before, or earlier in the same file than, their parcels. Parcels whose zoning is still
+        unknown are stored without it and linked once all files are imported (see ``resolve_pending``).
+
+        Parcels can be written with ``COPY`` (``copy=True``): zonings can not, as their primary keys are needed to
+        link them.
+
+        Zonings are written in bulk, so once they are linked ``hierarchy_path`` is rebuilt (unless
+        ``rebuild_hierarchy=False``, as in the worker processes, whose zonings are linked by the main importer).
+
+    References
+        * https://inspire.ec.europa.eu/schemas/cp/4.0/CadastralParcels.xsd
+    """
+
+    builders = dict(
+        {
+            "CadastralZoning": "build_zoning",
+            "CadastralParcel": "build_parcel",
+        },
+    )
+    copy_models = (CadastralParcel,)
+
+    def __init__(self, *args, rebuild_hierarchy=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rebuild_hierarchy = rebuild_hierarchy
+        self.zonings = None
+        self.pending_upper_level_units = list()
+        self.pending_zonings = list()
+
+    def get_worker_kwargs(self):
+        kwargs = super().get_worker_kwargs()
+        kwargs["rebuild_hierarchy"] = False
+        return kwargs
+
+    def get_zoning_keys(self, namespace, local_id, gml_id=None):
+        keys = [local_id, f"{namespace}.{local_id}"]
+        if gml_id:
+            keys.append(gml_id)
+        return keys
+
+    def load_zonings(self):
+        """Map of the zonings already stored, by every key a reference to them may use"""
+        if self.zonings is None:
+            self.zonings = dict()
+            for pk, namespace, local_id in CadastralZoning.objects.values_list("pk", "namespace__code", "local_id"):
+                for key in self.get_zoning_keys(namespace, local_id):
+                    self.zonings[key] = pk
+        return self.zonings
+
+    def get_zoning_id(self, href):
+        """Zoning referenced by ``href``, None when it has not been imported (yet)"""
+        if not href:
+            return None
+        self.load_zonings()
+        key = href.rsplit("#", 1)[-1].rstrip("/").rsplit("/", 1)[-1]
+        if key not in self.zonings and self.batches.get(CadastralZoning):
+            # Referenced zoning may be waiting in the current batch
+            self.flush(CadastralZoning)
+        return self.zonings.get(key)
+
+    def build_common(self, model, elem):
+        identifier = self.get_identifier_fields(elem)
+        if identifier is None:
+            log.warning(f"{elem.get(GML_ID)}: without inspireId")
+            return None
+        obj = model(**identifier)
+        obj.begin_lifespan_version = get_datetime(elem, "beginLifespanVersion") or self.now
+        obj.end_lifespan_version = get_datetime(elem, "endLifespanVersion")
+        obj.valid_from = get_datetime(elem, "validFrom")
+        obj.valid_to = get_datetime(elem, "validTo")
+        obj.label = get_text(elem, "label")
+        obj.geometry = self.geometry_builder.build_multipolygon(find_child(elem, "geometry"))
+        obj.reference_point = self.geometry_builder.build_point(find_child(elem, "referencePoint"))
+        obj._gml_id = elem.get(GML_ID)
+        return obj
+
+    def build_zoning(self, elem):
+        zoning = self.build_common(CadastralZoning, elem)
+        if zoning is None:
+            return None
+        estimated_accuracy, uom = get_number(elem, "estimatedAccuracy")
+        zoning.estimated_accuracy = estimated_accuracy or 0
+        zoning.estimated_accuracy_uom_id = self.get_unit_id(uom)
+        zoning.level_id = self.get_code_list_value_id(get_href(elem, "level"))
+        name = find_child(elem, "name")
+        if name is not None:
+            zoning.name = next((t.text.strip() for t in iter_descendants(name, "text") if t.text), "")
+        zoning.national_cadastal_zoning_reference = get_text(elem, "nationalCadastalZoningReference") or get_text(
+            elem,
+            "nationalCadastralZoningReference",
+        )
+        zoning.original_map_scale_denominator, _uom = get_number(elem, "originalMapScaleDenominator", int)
+        zoning._upper_level_unit = get_href(elem, "upperLevelUnit")
+        return zoning
+
+    def build_parcel(self, elem):
+        parcel = self.build_common(CadastralParcel, elem)
+        if parcel is None:
+            return None
+        parcel.national_cadastral_reference = get_text(elem, "nationalCadastralReference")
+        parcel.area_value, uom = get_number(elem, "areaValue", int)
+        parcel.area_value_uom_id = self.get_unit_id(uom)
+        zoning_href = get_href(elem, "zoning")
+        if zoning_href:
+            parcel.cadastral_zoning_id = self.get_zoning_id(zoning_href)
+            if parcel.cadastral_zoning_id is None:
+                self.pending_zonings.append((parcel.namespace_id, parcel.local_id, parcel.version_id, zoning_href))
+        return parcel
+
+    def after_flush(self, model, objs):
+        if model is not CadastralZoning:
+            return
+        self.load_zonings()
+        namespaces = {pk: code for code, pk in self.namespaces.items()}
+        for zoning in objs:
+            for key in self.get_zoning_keys(namespaces[zoning.namespace_id], zoning.local_id, zoning._gml_id):
+                self.zonings[key] = zoning.pk
+            if zoning._upper_level_unit:
+                self.pending_upper_level_units.append((zoning.pk, zoning._upper_level_unit))
+
+    def get_pending(self):
+        return dict(
+            {
+                "upper_level_units": self.pending_upper_level_units,
+                "zonings": self.pending_zonings,
+            },
+        )
+
+    def add_pending(self, pending):
+        self.pending_upper_level_units.extend(pending.get("upper_level_units", []))
+        self.pending_zonings.extend(pending.get("zonings", []))
+
+    def resolve_pending(self):
+        """Link zonings with their upper level unit and parcels with their zoning, keeping the ones still unknown"""
+        if not self.pending_upper_level_units and not self.pending_zonings:
+            return
+        # Zonings may have been written by other processes meanwhile
+        self.zonings = None
+        updates = list()
+        pending = list()
+        for pk, href in self.pending_upper_level_units:
+            upper_level_unit_id = self.get_zoning_id(href)
+            if upper_level_unit_id is None:
+                pending.append((pk, href))
+            else:
+                updates.append(CadastralZoning(pk=pk, upper_level_unit_id=upper_level_unit_id))
+        CadastralZoning.objects.bulk_update(updates, ["upper_level_unit"], batch_size=self.batch_size)
+        self.pending_upper_level_units = pending
+
+        pending = list()
+        for start in range(0, len(self.pending_zonings), self.batch_size):
+            batch = self.pending_zonings[start:start + self.batch_size]
+            zonings = dict()
+            for namespace_id, local_id, version_id, href in batch:
+                zoning_id = self.get_zoning_id(href)
+                if zoning_id is None:
+                    pending.append((namespace_id, local_id, version_id, href))
+                else:
+                    zonings[(namespace_id, local_id, version_id)] = zoning_id
+            updates = [
+                CadastralParcel(pk=pk, cadastral_zoning_id=zonings[(namespace_id, local_id, version_id)])
+                for pk, namespace_id, local_id, version_id in CadastralParcel.objects.filter(
+                    local_id__in={key[1] for key in zonings},
+                ).values_list("pk", "namespace_id", "local_id", "version_id")
+                if (namespace_id, local_id, version_id) in zonings
+            ]
+            CadastralParcel.objects.bulk_update(updates, ["cadastral_zoning"], batch_size=self.batch_size)
+        self.pending_zonings = pending
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        super().close(exc_type, exc_value, traceback)
+        stats = self.get_stats(CadastralZoning)
+        if exc_type is None and self.rebuild_hierarchy and (stats["created"] or stats["updated"]):
+            updated = CadastralZoning.objects.rebuild_hierarchy(batch_size=self.batch_size)
+            log.info(f"CadastralZoning: {updated} hierarchy paths updated")
+        # Bulk writes do not send signals
+        parcel_lookup_cache.clear()
@@ -0,0 +1,337 @@
+import datetime
+import glob
+import logging
+import os
+import re
+import struct
+import sys
+import zipfile
+from array import array
+from xml.etree.ElementTree import iterparse
+
+from django.contrib.gis.gdal import CoordTransform, GDALException, SpatialReference, SRSException
+from django.contrib.gis.geos import GEOSGeometry, Point
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+log = logging.getLogger(__name__)
+
+GML_NS = "http://www.opengis.net/gml/3.2"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+GML_ID = f"{{{GML_NS}}}id"
+XLINK_HREF = f"{{{XLINK_NS}}}href"
+XSI_NIL = f"{{{XSI_NS}}}nil"
+
+SRS_NAME_RE = re.compile(r"(?:EPSG(?::[\d.]*)?:|/EPSG/[\d.]+/)(\d+)$")
+
+# Geometries are assembled as WKB in the native byte order of the arrays of coordinates
+WKB_BYTE_ORDER = 1 if sys.byteorder == "little" else 0
+WKB_POLYGON = 3
+WKB_MULTIPOLYGON = 6
+
+
+def local_name(tag):
+    """``{namespace}name`` -> ``name``"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def find_child(elem, name):
+    """First child element with that local name, whatever its namespace"""
+    for child in elem:
+        if local_name(child.tag) == name:
+            return child
+    return None
+
+
+def find_children(elem, name):
+    """Child elements with that local name, whatever their namespace"""
+    for child in elem:
+        if local_name(child.tag) == name:
+            yield child
+
+
+def find_path(elem, *names):
+    """Element reached through a path of local names, as ``find_path(elem, "geometry2D", "BuildingGeometry2D")``"""
+    for name in names:
+        if elem is None:
+            return None
+        elem = find_child(elem, name)
+    return elem
+
+
+def iter_values(elem, name):
+    """Objects held by the properties with that local name, as every ``CurrentUse`` of ``currentUse``"""
+    for child in find_children(elem, name):
+        if len(child):
+            yield child[0]
+
+
+def iter_descendants(elem, name):
+    for child in elem.iter():
+        if local_name(child.tag) == name:
+            yield child
+
+
+def get_text(elem, name, default=""):
+    """Stripped text of a child element, ``default`` when it is missing or nil"""
+    child = find_child(elem, name)
+    if child is None or child.get(XSI_NIL) == "true" or child.text is None:
+        return default
+    return child.text.strip()
+
+
+def get_href(elem, name):
+    child = find_child(elem, name)
+    if child is None:
+        return None
+    return child.get(XLINK_HREF) or None
+
+
+def get_datetime(elem, name):
+    value = get_text(elem, name)
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        date = parse_date(value)
+        if date is None:
+            return None
+        dt = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, datetime.timezone.utc)
+    return dt
+
+
+def get_number(elem, name, cast=float):
+    """Value and ``uom`` attribute of a measure element, as ``(value, uom)``"""
+    child = find_child(elem, name)
+    if child is None or child.get(XSI_NIL) == "true" or not (child.text or "").strip():
+        return None, None
+    try:
+        return cast(float(child.text)), child.get("uom")
+    except ValueError:
+        return None, None
+
+
+def get_identifier(elem):
+    """``inspireId`` of a feature as ``(namespace, local_id, version_id)``"""
+    inspire_id = find_child(elem, "inspireId")
+    identifier = find_child(inspire_id, "Identifier") if inspire_id is not None else None
+    if identifier is None:
+        return None, None, ""
+    return (
+        get_text(identifier, "namespace"),
+        get_text(identifier, "localId"),
+        get_text(identifier, "versionId"),
+    )
+
+
+def parse_srid(srs_name):
+    """SRID from ``EPSG:25830``, ``urn:ogc:def:crs:EPSG::4258`` or ``http://www.opengis.net/def/crs/EPSG/0/4258``"""
+    if not srs_name:
+        return None
+    match = SRS_NAME_RE.search(srs_name.strip())
+    return int(match.group(1)) if match else None
+
+
+class GeometryBuilder:
+    """Geometry Builder
+
+    Definition
+        Builds GEOS geometries straight from the coordinate lists (``gml:posList`` / ``gml:pos``) of GML 3.2
+        ``MultiSurface``, ``Surface``, ``Polygon`` and ``Point`` elements.
+
+    Description
+        Coordinates given in a geographic CRS with an URN or http ``srsName`` (for instance
+        ``http://www.opengis.net/def/crs/EPSG/0/4258``) are in latitude, longitude order and are swapped.
+        Geometries are transformed to ``srid`` when their CRS is a different one.
+    """
+
+    def __init__(self, srid, default_source_srid=None):
+        self.srid = srid
+        self.default_source_srid = default_source_srid
+        self._swap = dict()
+        self._transforms = dict()
+
+    def get_source(self, elem):
+        """SRID of a geometry element and whether its axes must be swapped"""
+        srs_name = elem.get("srsName")
+        srid = parse_srid(srs_name) or self.default_source_srid or self.srid
+        swap = False
+        if srs_name and not srs_name.startswith("EPSG:"):
+            if srid not in self._swap:
+                try:
+                    self._swap[srid] = SpatialReference(srid).geographic
+                except (GDALException, SRSException):
+                    self._swap[srid] = False
+            swap = self._swap[srid]
+        return srid, swap
+
+    def parse_coordinates(self, elem, swap, dimension=None):
+        """Coordinates of a ``LinearRing`` or ``Point`` as a flat array of doubles ``x1, y1, x2, y2, ...``"""
+        pos_list = find_child(elem, "posList")
+        if pos_list is not None:
+            dimension = int(pos_list.get("srsDimension") or dimension or 2)
+            values = array("d", map(float, (pos_list.text or "").split()))
+        else:
+            values = array("d")
+            dimension = 2
+            for pos in elem:
+                if local_name(pos.tag) == "pos":
+                    values.extend(map(float, pos.text.split()[:2]))
+            if not values:
+                coordinates = find_child(elem, "coordinates")
+                if coordinates is None:
+                    return values
+                for xy in coordinates.text.split():
+                    values.extend(map(float, xy.split(",")[:2]))
+        if dimension != 2 or swap:
+            count = len(values) // dimension
+            xs, ys = values[0:count * dimension:dimension], values[1:count * dimension:dimension]
+            values = array("d", bytes(16 * count))
+            values[0::2], values[1::2] = (ys, xs) if swap else (xs, ys)
+        return values
+
+    def build_polygon(self, elem, swap):
+        """Polygon from a ``gml:Polygon`` or ``gml:PolygonPatch``, as WKB"""
+        rings = list()
+        for boundary in elem:
+            if local_name(boundary.tag) not in ("exterior", "interior"):
+                continue
+            ring = find_child(boundary, "LinearRing")
+            if ring is None:
+                continue
+            coordinates = self.parse_coordinates(ring, swap)
+            if len(coordinates) < 8:
+                continue
+            ring = struct.pack("=I", len(coordinates) // 2) + coordinates.tobytes()
+            if local_name(boundary.tag) == "exterior":
+                rings.insert(0, ring)
+            else:
+                rings.append(ring)
+        if not rings:
+            return None
+        return struct.pack("=BII", WKB_BYTE_ORDER, WKB_POLYGON, len(rings)) + b"".join(rings)
+
+    def build_multipolygon(self, elem):
+        """MultiPolygon from the property element holding the geometry (for instance ``cp:geometry``)
+
+        The WKB is assembled straight from the coordinate arrays: a single GEOS call per geometry instead of one
+        per coordinate.
+        """
+        if elem is None or len(elem) == 0:
+            return None
+        geometry = elem[0]
+        srid, swap = self.get_source(geometry)
+        polygons = list()
+        for name in ("Polygon", "PolygonPatch"):
+            for polygon_elem in iter_descendants(geometry, name):
+                polygon = self.build_polygon(polygon_elem, swap)
+                if polygon is not None:
+                    polygons.append(polygon)
+        if not polygons:
+            return None
+        wkb = struct.pack("=BII", WKB_BYTE_ORDER, WKB_MULTIPOLYGON, len(polygons)) + b"".join(polygons)
+        multipolygon = GEOSGeometry(memoryview(wkb), srid=srid)
+        return self.to_srid(multipolygon)
+
+    def build_point(self, elem):
+        if elem is None or len(elem) == 0:
+            return None
+        point_elem = elem[0]
+        srid, swap = self.get_source(point_elem)
+        coordinates = self.parse_coordinates(point_elem, swap)
+        if len(coordinates) < 2:
+            return None
+        return self.to_srid(Point(coordinates[0], coordinates[1], srid=srid))
+
+    def to_srid(self, geometry):
+        if geometry.srid != self.srid:
+            # Building the transformation is far more expensive than applying it: one per source CRS
+            if geometry.srid not in self._transforms:
+                self._transforms[geometry.srid] = CoordTransform(
+                    SpatialReference(geometry.srid),
+                    SpatialReference(self.srid),
+                )
+            geometry.transform(self._transforms[geometry.srid])
+        return geometry
+
+
+SOURCE_EXTENSIONS = (".gml", ".xml", ".zip")
+
+
+def expand_paths(paths):
+    """Files to import from paths that may also be directories (every ``.gml``, ``.xml`` and ``.zip`` file
+    inside, recursively) or glob patterns (``cadastre/**/*.zip``)
+
+    Returns:
+        list: Paths of files, without duplicates
+    """
+    files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, names in os.walk(path):
+                files.extend(
+                    os.path.join(root, name)
+                    for name in sorted(names)
+                    if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS
+                )
+        elif glob.has_magic(path):
+            files.extend(sorted(f for f in glob.glob(path, recursive=True) if os.path.isfile(f)))
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def open_sources(path):
+    """Binary files to read from ``path``: the file itself, or every ``.gml`` / ``.xml`` member of a zip file
+
+    Yields:
+        tuple: ``(name, file)``
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            for name in sorted(z.namelist()):
+                if os.path.splitext(name)[1].lower() in (".gml", ".xml"):
+                    with z.open(name) as f:
+                        yield f"{path}:{name}", f
+    else:
+        with open(path, "rb") as f:
+            yield path, f
+
+
+def iter_features(f, names):
+    """Stream the features of a GML file
+
+    Only the element of the feature being yielded is kept in memory: it is cleared, together with the already
+    processed members of the collection, as soon as the caller asks for the next one. Features given inline in
+    another one (as ``bu-core2d:parts``) are yielded before it, and only cleared with it, so it can still read
+    them.
+
+    Args:
+        f (file): Binary file
+        names (iterable): Local names of the features to yield, as ``CadastralParcel``
+
+    Yields:
+        Element: Every feature found, whatever the depth (``gml:featureMember``, ``wfs:member``, ...)
+    """
+    names = set(names)
+    root = None
+    # Features open, the current one included
+    depth = 0
+    for event, elem in iterparse(f, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            if local_name(elem.tag) in names:
+                depth += 1
+            continue
+        if local_name(elem.tag) in names:
+            depth -= 1
+            yield elem
+            if depth == 0:
+                elem.clear()
+                # Feature members already processed: drop them from the collection
+                root.clear()
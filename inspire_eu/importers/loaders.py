@@ -0,0 +1,485 @@
+import abc
+import datetime
+import logging
+import struct
+import sys
+import tempfile
+
+from django.contrib.gis.db.models import GeometryField
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from ..models.abstract import get_content_hash
+
+log = logging.getLogger(__name__)
+
+# Rows of a COPY batch bigger than this are spooled to a temporary file
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+COPY_NULL = struct.pack("!i", -1)
+
+PG_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+
+
+def _pack(fmt):
+    return struct.Struct(fmt).pack
+
+
+pack_int16 = _pack("!h")
+pack_int32 = _pack("!i")
+pack_int64 = _pack("!q")
+
+
+def encode_text(value):
+    return str(value).encode("utf-8")
+
+
+def encode_bool(value):
+    return b"\x01" if value else b"\x00"
+
+
+def encode_timestamp(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    delta = value - PG_EPOCH
+    return pack_int64((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def encode_date(value):
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return pack_int32((value - PG_EPOCH_DATE).days)
+
+
+def encode_geometry(value):
+    # Binary input of PostGIS geometries is EWKB, SRID included
+    return bytes(value.ewkb)
+
+
+# Binary COPY encoders, by the name of the PostgreSQL type of the column
+COPY_ENCODERS = dict(
+    {
+        "int2": pack_int16,
+        "int4": pack_int32,
+        "int8": pack_int64,
+        "float4": _pack("!f"),
+        "float8": _pack("!d"),
+        "bool": encode_bool,
+        "varchar": encode_text,
+        "text": encode_text,
+        "bpchar": encode_text,
+        "timestamptz": encode_timestamp,
+        "timestamp": encode_timestamp,
+        "date": encode_date,
+        "bytea": bytes,
+    },
+)
+
+
+class TableLoader(abc.ABC):
+    """Table Loader
+
+    Definition
+        Writes many rows of a model with an INSPIRE identifier (``namespace``, ``local_id`` and ``version_id``)
+        without going through ``Model.save``.
+
+    Description
+        Rows are either unsaved model instances or dicts keyed by attribute name (``namespace_id``, ``geometry``,
+        ...), missing keys taking the default of their field. They are merged into the table by identifier: rows
+        already stored are updated (or skipped with ``update=False``), the others are inserted. Within the rows
+        given to the same loader the last one of every identifier wins. As with
+        :meth:`~inspire_eu.models.abstract.IdentifierManager.upsert_by_identifier`, ``content_hash`` is computed
+        for every row and stored rows with the same hash are not rewritten. Both the hash and the update only cover
+        the fields of ``objects.get_hash_fields()``: the other ones are only written on insert. Fields of
+        ``objects.keep_when_null`` keep their stored value when the one of the row is None.
+
+        Loaders are context managers. Use :func:`get_loader` to get the fastest one of a database::
+
+            with get_loader(CadastralParcel, batch_size=50000) as loader:
+                loader.add_many(rows)
+            print(loader.stats)
+    """
+
+    key_fields = ("namespace_id", "local_id", "version_id")
+    batch_size = 10000
+
+    def __init__(self, model, using=None, batch_size=None, update=True, drop_indexes=False):
+        self.model = model
+        self.using = using or DEFAULT_DB_ALIAS
+        if batch_size:
+            self.batch_size = batch_size
+        self.update = update
+        self.drop_indexes = drop_indexes
+        self.fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        names = [f.name for f in self.fields]
+        self.hash_index = names.index("content_hash") if "content_hash" in names else None
+        # As in upsert_by_identifier, the hash and the update only cover the fields of the spatial object
+        hash_fields = model._default_manager.get_hash_fields()
+        self.hash_positions = [names.index(f.name) for f in hash_fields]
+        self.update_fields = [self.fields[i] for i in self.hash_positions]
+        if self.hash_index is not None:
+            self.update_fields.append(self.fields[self.hash_index])
+        keep_when_null = getattr(model._default_manager, "keep_when_null", ())
+        self.kept_fields = [model._meta.get_field(name) for name in keep_when_null]
+        self.generalised = hasattr(model, "set_generalised_geometries")
+        self.stats = dict({"inserted": 0, "updated": 0, "skipped": 0})
+        self.pending = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type, exc_value, traceback)
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def get_row(self, obj):
+        """Values of ``self.fields``, in that order, of a model instance or a dict"""
+        if self.generalised:
+            if isinstance(obj, dict):
+                obj = self.model(**obj)
+            # Bulk writes do not call save(), and the generalised geometries are hashed
+            obj.set_generalised_geometries()
+        if isinstance(obj, dict):
+            row = list()
+            for field in self.fields:
+                value = obj[field.attname] if field.attname in obj else field.get_default()
+                row.append(value)
+        else:
+            row = [
+                field.pre_save(obj, True) if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+                else getattr(obj, field.attname)
+                for field in self.fields
+            ]
+        if self.hash_index is not None:
+            row[self.hash_index] = get_content_hash(row[i] for i in self.hash_positions)
+        return row
+
+    def open(self):
+        """Prepare the load. Called by ``with``"""
+
+    def add(self, obj):
+        """Queue one row, writing the batch once ``batch_size`` rows are pending"""
+        self.write(self.get_row(obj))
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def add_many(self, objs):
+        for obj in objs:
+            self.add(obj)
+
+    @abc.abstractmethod
+    def write(self, row):
+        """Queue the values of one row, as returned by :meth:`get_row`"""
+
+    @abc.abstractmethod
+    def flush(self):
+        """Write the pending rows"""
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        """Write the pending rows and finish the load. Nothing else is written when it ends with an exception"""
+        if exc_type is None:
+            self.flush()
+
+
+class BulkCreateLoader(TableLoader):
+    """Bulk Create Loader
+
+    Definition
+        Loader of any database (SQLite, SpatiaLite, ...) built on ``bulk_update`` and ``bulk_create``.
+
+    Description
+        Every batch looks up the identifiers already stored with a single query. ``drop_indexes`` is ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = dict()
+
+    def write(self, row):
+        obj = self.model(**{field.attname: value for field, value in zip(self.fields, row)})
+        key = tuple(getattr(obj, name) for name in self.key_fields)
+        if key in self.rows:
+            self.stats["skipped"] += 1
+        self.rows[key] = obj
+
+    def flush(self):
+        rows, self.rows, self.pending = self.rows, dict(), 0
+        if not rows:
+            return
+        existing = dict()
+        has_hash = self.hash_index is not None
+        kept = [field.attname for field in self.kept_fields]
+        for values in (
+            self.model.objects.using(self.using)
+            .filter(local_id__in={key[1] for key in rows})
+            .values_list("pk", "content_hash" if has_hash else "pk", *self.key_fields, *kept)
+        ):
+            key_end = 2 + len(self.key_fields)
+            existing[values[2:key_end]] = (values[0], values[1], values[key_end:])
+        to_create, to_update = list(), list()
+        for key, obj in rows.items():
+            if key not in existing:
+                to_create.append(obj)
+                continue
+            pk, content_hash, kept_values = existing[key]
+            if self.update and not (has_hash and content_hash == obj.content_hash):
+                obj.pk = pk
+                for attname, value in zip(kept, kept_values):
+                    if getattr(obj, attname) is None:
+                        setattr(obj, attname, value)
+                to_update.append(obj)
+            else:
+                self.stats["skipped"] += 1
+        with transaction.atomic(using=self.using):
+            if to_update:
+                self.model.objects.using(self.using).bulk_update(
+                    to_update,
+                    [field.name for field in self.update_fields],
+                    batch_size=self.batch_size,
+                )
+            self.model.objects.using(self.using).bulk_create(to_create, batch_size=self.batch_size)
+        self.stats["updated"] += len(to_update)
+        self.stats["inserted"] += len(to_create)
+
+
+class PostgresCopyLoader(TableLoader):
+    """PostgreSQL COPY Loader
+
+    Definition
+        Loader of PostgreSQL (PostGIS) streaming rows with ``COPY ... FROM STDIN (FORMAT binary)`` into a
+        temporary staging table, merged afterwards into the table with one ``UPDATE ... FROM`` and one
+        ``INSERT ... SELECT ... WHERE NOT EXISTS``.
+
+    Description
+        Rows are encoded as they are added, geometries as EWKB, into a spooled temporary file: no SQL is built
+        for them and only one batch is kept at a time.
+
+        Every batch is merged as soon as it is copied. With ``drop_indexes`` the secondary indexes of the table are
+        dropped first, the batches are only copied to the staging table and the whole staging table is merged
+        once at the end, then the indexes are rebuilt and the table analyzed, everything in one transaction: use
+        it for very large loads, as the table is locked meanwhile.
+
+    References
+        * https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+    """
+
+    batch_size = 100000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table = self.model._meta.db_table
+        self.staging_table = f"{self.table}_staging"
+        self.columns = [field.column for field in self.fields]
+        self.encoders = None
+        self.indexes = list()
+        self.spool = None
+        self.staged = 0
+        self._atomic = None
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def get_encoders(self, cursor):
+        """Encoder of every column, from its type at the database"""
+        cursor.execute(
+            "SELECT a.attname, t.typname FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid "
+            "WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped",
+            [self.table],
+        )
+        types = dict(cursor.fetchall())
+        encoders = list()
+        for field, column in zip(self.fields, self.columns):
+            if isinstance(field, GeometryField):
+                # geometry and geography columns
+                encoders.append(self.get_geometry_encoder(field))
+                continue
+            try:
+                encoders.append(COPY_ENCODERS[types[column]])
+            except KeyError:
+                raise NotImplementedError(f"{self.table}.{column}: COPY of {types.get(column)} is not supported")
+        return encoders
+
+    def get_geometry_encoder(self, field):
+        def encode(value):
+            if value.srid is None:
+                value.srid = field.srid
+            elif value.srid != field.srid:
+                value = value.transform(field.srid, clone=True)
+            return encode_geometry(value)
+
+        return encode
+
+    def open(self):
+        if self.drop_indexes:
+            self._atomic = transaction.atomic(using=self.using)
+            self._atomic.__enter__()
+        columns = ", ".join(self.quote(column) for column in self.columns)
+        with self.connection.cursor() as cursor:
+            self.encoders = self.get_encoders(cursor)
+            cursor.execute(f"DROP TABLE IF EXISTS {self.quote(self.staging_table)}")
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {self.quote(self.staging_table)} AS "
+                f"SELECT {columns} FROM {self.quote(self.table)} WITH NO DATA",
+            )
+            # Position of every row, for the last one of an identifier to win
+            cursor.execute(f"ALTER TABLE {self.quote(self.staging_table)} ADD COLUMN _seq bigserial")
+            if self.drop_indexes:
+                self.drop_table_indexes(cursor)
+        self.new_spool()
+
+    def new_spool(self):
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.spool.write(COPY_HEADER)
+        self.pending = 0
+
+    def write(self, row):
+        if self.spool is None:
+            self.open()
+        parts = [pack_int16(len(row))]
+        for value, encoder in zip(row, self.encoders):
+            if value is None:
+                parts.append(COPY_NULL)
+            else:
+                data = encoder(value)
+                parts.append(pack_int32(len(data)))
+                parts.append(data)
+        self.spool.write(b"".join(parts))
+
+    def flush(self):
+        if self.spool is None or not self.pending:
+            return
+        spool, pending = self.spool, self.pending
+        spool.write(COPY_TRAILER)
+        spool.seek(0)
+        self.new_spool()
+        columns = ", ".join(self.quote(column) for column in self.columns)
+        sql = f"COPY {self.quote(self.staging_table)} ({columns}) FROM STDIN (FORMAT binary)"
+        with spool, self.connection.cursor() as cursor:
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2
+                cursor.copy_expert(sql, spool, size=CHUNK_SIZE)
+            else:
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for chunk in iter(lambda: spool.read(CHUNK_SIZE), b""):
+                        copy.write(chunk)
+        self.staged += pending
+        if not self.drop_indexes:
+            with transaction.atomic(using=self.using):
+                self.merge()
+
+    def merge(self):
+        """Merge the staging table into the table, and empty it"""
+        staged, self.staged = self.staged, 0
+        if not staged:
+            return
+        table, staging_table = self.quote(self.table), self.quote(self.staging_table)
+        keys = [self.model._meta.get_field(name).column for name in self.key_fields]
+        rows = (
+            f"SELECT DISTINCT ON ({', '.join(self.quote(k) for k in keys)}) * FROM {staging_table} "
+            f"ORDER BY {', '.join(self.quote(k) for k in keys)}, _seq DESC"
+        )
+        match = " AND ".join(f"t.{self.quote(k)} = s.{self.quote(k)}" for k in keys)
+        columns = ", ".join(self.quote(column) for column in self.columns)
+        with self.connection.cursor() as cursor:
+            updated = 0
+            if self.update:
+                kept = {f.column for f in self.kept_fields}
+                assignments = ", ".join(
+                    f"{self.quote(f.column)} = COALESCE(s.{self.quote(f.column)}, t.{self.quote(f.column)})"
+                    if f.column in kept
+                    else f"{self.quote(f.column)} = s.{self.quote(f.column)}"
+                    for f in self.update_fields
+                )
+                changed = ""
+                if self.hash_index is not None:
+                    # Unchanged rows are not rewritten
+                    column = self.quote(self.columns[self.hash_index])
+                    changed = f" AND t.{column} IS DISTINCT FROM s.{column}"
+                cursor.execute(
+                    f"UPDATE {table} AS t SET {assignments} FROM ({rows}) AS s WHERE {match}{changed}",
+                )
+                updated = cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM ({rows}) AS s "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS t WHERE {match})",
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f"TRUNCATE {staging_table}")
+        self.stats["updated"] += updated
+        self.stats["inserted"] += inserted
+        self.stats["skipped"] += staged - updated - inserted
+
+    def drop_table_indexes(self, cursor):
+        """Drop the indexes of the table but its primary key and the ones backing constraints, keeping them to
+        rebuild them later"""
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)",
+            [self.table],
+        )
+        self.indexes = cursor.fetchall()
+        for name, _definition in self.indexes:
+            cursor.execute(f"DROP INDEX {self.quote(name)}")
+        log.info(f"{self.table}: {len(self.indexes)} indexes dropped")
+
+    def rebuild_table_indexes(self, cursor):
+        for name, definition in self.indexes:
+            log.info(f"{self.table}: rebuilding {name}")
+            cursor.execute(definition)
+        self.indexes = list()
+        cursor.execute(f"ANALYZE {self.quote(self.table)}")
+
+    def close(self, exc_type=None, exc_value=None, traceback=None):
+        exc_info = (exc_type, exc_value, traceback)
+        try:
+            if exc_type is None:
+                self.flush()
+                if self.drop_indexes:
+                    self.merge()
+                    with self.connection.cursor() as cursor:
+                        self.rebuild_table_indexes(cursor)
+        except BaseException:
+            # Failed while writing the last rows: the transaction is rolled back with that error
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            if self.spool is not None:
+                self.spool.close()
+                self.spool = None
+            if self._atomic is not None:
+                atomic, self._atomic = self._atomic, None
+                # Rolled back on error: dropped indexes are back
+                atomic.__exit__(*exc_info)
+            # Only once committed: the connection is not usable after an error
+            if exc_info[0] is None:
+                with self.connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE IF EXISTS {self.quote(self.staging_table)}")
+
+
+def get_loader(model, using=None, **kwargs):
+    """Fastest :class:`TableLoader` of the database: COPY on PostgreSQL, ``bulk_create`` elsewhere
+
+    Args:
+        model: Model with an INSPIRE identifier (``CadastralParcel``, ``Building``, ``OtherConstruction``, ...)
+        using (str, optional): Database alias. Defaults to ``default``.
+        **kwargs: ``batch_size``, ``update`` and ``drop_indexes``
+
+    Returns:
+        TableLoader
+    """
+    using = using or DEFAULT_DB_ALIAS
+    if connections[using].vendor == "postgresql":
+        return PostgresCopyLoader(model, using=using, **kwargs)
+    return BulkCreateLoader(model, using=using, **kwargs)
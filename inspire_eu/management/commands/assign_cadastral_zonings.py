@@ -0,0 +1,54 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import INSPIRE_EU_THEMES
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Set the cadastral zoning of the cadastral parcels without it, from the zonings containing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of parcels assigned at a time (default: 1000)"),
+        )
+        parser.add_argument(
+            "--namespace",
+            type=str,
+            help=_("Only the parcels of this namespace"),
+        )
+        parser.add_argument(
+            "--no-overlap",
+            action="store_true",
+            help=_("Do not assign the zoning overlapping most of the parcels whose reference point is in none"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get("cadastral_parcels"):
+            raise CommandError(_("Cadastral parcels theme is not enabled at INSPIRE_EU_THEMES"))
+        from ...models.cadastral_parcels import CadastralParcel
+
+        qs = CadastralParcel.objects.all()
+        if kwargs.get("namespace"):
+            qs = qs.filter(namespace__code=kwargs.get("namespace"))
+        stats = qs.assign_zonings(
+            batch_size=kwargs.get("batch_size"),
+            overlap=not kwargs.get("no_overlap"),
+            stdout=self.stdout if kwargs.get("verbosity") > 1 else None,
+        )
+        elapsed = stats["elapsed"]
+        self.stdout.write(
+            f"CadastralParcel: {stats['assigned']} of {stats['read']} parcels without zoning assigned in "
+            f"{elapsed:.1f}s ({stats['assigned'] / (elapsed or 1):.0f}/s)",
+        )
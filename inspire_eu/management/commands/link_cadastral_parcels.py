@@ -0,0 +1,96 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import INSPIRE_EU_THEMES
+
+log = logging.getLogger(__name__)
+
+
+def parse_since(value):
+    since = parse_datetime(value)
+    if since is None:
+        date = parse_date(value)
+        if date is None:
+            raise CommandError(_("--since must be a date (YYYY-MM-DD) or a date and time (YYYY-MM-DD HH:MM:SS)"))
+        since = datetime.datetime.combine(date, datetime.time())
+    if settings.USE_TZ and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+class Command(BaseCommand):
+    help = "Link buildings and other constructions with the cadastral parcels they stand on"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            type=str,
+            help=_("Models to link, building or otherconstruction (default: both)"),
+        )
+        parser.add_argument(
+            "--min-overlap",
+            type=float,
+            default=0.1,
+            help=_("Part of the area of a construction a parcel must cover to be linked (default: 0.1)"),
+        )
+        parser.add_argument(
+            "--since",
+            type=str,
+            help=_(
+                "Only the constructions changed since then, or standing on a parcel changed since then. Changes are "
+                "read from begin_lifespan_version: features rewritten with the same version and deleted parcels "
+                "are missed",
+            ),
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help=_("Do not delete the links no longer found"),
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of constructions linked at a time (default: 1000)"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get("buildings") or not INSPIRE_EU_THEMES.get("cadastral_parcels"):
+            raise CommandError(_("Buildings and cadastral parcels themes must be enabled at INSPIRE_EU_THEMES"))
+        from ...models.buildings import Building, OtherConstruction
+
+        models = dict({model._meta.model_name: model for model in (Building, OtherConstruction)})
+        names = [name.lower() for name in kwargs.get("models")] or list(models)
+        unknown = [name for name in names if name not in models]
+        if unknown:
+            raise CommandError(
+                _("Unknown models: %(unknown)s. Choices: %(models)s")
+                % {"unknown": ", ".join(unknown), "models": ", ".join(models)},
+            )
+        since = parse_since(kwargs.get("since")) if kwargs.get("since") else None
+        for name in names:
+            model = models[name]
+            stats = model.objects.link_cadastral_parcels(
+                min_overlap=kwargs.get("min_overlap"),
+                since=since,
+                remove=not kwargs.get("keep"),
+                batch_size=kwargs.get("batch_size"),
+                stdout=self.stdout if kwargs.get("verbosity") > 1 else None,
+            )
+            elapsed = stats["elapsed"]
+            self.stdout.write(
+                f"{model._meta.object_name}: {stats['read']} read, {stats['created']} links created, "
+                f"{stats['removed']} removed in {elapsed:.1f}s ({stats['read'] / (elapsed or 1):.0f}/s)",
+            )
@@ -0,0 +1,10 @@
+from ...importers.base import ImportCommand
+
+
+class Command(ImportCommand):
+    help = "Load INSPIRE Buildings 2D (BU) GML datasets: buildings, building parts and other constructions"
+    theme = "buildings"
+    theme_name = "Buildings"
+    importer_class = "inspire_eu.importers.buildings.BuildingsImporter"
+    copy_name = "other constructions"
+    pending_messages = dict({"parts": "building parts referenced by buildings not imported"})
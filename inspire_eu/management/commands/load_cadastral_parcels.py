@@ -0,0 +1,15 @@
+from ...importers.base import ImportCommand
+
+
+class Command(ImportCommand):
+    help = "Load INSPIRE Cadastral Parcels (CP) GML datasets: cadastral zonings and cadastral parcels"
+    theme = "cadastral_parcels"
+    theme_name = "Cadastral parcels"
+    importer_class = "inspire_eu.importers.cadastral_parcels.CadastralParcelsImporter"
+    copy_name = "parcels"
+    pending_messages = dict(
+        {
+            "zonings": "parcels reference a zoning not imported",
+            "upper_level_units": "zonings reference an upper level unit not imported",
+        },
+    )
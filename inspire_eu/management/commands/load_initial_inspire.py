@@ -1,9 +1,13 @@
 # Standard Library
+import datetime
+import itertools
 import logging
 
 import feedparser
-import requests
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
 
 try:
     from django.utils.translation import gettext as _
@@ -16,7 +20,30 @@ except ImportError:
     from django.utils.text import slugify
 
 
-from ...models import ApplicationSchema, CodeList, CodeListValue, Status, Theme
+from ...models import (
+    ApplicationSchema,
+    ApplicationSchemaTranslation,
+    CodeList,
+    CodeListTranslation,
+    CodeListValue,
+    CodeListValueTranslation,
+    RegistrySyncCheckpoint,
+    RegistrySyncRun,
+    RegistrySyncState,
+    Status,
+    Theme,
+    ThemeTranslation,
+    get_code_list_slug,
+    get_code_list_value_slug,
+)
+from ...models.cache import code_list_value_cache
+from ...registry import (
+    INSPIRE_EU_REGISTRY_CACHE_DIR,
+    RegistryCache,
+    RegistryFetcher,
+    SnapshotFetcher,
+    SnapshotWriter,
+)
 
 log = logging.getLogger(__name__)
 
@@ -25,16 +52,60 @@ class Command(BaseCommand):
     help = "Load initial data"
     base_url = "https://inspire.ec.europa.eu"
     debug_console = None
+    fetcher = None
+    cache = None
+    force = False
+    incremental = False
+    feed_updated = None
+    status_cache = None
+    batch_size = 500
+    run = None
+    completed = None
 
     def add_arguments(self, parser):
         parser.add_argument(
             "-l",
             "--language",
             type=str,
-            help=_("Language (default: en)"),
+            help=_("Language, or comma separated list of languages (default: en)"),
+        )
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            default=8,
+            help=_("Maximum number of simultaneous downloads from the registry (default: 8)"),
+        )
+        parser.add_argument(
+            "-f",
+            "--force",
+            action="store_true",
+            help=_("Process every code list, even the ones not modified since the last sync"),
+        )
+        parser.add_argument(
+            "-i",
+            "--incremental",
+            action="store_true",
+            help=_("Only fetch the code lists whose entry at the registry feed changed since the last sync"),
+        )
+        parser.add_argument(
+            "--snapshot-out",
+            type=str,
+            help=_("Also write every document fetched from the registry into this archive"),
+        )
+        parser.add_argument(
+            "--snapshot-in",
+            type=str,
+            help=_("Load from an archive written by --snapshot-out instead of the registry (no network)"),
+        )
+        parser.add_argument(
+            "-r",
+            "--resume",
+            action="store_true",
+            help=_("Continue the last unfinished sync, skipping the code lists it already completed"),
         )
 
-    def populate_status(self, language):
+    def populate_status(self, languages):
         if self.debug_console:
             print("*********************")
             print("* Populating Status *")
@@ -90,13 +161,13 @@ class Command(BaseCommand):
         print("End Populating Status")
         print("")
 
-    def populate_themes(self, language):
+    def populate_themes(self, languages):
         if self.debug_console:
             print("********************")
             print("* Populating Theme *")
             print("********************")
-        response = requests.get(url=f"{self.base_url}/theme/theme.{language}.json")
-        data = response.json()
+        responses = self.fetch_languages(f"{self.base_url}/theme/theme.{{language}}.json", languages)
+        data = responses[languages[0]].json()
         themes = data["register"]["containeditems"]
         for theme_dict in themes:
             theme_json = theme_dict["theme"]
@@ -145,18 +216,23 @@ class Command(BaseCommand):
                 if self.debug_console:
                     print(f"Updated Theme '{theme}'")
 
+        pks = dict(Theme.objects.values_list("slug", "pk"))
+        rows = self.get_register_translations(responses, "theme", pks)
+        self.populate_translations(ThemeTranslation, "theme", ThemeTranslation.objects.all(), rows)
+
         print("End Populating Theme")
         print("")
 
-    def populate_schemas(self, language):
+    def populate_schemas(self, languages):
         if self.debug_console:
             print("*********************************")
             print("* Populating Application Schema *")
             print("*********************************")
-        response = requests.get(
-            url=f"{self.base_url}/applicationschema/applicationschema.{language}.json",
+        responses = self.fetch_languages(
+            f"{self.base_url}/applicationschema/applicationschema.{{language}}.json",
+            languages,
         )
-        data = response.json()
+        data = responses[languages[0]].json()
         schemas = data["register"]["containeditems"]
         for schema_dict in schemas:
             schema_json = schema_dict["applicationschema"]
@@ -224,20 +300,22 @@ class Command(BaseCommand):
                         schema.themes.add(theme)
             except KeyError:
                 theme = None
+
+        pks = dict(ApplicationSchema.objects.values_list("slug", "pk"))
+        rows = self.get_register_translations(responses, "applicationschema", pks)
+        qs = ApplicationSchemaTranslation.objects.all()
+        self.populate_translations(ApplicationSchemaTranslation, "application_schema", qs, rows)
         print("End Application Schema")
         print("")
 
-    def populate_code_list(self, language):
+    def populate_code_list(self, languages):
         if self.debug_console:
             print("***********************")
             print("* Populating CodeList *")
             print("***********************")
-        url = f"{self.base_url}/codelist/codelist.{language}.atom"
-
-        if self.debug_console:
-            print(f">>> Fetching {url}")
-        response = requests.get(url=url)
-        fp = feedparser.parse(response.text)
+        responses = self.fetch_languages(f"{self.base_url}/codelist/codelist.{{language}}.atom", languages)
+        feeds = {language: feedparser.parse(response.text) for language, response in responses.items()}
+        fp = feeds[languages[0]]
         status = Status.objects.get(slug="valid")
         for entry in fp.entries:
             code = entry["id"].split("/")[-1]
@@ -278,7 +356,7 @@ class Command(BaseCommand):
 
             update = False
             try:
-                code_list = CodeList.objects.get(slug=slugify(code))
+                code_list = CodeList.objects.get(slug=get_code_list_slug(code))
             except CodeList.DoesNotExist:
                 code_list = CodeList(code=code, status=status)
                 update = True
@@ -300,15 +378,127 @@ class Command(BaseCommand):
                     if theme not in code_list.themes.all():
                         code_list.themes.add(theme)
 
+        pks = dict(CodeList.objects.values_list("slug", "pk"))
+        rows = dict()
+        for language, feed in feeds.items():
+            for entry in feed.entries:
+                code = entry["id"].split("/")[-1]
+                self.feed_updated[(code, language)] = self.parse_feed_date(entry.get("updated_parsed"))
+                try:
+                    pk = pks[get_code_list_slug(code)]
+                except KeyError:
+                    continue
+                try:
+                    description = entry["content"][0]["value"]
+                except KeyError:
+                    description = ""
+                rows[(pk, language)] = {
+                    "label": entry["title"].strip()[:200],
+                    "definition": entry["summary"].strip(),
+                    "description": description,
+                }
+        self.populate_translations(CodeListTranslation, "code_list", CodeListTranslation.objects.all(), rows)
+
         print("End CodeList")
         print("")
 
-    def populate_code_values(self, language):
+    def fetch_languages(self, url, languages):
+        """Fetch the same registry document for several languages concurrently
+
+        Args:
+            url (str): Url with a ``{language}`` placeholder
+            languages (list): Languages. The first one is the main language and must be available
+
+        Returns:
+            dict: Responses by language. Languages that could not be fetched are left out
+        """
+        urls = {url.format(language=language): language for language in languages}
+        responses = dict()
+        for language_url, response in self.fetcher.fetch_many(urls):
+            if self.debug_console:
+                print(f">>> Fetched {language_url}")
+            if response is not None and response.status_code == 200:
+                responses[urls[language_url]] = response
+            else:
+                log.warning(f"Could not fetch {language_url}")
+        if languages[0] not in responses:
+            raise CommandError(_(f"Could not fetch {url.format(language=languages[0])}"))
+        return responses
+
+    def get_translation_row(self, item):
+        row = dict()
+        for f in ["label", "definition", "description"]:
+            try:
+                row[f] = item[f]["text"].strip()
+            except KeyError:
+                row[f] = ""
+        row["label"] = row["label"][:200]
+        return row
+
+    def get_register_translations(self, responses, key, pks):
+        """Translation rows of a register document (theme.xx.json, applicationschema.xx.json)"""
+        rows = dict()
+        for language, response in responses.items():
+            for item_dict in response.json()["register"]["containeditems"]:
+                item = item_dict[key]
+                try:
+                    pk = pks[slugify(item["id"].split("/")[-1])[:32]]
+                except KeyError:
+                    continue
+                rows[(pk, language)] = self.get_translation_row(item)
+        return rows
+
+    def populate_translations(self, translation_model, fk_name, qs, rows):
+        """Upsert translations with bulk queries
+
+        Args:
+            translation_model (Model): Translation model
+            fk_name (str): Name of the foreign key to the translated model
+            qs (QuerySet): Existing translations that may be affected by ``rows``
+            rows (dict): ``{(translated pk, language): {"label": ..., "definition": ..., "description": ...}}``
+
+        Returns:
+            tuple: Number of translations created and updated
+        """
+        fk_attname = f"{fk_name}_id"
+        existing = {(getattr(t, fk_attname), t.language): t for t in qs.order_by()}
+        to_create = list()
+        to_update = list()
+        for (pk, language), row in rows.items():
+            translation = existing.get((pk, language))
+            if translation is None:
+                to_create.append(translation_model(language=language, **{fk_attname: pk}, **row))
+                continue
+            changed = False
+            for key, value in row.items():
+                if getattr(translation, key) != value:
+                    setattr(translation, key, value)
+                    changed = True
+            if changed:
+                to_update.append(translation)
+        translation_model.objects.bulk_create(to_create, batch_size=self.batch_size)
+        translation_model.objects.bulk_update(
+            to_update,
+            ["label", "definition", "description"],
+            batch_size=self.batch_size,
+        )
+        return len(to_create), len(to_update)
+
+    def parse_feed_date(self, value):
+        """Aware (or naive, when USE_TZ is False) datetime from a feedparser UTC struct_time"""
+        if not value:
+            return None
+        value = datetime.datetime(*value[:6])
+        if settings.USE_TZ:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value
+
+    def populate_code_values(self, languages):
         if self.debug_console:
             print("****************************")
             print("* Populating CodeListValue *")
             print("****************************")
-        errors = dict({"key": [], "data": [], "multiple_parents": [], "no_data": []})
+        errors = dict({"key": [], "data": [], "multiple_parents": [], "no_data": [], "fetch": []})
         qs = CodeList.objects.all()
         error_keys = [
             "SpecificAppurtenanceTypeValue",
@@ -326,93 +516,326 @@ class Command(BaseCommand):
         ]
         error_keys = ["ClassificationItemTypeValue"]  # noqa
         # qs = qs.filter(code__in=error_keys)
+        states = {
+            (state.code_list_id, state.language): state
+            for state in RegistrySyncState.objects.filter(language__in=languages)
+        }
+        summary = dict(
+            {
+                "code_lists": 0,
+                "resumed": 0,
+                "not_modified": 0,
+                "unchanged": 0,
+                "synced": 0,
+                "created": 0,
+                "updated": 0,
+                "translations": 0,
+            },
+        )
+        urls = dict()
         for code_list in qs:
-            url = code_list.link
-            url += f"/{code_list.code}.{language}.json"
-            if self.debug_console:
-                print(f">>> Fetching {url}")
-            response = requests.get(url=url)
-            if response.status_code == 404:
+            summary["code_lists"] += 1
+            if code_list.pk in self.completed:
+                summary["resumed"] += 1
                 continue
-            data = response.json()
-            try:
-                item_dict_list = data["codelist"]["containeditems"]
-            except KeyError:
-                # No data # ToDo ¿?¿?
-                if url not in errors["no_data"]:
-                    errors["no_data"].append(url)
+            if self.incremental and not self.force and not self.is_feed_modified(code_list, languages, states):
+                summary["not_modified"] += 1
                 continue
-            for item_dict in item_dict_list:
-                try:
-                    item = item_dict["value"]
-                except KeyError:
-                    # item_code_list = item_dict["codelist"] # ToDo ¿?¿?
-                    if url not in errors["key"]:
-                        errors["key"].append(url)
-                    continue
-
-                row = dict()
-                if "parents" in item:
-                    parents = item["parents"]
-                    if len(parents) > 1:
-                        # https://inspire.ec.europa.eu/codelist/CommodityCodeValue/limestone
-                        if url not in errors["multiple_parents"]:
-                            errors["multiple_parents"].append(item["id"])
-
-                    parent = parents[0]["parent"]
-                    row["parent"] = CodeListValue.search(parent["id"])
-
-                code = item["id"].split("/")[-1]
-                status_link = item["status"]["id"]
-                try:
-                    status = Status.objects.get(
-                        slug=slugify(status_link.split("/")[-1]),
-                    )
-                except Status.DoesNotExist:
+            for language in languages:
+                url = code_list.link
+                url += f"/{code_list.code}.{language}.json"
+                urls[url] = (code_list, language)
+
+        # Downloads run concurrently, while parsing and database work stay in this thread.
+        # A code list is processed as soon as all its languages have been downloaded.
+        pending = dict()
+        for url, response in self.fetcher.fetch_many(urls):
+            if self.debug_console:
+                print(f">>> Fetched {url}")
+            code_list, language = urls[url]
+            if response is None:
+                errors["fetch"].append(url)
+            responses = pending.setdefault(code_list.pk, dict())
+            responses[language] = response
+            if len(responses) == len(languages):
+                del pending[code_list.pk]
+                self.sync_code_list(code_list, responses, languages, states, summary, errors)
+        # print("\n".join(errors["key"]))
+        print(
+            f"CodeLists: {summary['code_lists']} ({summary['resumed']} already completed by this run, "
+            f"{summary['not_modified']} not modified at the feed, "
+            f"{summary['unchanged']} with unchanged payload, {summary['synced']} synchronised). "
+            f"CodeListValues: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['translations']} translations written",
+        )
+        for key in ["fetch", "data", "no_data"]:
+            if errors[key]:
+                print(f"Errors ({key}): {len(errors[key])}")
+        print("End CodeListValue")
+        print("")
+        return errors
+
+    def is_feed_modified(self, code_list, languages, states):
+        for language in languages:
+            state = states.get((code_list.pk, language))
+            feed_updated = self.feed_updated.get((code_list.code, language))
+            if not state or not feed_updated or state.feed_updated != feed_updated:
+                return True
+        return False
+
+    def sync_code_list(self, code_list, responses, languages, states, summary, errors):
+        """Write the values of one code list, and their translations, for all languages in one transaction
+
+        The code list is skipped when the payloads of all languages are the same as in the last successful sync.
+        Payloads are parsed incrementally (see :meth:`RegistryResponse.iter_items`) and closed afterwards.
+        """
+        try:
+            self._sync_code_list(code_list, responses, languages, states, summary, errors)
+        finally:
+            for response in responses.values():
+                if response is not None:
+                    response.close()
+
+    def _sync_code_list(self, code_list, responses, languages, states, summary, errors):
+        if any(response is None for response in responses.values()):
+            # Download failed (already reported): left for the next run, or --resume
+            return
+        main_response = responses[languages[0]]
+        if main_response.status_code == 404:
+            return
+        if main_response.status_code != 200:
+            # Server error after the retries: the other languages can not be written without the values
+            log.warning(f"{main_response.url}: HTTP {main_response.status_code}")
+            errors["fetch"].append(main_response.url)
+            return
+        responses = {language: response for language, response in responses.items() if response.status_code == 200}
+        code_list_states = dict()
+        for language in responses:
+            code_list_states[language] = states.get((code_list.pk, language)) or RegistrySyncState(
+                code_list=code_list,
+                language=language,
+            )
+
+        if self.force or any(
+            code_list_states[language].payload_sha256 != response.sha256 for language, response in responses.items()
+        ):
+            errors_count = len(errors["data"])
+            # Values, translations, sync states and checkpoint: all or nothing
+            with transaction.atomic():
+                created, updated = self.populate_code_list_values(
+                    code_list,
+                    main_response.url,
+                    main_response.iter_items("codelist", "containeditems"),
+                    errors,
+                )
+                translations = self.populate_code_list_value_translations(code_list, responses)
+                # With errors it is neither recorded as synced nor checkpointed, so it is processed again
+                synced = len(errors["data"]) == errors_count
+                if synced:
+                    for language, response in responses.items():
+                        code_list_states[language].payload_sha256 = response.sha256
+                        code_list_states[language].synced_at = timezone.now()
+                    self.save_sync_states(code_list, code_list_states)
+                    self.add_checkpoint(code_list)
+            # bulk_create / bulk_update do not send the signals that keep the cache up to date
+            code_list_value_cache.invalidate(code_list_pk=code_list.pk)
+            summary["created"] += created
+            summary["updated"] += updated
+            summary["translations"] += sum(translations)
+            summary["synced"] += int(synced)
+        else:
+            summary["unchanged"] += 1
+            with transaction.atomic():
+                self.save_sync_states(code_list, code_list_states)
+                self.add_checkpoint(code_list)
+
+    def save_sync_states(self, code_list, code_list_states):
+        for language, state in code_list_states.items():
+            state.feed_updated = self.feed_updated.get((code_list.code, language))
+            state.save()
+
+    def populate_code_list_value_translations(self, code_list, responses):
+        """Upsert the translations of the values of one code list, ``batch_size`` values at a time
+
+        Returns:
+            tuple: Number of translations created and updated
+        """
+        pks = dict(CodeListValue.objects.filter(code_list=code_list).values_list("slug", "pk"))
+        created = updated = 0
+        for language, response in responses.items():
+            rows = dict()
+            items = response.iter_items("codelist", "containeditems")
+            for item_dict in itertools.chain(items, [None]):
+                if item_dict is not None:
                     try:
-                        status_label = item["status"]["label"]["text"].strip()
+                        item = item_dict["value"]
+                        pk = pks[get_code_list_value_slug(item["id"].split("/")[-1])]
                     except KeyError:
-                        status_label = status_link
-                    status = Status(link=status_link, label=status_label)
-                    status.save()
-                row["status"] = status
-                row["link"] = item["id"]
-
-                update = False
-                try:
-                    code_list_value = CodeListValue.objects.get(
-                        code_list=code_list,
-                        slug=slugify(code),
+                        continue
+                    rows[(pk, language)] = self.get_translation_row(item)
+                if rows and (item_dict is None or len(rows) >= self.batch_size):
+                    qs = CodeListValueTranslation.objects.filter(
+                        language=language,
+                        code_list_value_id__in=[pk for pk, _language in rows],
                     )
-                except CodeListValue.DoesNotExist:
-                    code_list_value = CodeListValue(code_list=code_list, code=code)
-                    update = True
+                    counts = self.populate_translations(CodeListValueTranslation, "code_list_value", qs, rows)
+                    created, updated = created + counts[0], updated + counts[1]
+                    rows = dict()
+        return created, updated
+
+    def get_status(self, status_json):
+        """Status from its registry json, created when missing. Cached across the whole sync"""
+        if self.status_cache is None:
+            self.status_cache = {status.slug: status for status in Status.objects.all()}
+        status_link = status_json["id"]
+        slug = slugify(status_link.split("/")[-1])[:32]
+        try:
+            return self.status_cache[slug]
+        except KeyError:
+            try:
+                status_label = status_json["label"]["text"].strip()
+            except KeyError:
+                status_label = status_link
+            status = Status(link=status_link, label=status_label)
+            status.save()
+            self.status_cache[status.slug] = status
+            return status
+
+    def populate_code_list_values(self, code_list, url, items, errors):
+        """Upsert all values of one code list
+
+        Existing values are loaded once and compared in memory, so the database work is a constant number of
+        bulk queries per ``batch_size`` values instead of several queries per value. Values are written as soon
+        as a batch is complete, so memory does not grow with the size of the payload. Parents are resolved in a
+        second pass, once every value of the code list has a primary key.
+
+        Args:
+            items (iterable): ``containeditems`` of the code list document
+
+        Returns:
+            tuple: Number of values created and updated
+        """
+        existing = {clv.slug: clv for clv in CodeListValue.objects.filter(code_list=code_list)}
+        to_create = dict()
+        to_update = dict()
+        seen = set()
+        created = updated = 0
+        parent_links = dict()
+        fields = ["status", "link", "label", "definition", "description"]
+        for item_dict in items:
+            try:
+                item = item_dict["value"]
+            except KeyError:
+                # item_code_list = item_dict["codelist"] # ToDo ¿?¿?
+                if url not in errors["key"]:
+                    errors["key"].append(url)
+                continue
 
-                for f in ["label", "definition", "description"]:
-                    try:
-                        row[f] = item[f]["text"].strip()
-                    except KeyError:
-                        row[f] = ""
+            code = item["id"].split("/")[-1]
+            slug = get_code_list_value_slug(code)
+            if "parents" in item:
+                parents = item["parents"]
+                if len(parents) > 1:
+                    # https://inspire.ec.europa.eu/codelist/CommodityCodeValue/limestone
+                    if url not in errors["multiple_parents"]:
+                        errors["multiple_parents"].append(item["id"])
+                parent_links[slug] = parents[0]["parent"]["id"]
+
+            # Same normalization as CodeListValue.save(), which bulk operations do not call
+            row = dict({"status_id": self.get_status(item["status"]).pk})
+            row["link"] = item["id"].replace("http://", "https://")
+            for f in ["label", "definition", "description"]:
+                try:
+                    row[f] = item[f]["text"].strip()
+                except KeyError:
+                    row[f] = ""
 
+            if slug in seen and slug not in to_create and slug not in to_update:
+                # Duplicated value, already written
+                continue
+            seen.add(slug)
+            code_list_value = existing.pop(slug, None) or to_create.get(slug) or to_update.get(slug)
+            if code_list_value is None:
+                to_create[slug] = CodeListValue(code_list=code_list, code=code, slug=slug, **row)
+            else:
                 for key, value in row.items():
-                    try:
-                        if getattr(code_list_value, key) != value:
-                            setattr(code_list_value, key, value)
-                            update = True
-                    except AttributeError:
+                    if getattr(code_list_value, key) != value:
                         setattr(code_list_value, key, value)
-                        update = True
-
-                if update:
-                    try:
-                        code_list_value.save()
-                        if self.debug_console:
-                            print(f"Updated CodeListValue: '{code_list_value}'")
-                    except Exception as e:
-                        errors["data"].append(f"{code}: {e}")
-        # print("\n".join(errors["key"]))
-        print("End CodeListValue")
-        print("")
+                        if code_list_value.pk:
+                            to_update[slug] = code_list_value
+            if len(to_create) + len(to_update) >= self.batch_size:
+                created, updated = created + len(to_create), updated + len(to_update)
+                self.bulk_write(to_create.values(), to_update.values(), fields, errors)
+                to_create, to_update = dict(), dict()
+
+        if not seen:
+            # No data # ToDo ¿?¿?
+            if url not in errors["no_data"]:
+                errors["no_data"].append(url)
+            return 0, 0
+        created, updated = created + len(to_create), updated + len(to_update)
+        self.bulk_write(to_create.values(), to_update.values(), fields, errors)
+        if self.debug_console and (created or updated):
+            print(f"CodeList '{code_list.code}': {created} created, {updated} updated")
+
+        # Second pass: parents, now that every value has a primary key
+        if not parent_links:
+            return created, updated
+        pks, parent_ids = dict(), dict()
+        for slug, pk, parent_id in CodeListValue.objects.filter(code_list=code_list).values_list(
+            "slug",
+            "pk",
+            "parent_id",
+        ):
+            pks[slug] = pk
+            parent_ids[slug] = parent_id
+        parent_updates = list()
+        for slug, parent_link in parent_links.items():
+            if slug not in pks:
+                continue
+            parent_slug_list = parent_link.split("/")
+            parent_id = None
+            if get_code_list_slug(parent_slug_list[-2]) == code_list.slug:
+                parent_id = pks.get(get_code_list_value_slug(parent_slug_list[-1]))
+            if parent_id is None:
+                try:
+                    parent_id = CodeListValue.search(parent_link).pk
+                except CodeList.DoesNotExist as e:
+                    errors["data"].append(f"{slug}: {e}")
+                    continue
+            if parent_ids[slug] != parent_id:
+                parent_updates.append(CodeListValue(pk=pks[slug], parent_id=parent_id))
+                if len(parent_updates) >= self.batch_size:
+                    self.bulk_write([], parent_updates, ["parent"], errors)
+                    parent_updates = list()
+        self.bulk_write([], parent_updates, ["parent"], errors)
+        return created, updated
+
+    def bulk_write(self, to_create, to_update, fields, errors):
+        """bulk_create and bulk_update inside a savepoint
+
+        When the bulk operation fails, falls back to one query per row, so that only the wrong rows are reported
+        and the rest of the code list is still written.
+        """
+        to_create, to_update = list(to_create), list(to_update)
+        try:
+            with transaction.atomic():
+                if to_create:
+                    CodeListValue.objects.bulk_create(to_create, batch_size=self.batch_size)
+                if to_update:
+                    CodeListValue.objects.bulk_update(to_update, fields, batch_size=self.batch_size)
+        except DatabaseError:
+            for code_list_value in to_create:
+                code_list_value.pk = None
+            for code_list_value in to_create + to_update:
+                try:
+                    with transaction.atomic():
+                        if code_list_value.pk:
+                            code_list_value.save(update_fields=fields)
+                        else:
+                            code_list_value.save()
+                except DatabaseError as e:
+                    errors["data"].append(f"{code_list_value.code or code_list_value.pk}: {e}")
 
     def check_language(self, language):
         LANGUAGES_AVAILABLE = dict(
@@ -462,16 +885,84 @@ class Command(BaseCommand):
             self.debug_console = True
         else:
             self.debug_console = False
-        language = kwargs.get("language")
-        if language:
-            language = self.check_language(language)
+        resume = kwargs.get("resume")
+        language_option = kwargs.get("language")
+        if resume and not language_option:
+            run = RegistrySyncRun.objects.filter(finished_at__isnull=True).first()
+            language_option = run.languages if run else None
+        languages = list()
+        for language in (language_option or "en").split(","):
+            language = self.check_language(language.strip())
             if not language:
                 return
+            languages.append(language)
+        self.force = kwargs.get("force")
+        self.incremental = kwargs.get("incremental")
+        self.feed_updated = dict()
+        snapshot_in = kwargs.get("snapshot_in")
+        snapshot_out = kwargs.get("snapshot_out")
+        if snapshot_in and snapshot_out:
+            raise CommandError(_("--snapshot-in and --snapshot-out are mutually exclusive"))
+
+        self.get_run(languages, resume)
+        snapshot = None
+        if snapshot_in:
+            self.fetcher = SnapshotFetcher(snapshot_in)
         else:
-            language = "en"
+            if INSPIRE_EU_REGISTRY_CACHE_DIR:
+                self.cache = RegistryCache(INSPIRE_EU_REGISTRY_CACHE_DIR)
+            if snapshot_out:
+                snapshot = SnapshotWriter(snapshot_out)
+            self.fetcher = RegistryFetcher(
+                concurrency=kwargs.get("concurrency"),
+                cache=self.cache,
+                snapshot=snapshot,
+            )
 
-        self.populate_status(language)
-        self.populate_themes(language)
-        self.populate_schemas(language)
-        self.populate_code_list(language)
-        self.populate_code_values(language)
+        try:
+            stages = [
+                ("status", self.populate_status),
+                ("themes", self.populate_themes),
+                ("schemas", self.populate_schemas),
+                ("code_lists", self.populate_code_list),
+            ]
+            for stage, populate in stages:
+                with transaction.atomic():
+                    populate(languages)
+                    self.run.stage = stage
+                    self.run.save(update_fields=["stage"])
+            # Not atomic as a whole: every code list is written, and checkpointed, in its own transaction
+            errors = self.populate_code_values(languages)
+            self.run.stage = "code_list_values"
+            if not errors["fetch"] and not errors["data"]:
+                self.run.finished_at = timezone.now()
+            else:
+                print(_("Sync not finished, run it again with --resume to retry the failed code lists"))
+            self.run.save(update_fields=["stage", "finished_at"])
+        finally:
+            if snapshot_in:
+                self.fetcher.close()
+            if snapshot:
+                snapshot.close()
+                print(f"Snapshot written to {snapshot_out}")
+
+    def get_run(self, languages, resume=False):
+        """Last unfinished run when resuming, otherwise a new one"""
+        run = None
+        if resume:
+            run = RegistrySyncRun.objects.filter(finished_at__isnull=True).first()
+            if run is None:
+                print(_("There is no unfinished sync to resume, starting a new one"))
+            elif run.languages != ",".join(languages):
+                raise CommandError(_(f"The sync to resume was started with --language {run.languages}"))
+            else:
+                print(f"Resuming sync started at {run.started_at} (last stage completed: {run.stage or '-'})")
+        if run is None:
+            run = RegistrySyncRun.objects.create(languages=",".join(languages))
+        self.run = run
+        self.completed = set(run.checkpoints.values_list("code_list_id", flat=True))
+        return run
+
+    def add_checkpoint(self, code_list):
+        RegistrySyncCheckpoint.objects.get_or_create(run=self.run, code_list=code_list)
+        self.completed.add(code_list.pk)
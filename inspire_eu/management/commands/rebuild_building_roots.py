@@ -0,0 +1,36 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import INSPIRE_EU_THEMES
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute again the root_building of every building from its parent"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of rows updated at a time (default: 1000)"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get("buildings"):
+            raise CommandError(_("Buildings theme is not enabled at INSPIRE_EU_THEMES"))
+        from ...models.buildings import Building
+
+        started = time.monotonic()
+        updated = Building.objects.rebuild_roots(batch_size=kwargs.get("batch_size"))
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"Building: {updated} roots updated in {elapsed:.1f}s")
@@ -0,0 +1,93 @@
+import logging
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+log = logging.getLogger(__name__)
+
+
+def get_generalised_models():
+    """Models of the enabled themes with generalised geometries, by lower case name"""
+    from ...models.abstract import AbstractGeneralisedGeometry
+
+    return dict(
+        {
+            model._meta.model_name: model
+            for model in apps.get_app_config("inspire_eu").get_models()
+            if issubclass(model, AbstractGeneralisedGeometry)
+        },
+    )
+
+
+class Command(BaseCommand):
+    help = "Compute again the generalised geometries (geometry_low, geometry_medium, geometry_high) of every row"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            type=str,
+            help=_("Models to rebuild, as cadastralparcel or cadastralzoning (default: all of them)"),
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of rows read and updated at a time (default: 1000)"),
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs.get("verbosity")
+        models = get_generalised_models()
+        names = [name.lower() for name in kwargs.get("models")] or list(models)
+        unknown = [name for name in names if name not in models]
+        if unknown:
+            raise CommandError(
+                _("Unknown models: %(unknown)s. Choices: %(models)s")
+                % {"unknown": ", ".join(unknown), "models": ", ".join(models)},
+            )
+        batch_size = kwargs.get("batch_size")
+        for name in names:
+            model = models[name]
+            started = time.monotonic()
+            count = self.rebuild(model, batch_size)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{model._meta.object_name}: {count} rows in {elapsed:.1f}s")
+
+    def rebuild(self, model, batch_size):
+        """Rebuild the generalised geometries of a model by batches of primary keys
+
+        ``content_hash`` is computed again as well, as the generalised geometries are part of it.
+        """
+        fields = list(model.generalised_fields.values())
+        if hasattr(model.objects, "set_content_hashes"):
+            fields.append("content_hash")
+        count = 0
+        last_pk = None
+        while True:
+            qs = model.objects.order_by("pk")
+            if last_pk is not None:
+                qs = qs.filter(pk__gt=last_pk)
+            objs = list(qs[:batch_size])
+            if not objs:
+                break
+            if "content_hash" in fields:
+                model.objects.set_content_hashes(objs)
+            else:
+                for obj in objs:
+                    obj.set_generalised_geometries()
+            with transaction.atomic():
+                model.objects.bulk_update(objs, fields)
+            count += len(objs)
+            last_pk = objs[-1].pk
+            if self.verbosity > 1:
+                self.stdout.write(f"{model._meta.object_name}: {count} rows")
+        return count
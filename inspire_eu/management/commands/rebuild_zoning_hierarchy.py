@@ -0,0 +1,36 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import INSPIRE_EU_THEMES
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute again the hierarchy_path of every cadastral zoning from its upper level unit"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of rows updated at a time (default: 1000)"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get("cadastral_parcels"):
+            raise CommandError(_("Cadastral parcels theme is not enabled at INSPIRE_EU_THEMES"))
+        from ...models.cadastral_parcels import CadastralZoning
+
+        started = time.monotonic()
+        updated = CadastralZoning.objects.rebuild_hierarchy(batch_size=kwargs.get("batch_size"))
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"CadastralZoning: {updated} hierarchy paths updated in {elapsed:.1f}s")
@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import INSPIRE_EU_THEMES
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute again the building summaries: one row per building with its flattened attributes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=_("Number of buildings summarised at a time (default: 1000)"),
+        )
+
+    def handle(self, *args, **kwargs):
+        if not INSPIRE_EU_THEMES.get("buildings"):
+            raise CommandError(_("Buildings theme is not enabled at INSPIRE_EU_THEMES"))
+        from ...models.buildings import BuildingSummary
+
+        stats = BuildingSummary.objects.refresh(
+            batch_size=kwargs.get("batch_size"),
+            stdout=self.stdout if kwargs.get("verbosity") > 1 else None,
+        )
+        elapsed = stats["elapsed"]
+        self.stdout.write(
+            f"BuildingSummary: {stats['refreshed']} refreshed in {elapsed:.1f}s "
+            f"({stats['refreshed'] / (elapsed or 1):.0f}/s)",
+        )
@@ -0,0 +1,145 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+log = logging.getLogger(__name__)
+
+
+def parse_bbox(value):
+    try:
+        bbox = [float(v) for v in value.split(",")]
+    except ValueError:
+        bbox = list()
+    if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        raise CommandError(_("--bbox must be min_lon,min_lat,max_lon,max_lat"))
+    return bbox
+
+
+class Command(BaseCommand):
+    help = "Build and store the vector tiles of a bounding box and a range of zoom levels at INSPIRE_EU_TILES_CACHE"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "layers",
+            nargs="*",
+            type=str,
+            help=_("Layers to seed (default: all of them)"),
+        )
+        parser.add_argument(
+            "--bbox",
+            required=True,
+            type=str,
+            help=_("Bounding box in longitude and latitude (WGS84): min_lon,min_lat,max_lon,max_lat"),
+        )
+        parser.add_argument(
+            "--min-zoom",
+            type=int,
+            help=_("First zoom level (default: the first one of every layer)"),
+        )
+        parser.add_argument(
+            "--max-zoom",
+            type=int,
+            help=_("Last zoom level (default: INSPIRE_EU_TILES_CACHE_MAX_ZOOM)"),
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help=_("Number of worker processes building tiles (default: 1)"),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=256,
+            help=_("Number of tiles given to a worker at a time (default: 256)"),
+        )
+        parser.add_argument(
+            "-f",
+            "--force",
+            action="store_true",
+            help=_("Build again the tiles already cached"),
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...tiles.cache import INSPIRE_EU_TILES_CACHE_MAX_ZOOM, get_tile_cache, seed_tiles
+        from ...tiles.layers import get_tile_layers, tile_range, to_web_mercator
+
+        if get_tile_cache() is None:
+            raise CommandError(_("INSPIRE_EU_TILES_CACHE is not set"))
+        layers = get_tile_layers()
+        names = kwargs.get("layers") or list(layers)
+        unknown = [name for name in names if name not in layers]
+        if unknown:
+            raise CommandError(
+                _("Unknown layers: %(unknown)s. Choices: %(layers)s")
+                % {"unknown": ", ".join(unknown), "layers": ", ".join(layers)},
+            )
+        bounds = to_web_mercator(parse_bbox(kwargs.get("bbox")), 4326)
+        max_zoom = min(
+            kwargs.get("max_zoom") if kwargs.get("max_zoom") is not None else INSPIRE_EU_TILES_CACHE_MAX_ZOOM,
+            INSPIRE_EU_TILES_CACHE_MAX_ZOOM,
+        )
+        chunk_size = max(kwargs.get("chunk_size"), 1)
+        force = kwargs.get("force")
+
+        def iter_chunks():
+            for name in names:
+                tile_layer = layers[name]
+                min_zoom = max(kwargs.get("min_zoom") or 0, tile_layer.min_zoom)
+                for z in range(min_zoom, min(max_zoom, tile_layer.max_zoom) + 1):
+                    xmin, ymin, xmax, ymax = tile_range(bounds, z)
+                    chunk = list()
+                    for x in range(xmin, xmax + 1):
+                        for y in range(ymin, ymax + 1):
+                            chunk.append((z, x, y))
+                            if len(chunk) >= chunk_size:
+                                yield name, chunk
+                                chunk = list()
+                    if chunk:
+                        yield name, chunk
+
+        totals = dict({"built": 0, "empty": 0, "cached": 0})
+
+        def add(stats):
+            for key, value in stats.items():
+                totals[key] += value
+            if kwargs.get("verbosity") > 1:
+                done = sum(totals.values())
+                self.stdout.write(f"{done} tiles ({totals['built']} built, {totals['cached']} already cached)")
+
+        started = time.monotonic()
+        jobs = kwargs.get("jobs")
+        if jobs <= 1:
+            for name, chunk in iter_chunks():
+                add(seed_tiles(name, chunk, force))
+        else:
+            from ...importers.base import init_worker
+
+            # Connections must not be shared with the forked workers: each one opens its own
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+                pending = set()
+                # A few chunks per worker at a time: the tiles of a large bounding box do not fit in memory
+                for name, chunk in iter_chunks():
+                    if len(pending) >= jobs * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            add(future.result())
+                    pending.add(executor.submit(seed_tiles, name, chunk, force))
+                for future in wait(pending).done:
+                    add(future.result())
+        elapsed = time.monotonic() - started
+        done = sum(totals.values())
+        self.stdout.write(
+            f"{done} tiles in {elapsed:.1f}s ({done / (elapsed or 1):.0f}/s): {totals['built']} built "
+            f"({totals['empty']} empty), {totals['cached']} already cached",
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0004_auto_20240703'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codelistvalue',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='inspire_eu.codelistvalue'),
+        ),
+    ]
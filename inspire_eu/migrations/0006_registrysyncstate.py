@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0005_codelistvalue_parent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrySyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=8)),
+                ('payload_sha256', models.CharField(blank=True, help_text='Hash of the last payload successfully synchronised', max_length=64)),
+                ('feed_updated', models.DateTimeField(blank=True, help_text='Date of the code list entry at the registry Atom feed when it was synchronised', null=True)),
+                ('synced_at', models.DateTimeField(blank=True, help_text='Date of the last successful synchronisation', null=True)),
+                ('code_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inspire_eu.codelist')),
+            ],
+            options={
+                'verbose_name': 'Registry sync state',
+                'verbose_name_plural': 'Registry sync states',
+                'ordering': ['code_list__code', 'language'],
+                'unique_together': {('code_list', 'language')},
+            },
+        ),
+    ]
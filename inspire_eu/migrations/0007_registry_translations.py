@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0006_registrysyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationSchemaTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(db_index=True, max_length=8)),
+                ('label', models.CharField(max_length=200)),
+                ('definition', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('application_schema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='inspire_eu.applicationschema')),
+            ],
+            options={
+                'verbose_name': 'Application Schema translation',
+                'verbose_name_plural': 'Application Schema translations',
+                'ordering': ['application_schema', 'language'],
+                'unique_together': {('application_schema', 'language')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CodeListTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(db_index=True, max_length=8)),
+                ('label', models.CharField(max_length=200)),
+                ('definition', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('code_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='inspire_eu.codelist')),
+            ],
+            options={
+                'verbose_name': 'Code list translation',
+                'verbose_name_plural': 'Code list translations',
+                'ordering': ['code_list', 'language'],
+                'unique_together': {('code_list', 'language')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CodeListValueTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(db_index=True, max_length=8)),
+                ('label', models.CharField(max_length=200)),
+                ('definition', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('code_list_value', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='inspire_eu.codelistvalue')),
+            ],
+            options={
+                'verbose_name': 'Code list value translation',
+                'verbose_name_plural': 'Code list value translations',
+                'ordering': ['code_list_value', 'language'],
+                'unique_together': {('code_list_value', 'language')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ThemeTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(db_index=True, max_length=8)),
+                ('label', models.CharField(max_length=200)),
+                ('definition', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('theme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='inspire_eu.theme')),
+            ],
+            options={
+                'verbose_name': 'Theme translation',
+                'verbose_name_plural': 'Theme translations',
+                'ordering': ['theme', 'language'],
+                'unique_together': {('theme', 'language')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0007_registry_translations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrySyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('languages', models.CharField(help_text='Comma separated list of languages', max_length=200)),
+                ('stage', models.CharField(blank=True, help_text='Last stage completed', max_length=32)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Registry sync run',
+                'verbose_name_plural': 'Registry sync runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistrySyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_at', models.DateTimeField(auto_now_add=True)),
+                ('code_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inspire_eu.codelist')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='inspire_eu.registrysyncrun')),
+            ],
+            options={
+                'verbose_name': 'Registry sync checkpoint',
+                'verbose_name_plural': 'Registry sync checkpoints',
+                'ordering': ['run', 'completed_at'],
+                'unique_together': {('run', 'code_list')},
+            },
+        ),
+    ]
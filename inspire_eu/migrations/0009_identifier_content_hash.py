@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0008_registry_sync_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the content of the spatial object, kept by upsert_by_identifier', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='cadastralparcel',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the content of the spatial object, kept by upsert_by_identifier', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='cadastralzoning',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the content of the spatial object, kept by upsert_by_identifier', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='otherconstruction',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the content of the spatial object, kept by upsert_by_identifier', max_length=64),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:06
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0009_identifier_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cadastralparcel',
+            name='geometry_high',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for large scale maps', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='cadastralparcel',
+            name='geometry_low',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for small scale maps', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='cadastralparcel',
+            name='geometry_medium',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for medium scale maps', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='cadastralzoning',
+            name='geometry_high',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for large scale maps', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='cadastralzoning',
+            name='geometry_low',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for small scale maps', null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='cadastralzoning',
+            name='geometry_medium',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, help_text='Geometry generalised for medium scale maps', null=True, srid=4326),
+        ),
+    ]
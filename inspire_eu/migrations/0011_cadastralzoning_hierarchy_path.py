@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0010_generalised_geometries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cadastralzoning',
+            name='hierarchy_path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Primary keys of the upper level units, from the top of the hierarchy down to the cadastral zoning.', max_length=255),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0011_cadastralzoning_hierarchy_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingSummary',
+            fields=[
+                ('building', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='inspire_eu.building')),
+                ('namespace', models.CharField(max_length=32)),
+                ('local_id', models.CharField(max_length=32)),
+                ('condition_of_construction', models.CharField(blank=True, max_length=96)),
+                ('current_use', models.CharField(blank=True, help_text='Current use with the highest percentage', max_length=96)),
+                ('height_above_ground', models.FloatField(blank=True, help_text='Highest height above ground', null=True)),
+                ('number_of_floors_above_ground', models.SmallIntegerField(blank=True, null=True)),
+                ('number_of_floors_below_ground', models.SmallIntegerField(blank=True, null=True)),
+                ('footprint_area', models.FloatField(blank=True, help_text='Area of the geometry of the building, in square meters', null=True)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Building Summary',
+                'verbose_name_plural': 'Building Summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inspire_eu', '0012_buildingsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='root_building',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Building at the top of the tree of parts, empty for the buildings which are not a part', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inspire_eu.building'),
+        ),
+    ]
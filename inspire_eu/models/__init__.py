@@ -49,4 +49,13 @@ from .core import (  # noqa
     Status,
     Theme,
     UnitOfMeasure,
+    get_code_list_slug,
+    get_code_list_value_slug,
+)
+from .registry import RegistrySyncCheckpoint, RegistrySyncRun, RegistrySyncState  # noqa
+from .translation import (  # noqa
+    ApplicationSchemaTranslation,
+    CodeListTranslation,
+    CodeListValueTranslation,
+    ThemeTranslation,
 )
@@ -1,15 +1,30 @@
+import datetime
+import functools
+import hashlib
 import logging
+import math
 
+from django.conf import settings
 from django.contrib.gis.db import models
+from django.contrib.gis.gdal import GDALException, SpatialReference, SRSException
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
+from django.db import transaction
+from django.db.models.functions import Coalesce
 try:
     from django.utils.translation import gettext_lazy as _
 except ImportError:
     from django.utils.translation import ugettext_lazy as _
 
-from .core import CodeListValue, Namespace
+from . import INSPIRE_EU_DEFAULT_SRID
+from .core import BaseInspireEUModel, CodeListValue, Namespace
 
 log = logging.getLogger(__name__)
 
+try:
+    INSPIRE_EU_GENERALISED_ZOOMS = settings.INSPIRE_EU_GENERALISED_ZOOMS
+except AttributeError:
+    INSPIRE_EU_GENERALISED_ZOOMS = (8, 11, 14)
+
 
 ###############################################################################
 #                    _    _         _                  _                      #
@@ -21,6 +36,143 @@ log = logging.getLogger(__name__)
 ###############################################################################
 
 
+def get_content_hash(values):
+    """SHA-256 of the field values of a spatial object, geometries as EWKB"""
+    h = hashlib.sha256()
+    for value in values:
+        if value is None:
+            data = b"\x00"
+        elif isinstance(value, GEOSGeometry):
+            data = bytes(value.ewkb)
+        elif isinstance(value, (datetime.datetime, datetime.date)):
+            data = value.isoformat().encode()
+        else:
+            data = str(value).encode()
+        h.update(len(data).to_bytes(4, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class IdentifierManager(models.Manager):
+    """Manager of the spatial objects with an INSPIRE :class:`Identifier`"""
+
+    batch_size = 1000
+    key_fields = ("namespace_id", "local_id", "version_id")
+    # Fields left out of content_hash, and so never rewritten by upsert_by_identifier
+    hash_exclude = ("content_hash",)
+    # Fields whose stored value is kept when the one of an updated object is None, as they may be set after the
+    # import (``cadastral_zoning`` of the parcels, see ``assign_zonings``)
+    keep_when_null = ()
+
+    def get_hash_fields(self):
+        """Fields of the spatial object itself, the ones ``content_hash`` is computed from and ``upsert_by_identifier``
+        rewrites
+
+        Left out: the primary key, ``hash_exclude``, the fields of ``INSPIRE_EU_BASE_MODEL`` and the ones filled by
+        Django (``auto_now``, ``auto_now_add``) or not editable, as their values are not read from the source.
+        Generalised geometries are kept, as they are derived from ``geometry`` before writing.
+        """
+        base_fields = {f.name for f in BaseInspireEUModel._meta.fields}
+        derived = set(getattr(self.model, "generalised_fields", dict()).values())
+        return [
+            f
+            for f in self.model._meta.concrete_fields
+            if not f.primary_key
+            and f.name not in self.hash_exclude
+            and f.name not in base_fields
+            and not getattr(f, "auto_now", False)
+            and not getattr(f, "auto_now_add", False)
+            and (f.editable or f.name in derived)
+        ]
+
+    def set_content_hash(self, obj, fields=None):
+        """Set ``content_hash`` of an instance, once its generalised geometries, which are hashed, are set
+
+        Values of ``_extra_hash_values``, when the instance has it, are hashed after the ones of its fields.
+        """
+        if hasattr(obj, "set_generalised_geometries"):
+            # Bulk writes do not call save()
+            obj.set_generalised_geometries()
+        fields = fields or self.get_hash_fields()
+        values = [getattr(obj, f.attname) for f in fields]
+        # Content written apart from the instance, as the child rows of a building read by an importer
+        values.extend(getattr(obj, "_extra_hash_values", ()))
+        obj.content_hash = get_content_hash(values)
+        return obj
+
+    def set_content_hashes(self, objs):
+        fields = self.get_hash_fields()
+        for obj in objs:
+            self.set_content_hash(obj, fields)
+        return objs
+
+    def upsert_by_identifier(self, objs, batch_size=None):
+        """Insert or update many spatial objects, matched by namespace, local id and version id
+
+        ``content_hash`` of every object is computed from its fields, once its generalised geometries are set:
+        stored rows with the same hash are left untouched, the others are updated with ``bulk_update`` and the new
+        ones inserted with ``bulk_create``. Fields of ``keep_when_null`` keep their stored value when the one of the
+        object is None.
+        Rows are looked up with one query per batch. Within ``objs`` the last object of an identifier wins.
+
+        Args:
+            objs (iterable): Unsaved instances
+            batch_size (int, optional): Objects per batch. Defaults to 1000.
+
+        Returns:
+            dict: Number of objects ``inserted``, ``updated`` and ``unchanged``. Every object gets its primary key,
+            and which of the three it was at ``_upsert_result``.
+        """
+        batch_size = batch_size or self.batch_size
+        fields = self.get_hash_fields()
+        update_fields = [f.name for f in fields] + ["content_hash"]
+        stats = dict({"inserted": 0, "updated": 0, "unchanged": 0})
+        batch = dict()
+        for obj in objs:
+            self.set_content_hash(obj, fields)
+            batch[tuple(getattr(obj, name) for name in self.key_fields)] = obj
+            if len(batch) >= batch_size:
+                self._upsert_batch(batch, update_fields, stats)
+                batch = dict()
+        if batch:
+            self._upsert_batch(batch, update_fields, stats)
+        return stats
+
+    def _upsert_batch(self, batch, update_fields, stats):
+        kept = [self.model._meta.get_field(name).attname for name in self.keep_when_null]
+        existing = dict()
+        for pk, namespace_id, local_id, version_id, content_hash, *values in self.filter(
+            local_id__in={key[1] for key in batch},
+        ).values_list("pk", *self.key_fields, "content_hash", *kept):
+            existing[(namespace_id, local_id, version_id)] = (pk, content_hash, values)
+        to_create, to_update = list(), list()
+        for key, obj in batch.items():
+            if key not in existing:
+                to_create.append(obj)
+                continue
+            obj.pk, content_hash, values = existing[key]
+            if content_hash == obj.content_hash:
+                stats["unchanged"] += 1
+                continue
+            for attname, value in zip(kept, values):
+                if getattr(obj, attname) is None:
+                    setattr(obj, attname, value)
+            to_update.append(obj)
+        with transaction.atomic(using=self.db):
+            if to_update:
+                self.bulk_update(to_update, update_fields, batch_size=len(to_update))
+            if to_create:
+                self.bulk_create(to_create, batch_size=len(to_create))
+        for obj in batch.values():
+            obj._upsert_result = "unchanged"
+        for obj in to_update:
+            obj._upsert_result = "updated"
+        for obj in to_create:
+            obj._upsert_result = "inserted"
+        stats["updated"] += len(to_update)
+        stats["inserted"] += len(to_create)
+
+
 class Identifier(models.Model):
     """Identifier
 
@@ -69,6 +221,15 @@ class Identifier(models.Model):
         ),
     )
 
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        help_text=_("SHA-256 of the content of the spatial object, kept by upsert_by_identifier"),
+    )
+
+    objects = IdentifierManager()
+
     class Meta:
         abstract = True
         unique_together = ["namespace", "local_id", "version_id"]
@@ -190,3 +351,122 @@ class AbstractGeographicalName(models.Model):
 
     class Meta:
         abstract = True
+
+
+@functools.lru_cache(maxsize=None)
+def is_geographic(srid):
+    try:
+        return SpatialReference(srid).geographic
+    except (GDALException, SRSException):
+        return False
+
+
+def get_generalisation_tolerance(zoom, srid):
+    """Side of a pixel of a 256 pixels Web Mercator tile at ``zoom``, in the units of ``srid``
+
+    Degrees of geographic CRS are taken as 111320 meters (their length at the equator), which keeps a little
+    more detail than needed at European latitudes.
+    """
+    tolerance = 2 * math.pi * 6378137 / 256 / 2 ** zoom
+    if is_geographic(srid):
+        tolerance /= 111320
+    return tolerance
+
+
+class GeneralisedGeometryQuerySet(models.QuerySet):
+    """Spatial objects with :class:`AbstractGeneralisedGeometry`"""
+
+    def with_generalised(self, zoom):
+        """Annotate ``generalised_geometry``, the geometry generalised for a zoom level of Web Mercator
+
+        The full resolution geometry and the other levels are deferred, so only the vertices of the chosen level
+        are read. Levels left empty, because simplifying did not remove any vertex, fall back to the next finer
+        one.
+        """
+        names = self.model.get_generalised_fields(zoom)
+        if len(names) == 1:
+            return self.annotate(generalised_geometry=models.F(names[0]))
+        return self.defer(*self.model.generalised_fields.values(), "geometry").annotate(
+            generalised_geometry=Coalesce(*names, output_field=self.model._meta.get_field("geometry")),
+        )
+
+
+class AbstractGeneralisedGeometry(models.Model):
+    """Generalised Geometry
+
+    Definition
+        Simplified copies of ``geometry`` at several tolerances, for the maps showing many spatial objects at
+        once.
+
+    Description
+        ``geometry_low``, ``geometry_medium`` and ``geometry_high`` are simplified, preserving their topology,
+        with a tolerance of one pixel at the zoom levels of ``INSPIRE_EU_GENERALISED_ZOOMS``. They are set on
+        save and by the importers, and rebuilt by ``rebuild_generalised_geometries``. A level is left empty when
+        it would have as many vertices as the next finer one.
+
+        ``objects.with_generalised(zoom)`` picks the level of a zoom level.
+    """
+
+    generalised_fields = dict(
+        {
+            "low": "geometry_low",
+            "medium": "geometry_medium",
+            "high": "geometry_high",
+        },
+    )
+
+    geometry_low = models.MultiPolygonField(
+        srid=INSPIRE_EU_DEFAULT_SRID,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text=_("Geometry generalised for small scale maps"),
+    )
+    geometry_medium = models.MultiPolygonField(
+        srid=INSPIRE_EU_DEFAULT_SRID,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text=_("Geometry generalised for medium scale maps"),
+    )
+    geometry_high = models.MultiPolygonField(
+        srid=INSPIRE_EU_DEFAULT_SRID,
+        blank=True,
+        null=True,
+        editable=False,
+        help_text=_("Geometry generalised for large scale maps"),
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_generalised_fields(cls, zoom):
+        """Fields to read, from the level of ``zoom`` to the full resolution ``geometry``"""
+        names = list(cls.generalised_fields.values())
+        for i, level_zoom in enumerate(INSPIRE_EU_GENERALISED_ZOOMS):
+            if zoom <= level_zoom:
+                return names[i:] + ["geometry"]
+        return ["geometry"]
+
+    def set_generalised_geometries(self):
+        finer = self.geometry
+        for name, zoom in reversed(list(zip(self.generalised_fields.values(), INSPIRE_EU_GENERALISED_ZOOMS))):
+            generalised = None
+            if finer is not None and not finer.empty:
+                generalised = finer.simplify(get_generalisation_tolerance(zoom, finer.srid), preserve_topology=True)
+                if generalised.geom_type == "Polygon":
+                    generalised = MultiPolygon(generalised, srid=finer.srid)
+                if generalised.geom_type != "MultiPolygon" or generalised.num_coords >= finer.num_coords:
+                    generalised = None
+                else:
+                    finer = generalised
+            setattr(self, name, generalised)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "geometry" in update_fields:
+            self.set_generalised_geometries()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | set(self.generalised_fields.values())
+        super().save(*args, **kwargs)
@@ -53,6 +53,8 @@ Models
 import logging
 
 from django.contrib.gis.db import models
+from django.core.exceptions import ValidationError
+from django.db import transaction
 try:
     from django.utils.translation import gettext_lazy as _
 except ImportError:
@@ -79,6 +81,7 @@ if "buildings" in INSPIRE_EU_THEMES and INSPIRE_EU_THEMES["buildings"]:
         AbstractHeightAboveGround,
         AbstractOtherConstruction,
     )
+    from .managers import BuildingManager, BuildingSummaryManager
 
     class Building(
         BaseInspireEUModel,
@@ -107,6 +110,17 @@ if "buildings" in INSPIRE_EU_THEMES and INSPIRE_EU_THEMES["buildings"]:
             help_text=_("Is it a BuildingPart?"),
             default=False,
         )
+        root_building = models.ForeignKey(
+            "self",
+            blank=True,
+            null=True,
+            editable=False,
+            on_delete=models.SET_NULL,
+            related_name="+",
+            help_text=_("Building at the top of the tree of parts, empty for the buildings which are not a part"),
+        )
+
+        objects = BuildingManager()
 
         class Meta:
             verbose_name = _("Building")
@@ -115,6 +129,35 @@ if "buildings" in INSPIRE_EU_THEMES and INSPIRE_EU_THEMES["buildings"]:
         def __str__(self):
             return self.local_id
 
+        def clean(self):
+            super().clean()
+            try:
+                type(self)._default_manager.get_root_building_id(self)
+            except ValueError as e:
+                raise ValidationError({"parent": str(e)})
+
+        def save(self, *args, **kwargs):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "parent" not in update_fields:
+                return super().save(*args, **kwargs)
+            manager = type(self)._default_manager
+            self.root_building_id = manager.get_root_building_id(self)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"root_building"}
+            adding = self._state.adding
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if not adding:
+                    manager.move_parts(self)
+
+        def get_root_building_id(self):
+            """Primary key of the building at the top of the tree of parts, without query"""
+            return self.root_building_id or self.pk
+
+        def get_tree(self):
+            """Building at the top of the tree of parts, with all its parts loaded with one query"""
+            return type(self)._default_manager.filter(pk=self.get_root_building_id()).load_trees()[0]
+
     class BuildingDocument(BaseInspireEUModel, AbstractDocument):
         """Building Document
 
@@ -268,3 +311,56 @@ if "buildings" in INSPIRE_EU_THEMES and INSPIRE_EU_THEMES["buildings"]:
         class Meta:
             verbose_name = _("Other Construction")
             verbose_name_plural = _("Other Constructions")
+
+    class BuildingSummary(BaseInspireEUModel):
+        """Building Summary
+
+        Definition
+            One row per building with its most requested attributes flattened, code list values as their codes.
+
+        Description
+            Read-heavy APIs answer the height, floors, current use, condition and footprint of a building with one
+            primary key lookup (the primary key is the one of the building) instead of joining buildings, heights,
+            current uses and code list values.
+
+            Summaries are derived data: ``refresh_building_summaries`` (or ``BuildingSummary.objects.refresh()``)
+            computes them again, and with ``INSPIRE_EU_BUILDING_SUMMARY`` they are kept in sync on every save of a
+            building, of its heights or of its current uses.
+        """
+
+        building = models.OneToOneField(
+            Building,
+            on_delete=models.CASCADE,
+            primary_key=True,
+            related_name="summary",
+        )
+        namespace = models.CharField(max_length=32)
+        local_id = models.CharField(max_length=32)
+        condition_of_construction = models.CharField(max_length=96, blank=True)
+        current_use = models.CharField(
+            max_length=96,
+            blank=True,
+            help_text=_("Current use with the highest percentage"),
+        )
+        height_above_ground = models.FloatField(
+            blank=True,
+            null=True,
+            help_text=_("Highest height above ground"),
+        )
+        number_of_floors_above_ground = models.SmallIntegerField(blank=True, null=True)
+        number_of_floors_below_ground = models.SmallIntegerField(blank=True, null=True)
+        footprint_area = models.FloatField(
+            blank=True,
+            null=True,
+            help_text=_("Area of the geometry of the building, in square meters"),
+        )
+        refreshed_at = models.DateTimeField()
+
+        objects = BuildingSummaryManager()
+
+        class Meta:
+            verbose_name = _("Building Summary")
+            verbose_name_plural = _("Building Summaries")
+
+        def __str__(self):
+            return self.local_id
@@ -8,6 +8,7 @@ except ImportError:
 
 from ...models import INSPIRE_EU_DEFAULT_SRID, CodeListValue, UnitOfMeasure
 from ...models.abstract import DataLifeCycleInfo, Identifier
+from .managers import ConstructionManager
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +28,8 @@ class AbstractConstruction(Identifier, DataLifeCycleInfo, models.Model):
         The optional spatial object types that may be added to core profiles are described in the extended profiles.
         The ones inheriting from the attributes of AbstractConstruction are Installation and OtherConstruction
 
+        ``objects.link_cadastral_parcels()`` links constructions with the cadastral parcels they stand on.
+
     References
         https://inspire.ec.europa.eu/data-model/approved/r4618-ir/html/index.htm?goto=2:3:2:1:7895
 
@@ -91,6 +94,8 @@ class AbstractConstruction(Identifier, DataLifeCycleInfo, models.Model):
         help_text=_("Any point of date of last major renovation"),
     )
 
+    objects = ConstructionManager()
+
     class Meta:
         abstract = True
 
@@ -0,0 +1,463 @@
+import logging
+import time
+
+from django.apps import apps
+from django.contrib.gis.db import models
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import Polygon
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+from ...models import CodeListValue, Namespace, UnitOfMeasure
+from ...models.abstract import IdentifierManager, is_geographic
+
+log = logging.getLogger(__name__)
+
+# Models whose rows are joined to the ones referencing them by with_full_graph
+LOOKUP_MODELS = (CodeListValue, Namespace, UnitOfMeasure)
+# ETRS89 Lambert Azimuthal Equal Area: footprints of geographic geometries are measured there
+FOOTPRINT_SRID = 3035
+
+
+def get_lookup_fields(model):
+    """Foreign keys of a model to code list values, namespaces and units of measure"""
+    return [
+        f.name
+        for f in model._meta.concrete_fields
+        if f.is_relation and f.related_model in LOOKUP_MODELS
+    ]
+
+
+class ConstructionQuerySet(models.QuerySet):
+    """Buildings and other constructions, with their links to the cadastral parcels they stand on"""
+
+    def changed_since(self, since):
+        """Constructions changed since a date and time, or standing on a cadastral parcel changed since then
+
+        Changes are the ones recorded at ``begin_lifespan_version``, the date the data provider gives to every
+        version of a feature, not the date it was written here. So features rewritten with the same version (by
+        ``--update`` re-imports or by hand) are not taken as changed, and parcels deleted since then are not seen at
+        all: link everything again (without ``since``) after such changes. Parcels are matched by bounding box, so
+        a few constructions next to a changed parcel are included as well.
+        """
+        parcels = apps.get_model(self.model._meta.app_label, "CadastralParcel")._default_manager.filter(
+            begin_lifespan_version__gte=since,
+            geometry__bboverlaps=models.OuterRef("geometry"),
+        )
+        return (
+            self.annotate(_on_changed_parcel=models.Exists(parcels))
+            .filter(models.Q(begin_lifespan_version__gte=since) | models.Q(_on_changed_parcel=True))
+        )
+
+    def link_cadastral_parcels(self, min_overlap=0.1, since=None, remove=True, batch_size=1000, stdout=None):
+        """Link the constructions of this queryset with the cadastral parcels they stand on
+
+        A construction is linked with the parcels covering more than ``min_overlap`` of its area. Constructions
+        are read by batches of primary keys and the pairs of a batch are computed by one query: on PostGIS it
+        joins constructions and parcels through the spatial index (``ST_Intersects``) and compares the area of
+        their intersection; elsewhere the parcels of the extent of the batch are read once and intersected in
+        memory.
+
+        Only the differences with the links already stored are written: new ones with ``bulk_create`` and, with
+        ``remove``, the ones no longer found are deleted. Running it again writes nothing.
+
+        Args:
+            min_overlap (float, optional): Part of the area of a construction a parcel must cover. Defaults to 0.1.
+            since (datetime, optional): Only the constructions changed since then, or standing on a parcel
+                changed since then (see :meth:`changed_since`).
+            remove (bool, optional): Delete the links not found. Defaults to True.
+            batch_size (int, optional): Constructions per batch. Defaults to 1000.
+
+        Returns:
+            dict: Number of constructions ``read``, links ``created`` and ``removed``, and ``elapsed`` seconds
+        """
+        started = time.monotonic()
+        stats = dict({"read": 0, "created": 0, "removed": 0, "elapsed": 0})
+        postgis = getattr(connections[self.db].ops, "postgis", False)
+        qs = self.filter(geometry__isnull=False)
+        if since is not None:
+            qs = qs.changed_since(since)
+        qs = qs.order_by("pk")
+        last_pk = None
+        while True:
+            batch = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            pks = list(batch.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            if postgis:
+                pairs = self._get_parcel_pairs_postgis(pks, min_overlap)
+            else:
+                pairs = self._get_parcel_pairs_python(pks, min_overlap)
+            with transaction.atomic(using=self.db):
+                created, removed = self._write_parcel_pairs(pks, pairs, remove)
+            stats["read"] += len(pks)
+            stats["created"] += created
+            stats["removed"] += removed
+            last_pk = pks[-1]
+            stats["elapsed"] = time.monotonic() - started
+            if stdout:
+                stdout.write(
+                    f"{self.model._meta.object_name}: {stats['read']} read, {stats['created']} links created, "
+                    f"{stats['removed']} removed ({stats['read'] / (stats['elapsed'] or 1):.0f}/s)",
+                )
+        stats["elapsed"] = time.monotonic() - started
+        return stats
+
+    def _get_parcel_pairs_postgis(self, pks, min_overlap):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        parcel_opts = opts.get_field("cadastral_parcels").related_model._meta
+        geometry = qn(opts.get_field("geometry").column)
+        parcel_geometry = qn(parcel_opts.get_field("geometry").column)
+        sql = f"""
+            SELECT c.{qn(opts.pk.column)}, p.{qn(parcel_opts.pk.column)}
+            FROM {qn(opts.db_table)} AS c
+            JOIN {qn(parcel_opts.db_table)} AS p ON ST_Intersects(c.{geometry}, p.{parcel_geometry})
+            WHERE c.{qn(opts.pk.column)} = ANY(%s)
+                AND ST_Area(ST_Intersection(c.{geometry}, p.{parcel_geometry})) > %s * ST_Area(c.{geometry})
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [pks, min_overlap])
+            return set(cursor.fetchall())
+
+    def _get_parcel_pairs_python(self, pks, min_overlap):
+        parcel_model = self.model._meta.get_field("cadastral_parcels").related_model
+        constructions = list()
+        extent = None
+        for pk, geometry in self.model._default_manager.using(self.db).filter(pk__in=pks).values_list(
+            "pk",
+            "geometry",
+        ):
+            if geometry is None or geometry.empty:
+                continue
+            constructions.append((pk, geometry, geometry.extent, geometry.area))
+            xmin, ymin, xmax, ymax = geometry.extent
+            if extent is not None:
+                xmin, ymin = min(xmin, extent[0]), min(ymin, extent[1])
+                xmax, ymax = max(xmax, extent[2]), max(ymax, extent[3])
+            extent = (xmin, ymin, xmax, ymax)
+        if not constructions:
+            return set()
+        bbox = Polygon.from_bbox(extent)
+        bbox.srid = constructions[0][1].srid
+        parcels = [
+            (pk, geometry.extent, geometry.prepared, geometry)
+            for pk, geometry in parcel_model._default_manager.using(self.db)
+            .filter(geometry__bboverlaps=bbox)
+            .values_list("pk", "geometry")
+            if geometry is not None and not geometry.empty
+        ]
+        pairs = set()
+        for pk, geometry, (xmin, ymin, xmax, ymax), area in constructions:
+            for parcel_pk, (pxmin, pymin, pxmax, pymax), prepared, parcel_geometry in parcels:
+                if pxmin > xmax or pxmax < xmin or pymin > ymax or pymax < ymin:
+                    continue
+                if prepared.intersects(geometry) and geometry.intersection(parcel_geometry).area > min_overlap * area:
+                    pairs.add((pk, parcel_pk))
+        return pairs
+
+    def _write_parcel_pairs(self, pks, pairs, remove):
+        field = self.model._meta.get_field("cadastral_parcels")
+        through = field.remote_field.through
+        source, target = f"{field.m2m_field_name()}_id", f"{field.m2m_reverse_field_name()}_id"
+        existing = dict()
+        for pk, source_pk, target_pk in (
+            through._default_manager.using(self.db)
+            .filter(**{f"{source}__in": pks})
+            .values_list("pk", source, target)
+        ):
+            existing[(source_pk, target_pk)] = pk
+        to_create = [through(**{source: a, target: b}) for a, b in pairs if (a, b) not in existing]
+        through._default_manager.using(self.db).bulk_create(to_create, batch_size=len(to_create) or None)
+        removed = 0
+        if remove:
+            to_remove = [pk for pair, pk in existing.items() if pair not in pairs]
+            if to_remove:
+                removed, _deleted = through._default_manager.using(self.db).filter(pk__in=to_remove).delete()
+        return len(to_create), removed
+
+
+class ConstructionManager(IdentifierManager.from_queryset(ConstructionQuerySet)):
+    """Manager of buildings and other constructions"""
+
+
+class BuildingQuerySet(ConstructionQuerySet):
+    """Buildings, with the trees of their parts
+
+    ``parent`` links a building part with the building (or part) it belongs to. :meth:`with_parts` and
+    :meth:`load_trees` walk it with one recursive query (``WITH RECURSIVE``) whatever the depth of the trees.
+    """
+
+    # Relations loaded by with_full_graph, with one query each
+    full_graph = (
+        "buildingdocument_set",
+        "buildingelevation_set",
+        "buildingexternalreference_set",
+        "buildingheightaboveground_set",
+        "buildingnature_set",
+        "buildingcurrentuse_set",
+        "buildinggeographicalname_set",
+        "parts",
+        "cadastral_parcels",
+    )
+
+    def with_full_graph(self):
+        """Buildings with their child tables, parts and cadastral parcels loaded, for serialising them
+
+        Code list values, units of measure and namespaces are joined to every row (``select_related``) and every
+        relation of ``full_graph`` is prefetched with its own joins, so a page of buildings takes one query plus
+        one per relation whatever its size. Parts are loaded as buildings, without their own relations.
+        """
+        # Reverse foreign keys are prefetched by their accessor
+        related_models = {rel.get_accessor_name(): rel.related_model for rel in self.model._meta.related_objects}
+        prefetches = list()
+        for name in self.full_graph:
+            related_model = related_models.get(name) or self.model._meta.get_field(name).related_model
+            queryset = related_model._default_manager.select_related(*get_lookup_fields(related_model))
+            prefetches.append(models.Prefetch(name, queryset=queryset))
+        return self.select_related(*get_lookup_fields(self.model)).prefetch_related(*prefetches)
+
+    def get_parts_sql(self):
+        """SQL and parameters of the primary keys of the buildings of this queryset and of all their parts"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        seed, params = self.order_by().values("pk").query.get_compiler(using=self.db).as_sql()
+        sql = f"""
+            WITH RECURSIVE tree(id) AS (
+                {seed}
+                UNION
+                SELECT b.{qn(opts.pk.column)} FROM {qn(opts.db_table)} AS b
+                JOIN tree ON b.{qn(opts.get_field("parent").column)} = tree.id
+            )
+            SELECT id FROM tree
+        """
+        return sql, params
+
+    def with_parts(self):
+        """Buildings of this queryset and all their parts, at any depth, with one query"""
+        sql, params = self.get_parts_sql()
+        return self.model._default_manager.using(self.db).filter(pk__in=RawSQL(sql, params))
+
+    def load_trees(self, queryset=None):
+        """Buildings of this queryset with their trees of parts assembled in memory, from one query
+
+        ``parts.all()`` and ``parent`` of every building of the trees are filled, so walking them does not query
+        the database again.
+
+        Args:
+            queryset (QuerySet, optional): Queryset the buildings are read with, such as
+                ``Building.objects.with_full_graph()``. Defaults to all buildings.
+
+        Returns:
+            list: Buildings of this queryset which are not a part of another one of them, by primary key
+        """
+        sql, params = self.get_parts_sql()
+        queryset = self.model._default_manager.using(self.db) if queryset is None else queryset
+        nodes = sorted(queryset.filter(pk__in=RawSQL(sql, params)), key=lambda node: node.pk)
+        by_pk = {node.pk: node for node in nodes}
+        parts = {node.pk: list() for node in nodes}
+        parent_field = self.model._meta.get_field("parent")
+        roots = list()
+        for node in nodes:
+            parent = by_pk.get(node.parent_id)
+            if parent is None:
+                roots.append(node)
+            else:
+                parts[parent.pk].append(node)
+                parent_field.set_cached_value(node, parent)
+        for node in nodes:
+            qs = node.parts.all()
+            qs._result_cache = parts[node.pk]
+            qs._prefetch_done = True
+            if not hasattr(node, "_prefetched_objects_cache"):
+                node._prefetched_objects_cache = dict()
+            node._prefetched_objects_cache["parts"] = qs
+        return roots
+
+
+class BuildingManager(IdentifierManager.from_queryset(BuildingQuerySet)):
+    """Manager of :class:`~inspire_eu.models.buildings.Building`"""
+
+    # Links between buildings and parts, set once both of them are written, and the root derived from them
+    hash_exclude = IdentifierManager.hash_exclude + ("parent", "root_building")
+
+    def get_root_building_id(self, building):
+        """``root_building`` a building should have, from its parent
+
+        Raises:
+            ValueError: When the building would be a part of itself
+        """
+        if building.parent_id is None:
+            return None
+        if building.pk is not None and (
+            building.parent_id == building.pk
+            or self.filter(pk=building.pk).with_parts().filter(pk=building.parent_id).exists()
+        ):
+            raise ValueError(_("A building can not be a part of itself"))
+        root_building_id = self.filter(pk=building.parent_id).values_list("root_building_id", flat=True).first()
+        return root_building_id or building.parent_id
+
+    def move_parts(self, building):
+        """Set ``root_building`` of the parts of a building, at any depth, to its root with one query
+
+        Returns:
+            int: Number of parts updated
+        """
+        root_building_id = building.root_building_id or building.pk
+        return (
+            self.filter(pk=building.pk)
+            .with_parts()
+            .exclude(pk=building.pk)
+            .exclude(root_building_id=root_building_id)
+            .update(root_building_id=root_building_id)
+        )
+
+    def rebuild_roots(self, batch_size=None):
+        """Compute again ``root_building`` of every building from ``parent``
+
+        Needed after writing buildings in bulk, as ``bulk_create`` and ``bulk_update`` skip ``save``. Only the
+        parts, and the buildings with a root, are read and only the roots that changed are written. Buildings in
+        a cycle of parents are logged and taken as roots.
+
+        Returns:
+            int: Number of buildings updated
+        """
+        parents = dict()
+        stored = dict()
+        for pk, parent_id, root_building_id in self.filter(
+            models.Q(parent__isnull=False) | models.Q(root_building__isnull=False),
+        ).values_list("pk", "parent_id", "root_building_id"):
+            parents[pk] = parent_id
+            stored[pk] = root_building_id
+        roots = dict()
+        for pk in parents:
+            chain = list()
+            seen = set()
+            while pk in parents and pk not in roots:
+                if pk in seen:
+                    log.warning(f"Building {pk}: cycle of parents")
+                    chain = chain[:chain.index(pk) + 1]
+                    pk = None
+                    break
+                seen.add(pk)
+                chain.append(pk)
+                pk = parents[pk]
+            # Buildings which are not a part are not read: they are the root
+            root = (roots.get(pk) or pk) if pk is not None else None
+            for node in reversed(chain):
+                roots[node] = root
+                root = root or node
+        updates = [self.model(pk=pk, root_building_id=root) for pk, root in roots.items() if stored[pk] != root]
+        self.bulk_update(updates, ["root_building"], batch_size=batch_size or self.batch_size)
+        return len(updates)
+
+
+class BuildingSummaryManager(models.Manager):
+    """Manager of :class:`~inspire_eu.models.buildings.BuildingSummary`"""
+
+    batch_size = 1000
+
+    def __init__(self):
+        super().__init__()
+        self._transforms = dict()
+
+    def get_footprint_area(self, geometry):
+        """Area of a geometry in square meters, measured on an equal area projection when it is geographic"""
+        if geometry is None or geometry.empty:
+            return None
+        if not is_geographic(geometry.srid):
+            return geometry.area
+        if geometry.srid not in self._transforms:
+            self._transforms[geometry.srid] = CoordTransform(
+                SpatialReference(geometry.srid),
+                SpatialReference(FOOTPRINT_SRID),
+            )
+        return geometry.transform(self._transforms[geometry.srid], clone=True).area
+
+    def build(self, building, now=None):
+        """Unsaved summary of a building loaded by :meth:`get_building_queryset`
+
+        The current use is the one with the highest percentage and the height the highest one above ground.
+        """
+        current_uses = sorted(
+            building.buildingcurrentuse_set.all(),
+            key=lambda use: (-(use.percentage if use.percentage is not None else -1), use.pk),
+        )
+        heights = [height.value for height in building.buildingheightaboveground_set.all() if height.value is not None]
+        return self.model(
+            building=building,
+            namespace=building.namespace.code,
+            local_id=building.local_id,
+            condition_of_construction=building.condition_of_construction.code,
+            current_use=current_uses[0].current_use.code if current_uses else "",
+            height_above_ground=max(heights) if heights else None,
+            number_of_floors_above_ground=building.number_of_floors_above_ground,
+            number_of_floors_below_ground=building.number_of_floors_below_ground,
+            footprint_area=self.get_footprint_area(building.geometry),
+            refreshed_at=now or timezone.now(),
+        )
+
+    def get_building_queryset(self, buildings=None):
+        """Buildings with what their summaries need, from a queryset or primary keys (all of them by default)"""
+        building_model = self.model._meta.get_field("building").related_model
+        if buildings is None:
+            qs = building_model._default_manager.all()
+        elif isinstance(buildings, models.QuerySet):
+            qs = buildings
+        else:
+            qs = building_model._default_manager.filter(pk__in=list(buildings))
+        height_model = building_model._meta.get_field("buildingheightaboveground").related_model
+        current_use_model = building_model._meta.get_field("buildingcurrentuse").related_model
+        return qs.select_related("namespace", "condition_of_construction").prefetch_related(
+            models.Prefetch(
+                "buildingheightaboveground_set",
+                queryset=height_model._default_manager.only("building", "value"),
+            ),
+            models.Prefetch(
+                "buildingcurrentuse_set",
+                queryset=current_use_model._default_manager.select_related("current_use"),
+            ),
+        )
+
+    def refresh(self, buildings=None, batch_size=None, stdout=None):
+        """Compute again the summaries of buildings, given as a queryset or primary keys (all of them by default)
+
+        Buildings are read by batches of primary keys, with three queries per batch, and the summaries of a batch
+        are replaced with one ``DELETE`` and one ``bulk_create``.
+
+        Returns:
+            dict: Number of summaries ``refreshed`` and ``elapsed`` seconds
+        """
+        started = time.monotonic()
+        batch_size = batch_size or self.batch_size
+        stats = dict({"refreshed": 0, "elapsed": 0})
+        qs = self.get_building_queryset(buildings).order_by("pk")
+        now = timezone.now()
+        last_pk = None
+        while True:
+            batch = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            objs = list(batch[:batch_size])
+            if not objs:
+                break
+            summaries = [self.build(building, now) for building in objs]
+            with transaction.atomic(using=self.db):
+                self.filter(pk__in=[building.pk for building in objs]).delete()
+                self.bulk_create(summaries, batch_size=len(summaries))
+            stats["refreshed"] += len(summaries)
+            last_pk = objs[-1].pk
+            stats["elapsed"] = time.monotonic() - started
+            if stdout:
+                stdout.write(
+                    f"BuildingSummary: {stats['refreshed']} refreshed "
+                    f"({stats['refreshed'] / (stats['elapsed'] or 1):.0f}/s)",
+                )
+        stats["elapsed"] = time.monotonic() - started
+        return stats
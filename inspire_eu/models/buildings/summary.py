@@ -0,0 +1,82 @@
+import contextlib
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_BUILDING_SUMMARY = settings.INSPIRE_EU_BUILDING_SUMMARY
+except AttributeError:
+    INSPIRE_EU_BUILDING_SUMMARY = False
+
+# Buildings whose summary is refreshed once the transaction is committed, and whether the signals are muted
+_state = threading.local()
+
+
+@contextlib.contextmanager
+def summary_signals_disabled():
+    """Do not refresh the summaries on the changes made meanwhile: for bulk writes refreshing them once afterwards"""
+    disabled = getattr(_state, "disabled", False)
+    _state.disabled = True
+    try:
+        yield
+    finally:
+        _state.disabled = disabled
+
+
+def schedule_refresh(building_id):
+    """Refresh the summary of a building once the transaction is committed
+
+    Buildings changed several times, or with several children changed, are refreshed once, all of them together.
+    Buildings deleted meanwhile are not found by then, and get no summary.
+    """
+    if getattr(_state, "disabled", False):
+        return
+    pending = getattr(_state, "pending", None)
+    if pending is None:
+        pending = _state.pending = set()
+    pending.add(building_id)
+    # The first callback run refreshes them all, the others find nothing pending
+    transaction.on_commit(refresh_pending)
+
+
+def refresh_pending():
+    pending = getattr(_state, "pending", None)
+    if not pending:
+        return
+    _state.pending = set()
+    from . import BuildingSummary
+
+    BuildingSummary.objects.refresh(sorted(pending))
+
+
+# Signals #####################################################################
+
+
+def connect_signals():
+    """Keep the summaries in sync with the buildings, their heights above ground and current uses"""
+    from . import Building, BuildingCurrentUse, BuildingHeightAboveGround
+
+    post_save.connect(building_changed, sender=Building, dispatch_uid="inspire_eu_bu_summary")
+    for model in (BuildingCurrentUse, BuildingHeightAboveGround):
+        uid = f"inspire_eu_bu_summary_{model._meta.model_name}"
+        post_save.connect(building_child_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(building_child_changed, sender=model, dispatch_uid=uid)
+
+
+def building_changed(sender, instance, raw=False, **kwargs):
+    """Refresh the summary of a building saved"""
+    if raw:
+        return
+    schedule_refresh(instance.pk)
+
+
+def building_child_changed(sender, instance, raw=False, **kwargs):
+    """Refresh the summary of the building of a height or current use saved or deleted"""
+    if raw or instance.building_id is None:
+        return
+    schedule_refresh(instance.building_id)
@@ -0,0 +1,181 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_SIZE = settings.INSPIRE_EU_CODE_LIST_VALUE_CACHE_SIZE
+except AttributeError:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_SIZE = 10000
+
+try:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_WARMUP = settings.INSPIRE_EU_CODE_LIST_VALUE_CACHE_WARMUP
+except AttributeError:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_WARMUP = 10000
+
+try:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_ALIAS = settings.INSPIRE_EU_CODE_LIST_VALUE_CACHE_ALIAS
+except AttributeError:
+    INSPIRE_EU_CODE_LIST_VALUE_CACHE_ALIAS = None
+
+
+class CodeListValueCache:
+    """Code List Value Cache
+
+    Definition
+        Process local, size bounded (LRU) cache of the code list values resolved by
+        :meth:`~inspire_eu.models.core.CodeListValue.search`, keyed by ``(code_list_slug, slug)``.
+
+    Description
+        On the first lookup it is filled with one single query: the first ``warmup_size`` values (no more than
+        ``maxsize``) by code list and primary key, so the same ones on every process. Entries are dropped
+        when a code list value or a code list is saved or deleted (``post_save`` / ``post_delete`` signals,
+        connected at :class:`~inspire_eu.apps.InspireEuConfig`), and by ``load_initial_inspire`` after its bulk
+        writes, which do not send signals.
+
+        When ``alias`` is set, the Django cache with that alias is used as a second tier shared by every worker.
+        Its keys include a version number which is incremented on every invalidation, so the other workers
+        drop their local entries as well (checked at most every ``check_interval`` seconds).
+    """
+
+    key_prefix = "inspire_eu:code_list_value"
+
+    def __init__(self, maxsize=INSPIRE_EU_CODE_LIST_VALUE_CACHE_SIZE, alias=INSPIRE_EU_CODE_LIST_VALUE_CACHE_ALIAS,
+                 check_interval=1, warmup_size=INSPIRE_EU_CODE_LIST_VALUE_CACHE_WARMUP):
+        self.maxsize = maxsize
+        self.warmup_size = warmup_size
+        self.alias = alias
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._warmed_up = False
+        self._version = None
+        self._checked_at = 0
+
+    @property
+    def enabled(self):
+        return bool(self.maxsize)
+
+    @property
+    def shared(self):
+        if not self.alias:
+            return None
+        return caches[self.alias]
+
+    def get_shared_key(self, code_list_slug, slug):
+        return f"{self.key_prefix}:{self._version}:{code_list_slug}:{slug}"
+
+    def check_version(self):
+        """Drop the local entries when another worker has invalidated the shared tier"""
+        shared = self.shared
+        if shared is None or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        version = shared.get_or_set(f"{self.key_prefix}:version", 1, None)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._version is not None and self._version != version:
+                self._entries.clear()
+                self._warmed_up = False
+            self._version = version
+
+    def warmup(self):
+        """Fill the local tier with one query"""
+        if not self.enabled:
+            return
+        size = min(self.warmup_size, self.maxsize)
+        CodeListValue = apps.get_model("inspire_eu", "CodeListValue")
+        qs = CodeListValue.objects.select_related("code_list").order_by("code_list_id", "pk")[:size] if size else ()
+        with self._lock:
+            for code_list_value in qs:
+                self._set_local(code_list_value)
+            self._warmed_up = True
+        log.debug(f"{len(self._entries)} code list values loaded at cache")
+
+    def get(self, code_list_slug, slug):
+        """Cached CodeListValue, or None when it is not at the cache"""
+        if not self.enabled:
+            return None
+        self.check_version()
+        if not self._warmed_up:
+            self.warmup()
+        key = (code_list_slug, slug)
+        with self._lock:
+            code_list_value = self._entries.get(key)
+            if code_list_value is not None:
+                self._entries.move_to_end(key)
+        if code_list_value is None and self.shared is not None:
+            code_list_value = self.shared.get(self.get_shared_key(code_list_slug, slug))
+            if code_list_value is not None:
+                with self._lock:
+                    self._set_local(code_list_value)
+        if code_list_value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Callers may change the instance they get, the cached one must stay untouched
+        return copy.copy(code_list_value)
+
+    def set(self, code_list_value):
+        if not self.enabled:
+            return
+        self.check_version()
+        with self._lock:
+            self._set_local(code_list_value)
+        if self.shared is not None:
+            self.shared.set(
+                self.get_shared_key(code_list_value.code_list.slug, code_list_value.slug),
+                code_list_value,
+            )
+
+    def _set_local(self, code_list_value):
+        key = (code_list_value.code_list.slug, code_list_value.slug)
+        self._entries[key] = code_list_value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, pk=None, code_list_pk=None):
+        """Drop the entries of a code list value (``pk``), of a code list (``code_list_pk``) or all of them"""
+        with self._lock:
+            if pk is None and code_list_pk is None:
+                self._entries.clear()
+                self._warmed_up = False
+            else:
+                for key, code_list_value in list(self._entries.items()):
+                    if code_list_value.pk == pk or code_list_value.code_list_id == code_list_pk:
+                        del self._entries[key]
+        shared = self.shared
+        if shared is not None:
+            key = f"{self.key_prefix}:version"
+            try:
+                version = shared.incr(key)
+            except ValueError:
+                version = 1
+                shared.set(key, version, None)
+            with self._lock:
+                self._version = version
+                self._checked_at = time.monotonic()
+
+    def clear(self):
+        """Drop every entry, as tests must do after rolling back the code list values they created"""
+        self.invalidate()
+
+
+code_list_value_cache = CodeListValueCache()
+
+
+def code_list_value_changed(sender, instance, **kwargs):
+    code_list_value_cache.invalidate(pk=instance.pk)
+
+
+def code_list_changed(sender, instance, **kwargs):
+    code_list_value_cache.invalidate(code_list_pk=instance.pk)
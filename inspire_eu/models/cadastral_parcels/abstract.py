@@ -1,18 +1,21 @@
 import logging
 
 from django.contrib.gis.db import models
+from django.core.exceptions import ValidationError
+from django.db import transaction
 try:
     from django.utils.translation import gettext_lazy as _
 except ImportError:
     from django.utils.translation import ugettext_lazy as _
 
 from ...models import INSPIRE_EU_DEFAULT_SRID, CodeListValue, UnitOfMeasure
-from ...models.abstract import DataLifeCycleInfo, Identifier
+from ...models.abstract import AbstractGeneralisedGeometry, DataLifeCycleInfo, Identifier
+from .managers import CadastralParcelManager, CadastralZoningManager
 
 log = logging.getLogger(__name__)
 
 
-class AbstractCadastralZoning(Identifier, DataLifeCycleInfo):
+class AbstractCadastralZoning(Identifier, DataLifeCycleInfo, AbstractGeneralisedGeometry):
     """CadastralZoning
 
     Definition
@@ -36,6 +39,10 @@ class AbstractCadastralZoning(Identifier, DataLifeCycleInfo):
         level. When several levels of zonings exist in a Member State, it must be ensured that the higher level
         units are composed of that of lower level.
 
+        The chain of ``upper_level_unit`` is stored at ``hierarchy_path``, kept on save and rebuilt after the
+        imports and by ``rebuild_zoning_hierarchy``, for ``objects.descendants(zoning)``,
+        ``objects.ancestors(zoning)`` and ``objects.parcels_within(zoning)`` to be single queries.
+
     References:
         * `UML <https://inspire.ec.europa.eu/data-model/approved/r4618-ir/html/index.htm?goto=2:1:3:1:7204>`_
     """
@@ -167,13 +174,88 @@ class AbstractCadastralZoning(Identifier, DataLifeCycleInfo):
         ),
     )
 
+    hierarchy_path = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        help_text=_(
+            "Primary keys of the upper level units, from the top of the hierarchy down to the cadastral zoning.",
+        ),
+    )
+
+    objects = CadastralZoningManager()
+
     class Meta:
         abstract = True
 
+    def get_upper_level_path(self):
+        """``hierarchy_path`` of ``upper_level_unit``, ``/`` at the top of the hierarchy
+
+        Upper level units without a path yet (written in bulk, before ``rebuild_hierarchy``) are followed up to
+        the first one with a path or the top of the hierarchy, one query per level.
+
+        Raises:
+            ValueError: When the zoning would be below itself
+        """
+        # Upper level units without a path, from the nearest one up
+        chain = list()
+        path = "/"
+        pk = self.upper_level_unit_id
+        while pk is not None:
+            if pk in chain:
+                log.warning(f"CadastralZoning {pk}: cycle of upper level units")
+                break
+            row = (
+                type(self)._default_manager.filter(pk=pk)
+                .values_list("upper_level_unit_id", "hierarchy_path")
+                .first()
+            )
+            if row is None:
+                break
+            upper_level_unit_id, hierarchy_path = row
+            if hierarchy_path:
+                path = hierarchy_path
+                break
+            chain.append(pk)
+            pk = upper_level_unit_id
+        for node in reversed(chain):
+            path = f"{path}{node}/"
+        if self.pk is not None and f"/{self.pk}/" in path:
+            raise ValueError(_("A cadastral zoning can not be below itself"))
+        return path
+
+    def clean(self):
+        super().clean()
+        try:
+            self.get_upper_level_path()
+        except ValueError as e:
+            raise ValidationError({"upper_level_unit": str(e)})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "upper_level_unit" not in update_fields and self.hierarchy_path:
+            return super().save(*args, **kwargs)
+        path = self.get_upper_level_path()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            type(self)._default_manager.move_hierarchy(self, f"{path}{self.pk}/")
+
+    def get_ancestors(self, include_self=False):
+        return type(self)._default_manager.ancestors(self, include_self=include_self)
+
+    def get_descendants(self, include_self=False):
+        return type(self)._default_manager.descendants(self, include_self=include_self)
+
+    def get_parcels_within(self):
+        return type(self)._default_manager.parcels_within(self)
+
 
 class AbstractCadastralParcel(
     Identifier,
     DataLifeCycleInfo,
+    AbstractGeneralisedGeometry,
     models.Model,
 ):
     """Cadastral Parcels
@@ -270,5 +352,7 @@ class AbstractCadastralParcel(
         ),
     )
 
+    objects = CadastralParcelManager()
+
     class Meta:
         abstract = True
@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_PARCEL_LOOKUP_CACHE_SIZE = settings.INSPIRE_EU_PARCEL_LOOKUP_CACHE_SIZE
+except AttributeError:
+    INSPIRE_EU_PARCEL_LOOKUP_CACHE_SIZE = 0
+
+try:
+    INSPIRE_EU_PARCEL_LOOKUP_CACHE_TIMEOUT = settings.INSPIRE_EU_PARCEL_LOOKUP_CACHE_TIMEOUT
+except AttributeError:
+    INSPIRE_EU_PARCEL_LOOKUP_CACHE_TIMEOUT = 300
+
+
+class GeometryIndex:
+    """Geometry Index
+
+    Definition
+        Primary keys and prepared geometries of some spatial objects, to find the ones containing a set of points.
+
+    Description
+        With `shapely <https://shapely.readthedocs.io>`_ installed the geometries are kept at an ``STRtree`` and
+        every point is tested against the geometries whose envelope contains it. Otherwise GEOS prepared
+        geometries are tested one by one after a check of their extent.
+
+        As ``ST_Contains``, points on the boundary of a geometry are not contained by it.
+    """
+
+    def __init__(self, items):
+        self.pks = list()
+        geometries = list()
+        for pk, geometry in items:
+            if geometry is None:
+                continue
+            self.pks.append(pk)
+            geometries.append(geometry)
+        if shapely is not None:
+            self.geometries = shapely.from_wkb([bytes(geometry.wkb) for geometry in geometries])
+            shapely.prepare(self.geometries)
+            self.tree = shapely.STRtree(self.geometries)
+        else:
+            self.geometries = [(geometry.extent, geometry.prepared) for geometry in geometries]
+            self.tree = None
+
+    def __len__(self):
+        return len(self.pks)
+
+    def query(self, xs, ys):
+        """Geometries containing every point
+
+        Args:
+            xs (list): X coordinates of the points, in the SRID of the geometries
+            ys (list): Y coordinates of the points
+
+        Returns:
+            list: Pairs ``(point_index, pk)``
+        """
+        if not self.pks or not xs:
+            return list()
+        if self.tree is not None:
+            point_indexes, geometry_indexes = self.tree.query(shapely.points(xs, ys), predicate="within")
+            return [(int(i), self.pks[j]) for i, j in zip(point_indexes, geometry_indexes)]
+        pairs = list()
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            point = Point(x, y)
+            for pk, ((xmin, ymin, xmax, ymax), prepared) in zip(self.pks, self.geometries):
+                if xmin <= x <= xmax and ymin <= y <= ymax and prepared.contains(point):
+                    pairs.append((i, pk))
+        return pairs
+
+
+class ParcelLookupCache:
+    """Parcel Lookup Cache
+
+    Definition
+        Process local cache of the geometries of the cadastral parcels of the most recently used cadastral
+        zonings, used by :meth:`CadastralParcelQuerySet.at_point` and :meth:`CadastralParcelQuerySet.at_points`.
+
+    Description
+        An ``STRtree`` of the cadastral zonings with parcels is loaded on the first lookup. The zonings
+        containing a point are searched there and then the parcels of every one of them, whose ``STRtree`` is
+        loaded with one query the first time the zoning is hit. Only the ``maxsize`` least recently used zonings
+        are kept. Points out of every zoning, or out of every parcel of their zonings, are left to the database.
+
+        Saving or deleting a parcel drops its zoning, and saving or deleting a zoning drops everything
+        (``post_save`` / ``post_delete`` signals, connected at :class:`~inspire_eu.apps.InspireEuConfig`). Bulk
+        writes do not send signals: the importers clear the cache when they finish and, in any case, it is
+        reloaded every ``timeout`` seconds.
+
+        It requires shapely and it is disabled by default (``INSPIRE_EU_PARCEL_LOOKUP_CACHE_SIZE``).
+    """
+
+    def __init__(self, maxsize=INSPIRE_EU_PARCEL_LOOKUP_CACHE_SIZE, timeout=INSPIRE_EU_PARCEL_LOOKUP_CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._zonings = None
+        self._loaded_at = 0
+        self._parcels = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        return bool(self.maxsize) and shapely is not None
+
+    def get_zonings(self):
+        """Index of the cadastral zonings with parcels, (re)loaded when missing or expired"""
+        with self._lock:
+            if self._zonings is not None and self.timeout and time.monotonic() - self._loaded_at > self.timeout:
+                self._zonings = None
+                self._parcels.clear()
+            if self._zonings is None:
+                CadastralZoning = apps.get_model("inspire_eu", "CadastralZoning")
+                CadastralParcel = apps.get_model("inspire_eu", "CadastralParcel")
+                self._zonings = GeometryIndex(
+                    CadastralZoning.objects.filter(
+                        pk__in=CadastralParcel.objects.values("cadastral_zoning_id"),
+                    ).values_list("pk", "geometry"),
+                )
+                self._loaded_at = time.monotonic()
+                log.debug(f"{len(self._zonings)} cadastral zonings loaded at the parcel lookup cache")
+            return self._zonings
+
+    def get_parcels(self, zoning_pk):
+        """Index of the cadastral parcels of a zoning"""
+        with self._lock:
+            parcels = self._parcels.get(zoning_pk)
+            if parcels is not None:
+                self._parcels.move_to_end(zoning_pk)
+                return parcels
+        CadastralParcel = apps.get_model("inspire_eu", "CadastralParcel")
+        parcels = GeometryIndex(
+            CadastralParcel.objects.filter(cadastral_zoning_id=zoning_pk).values_list("pk", "geometry"),
+        )
+        with self._lock:
+            self._parcels[zoning_pk] = parcels
+            while len(self._parcels) > self.maxsize:
+                self._parcels.popitem(last=False)
+        return parcels
+
+    def lookup(self, xs, ys):
+        """Primary keys of the cadastral parcels containing every point
+
+        Args:
+            xs (list): X coordinates of the points, in the SRID of the parcels
+            ys (list): Y coordinates of the points
+
+        Returns:
+            list: For every point, a list of primary keys or None when the cache can not tell
+        """
+        found = [None] * len(xs)
+        if not self.enabled or not xs:
+            return found
+        by_zoning = dict()
+        for i, zoning_pk in self.get_zonings().query(xs, ys):
+            by_zoning.setdefault(zoning_pk, list()).append(i)
+        for zoning_pk, indexes in by_zoning.items():
+            pairs = self.get_parcels(zoning_pk).query([xs[i] for i in indexes], [ys[i] for i in indexes])
+            for j, pk in pairs:
+                i = indexes[j]
+                if found[i] is None:
+                    found[i] = list()
+                if pk not in found[i]:
+                    found[i].append(pk)
+        hits = sum(1 for pks in found if pks is not None)
+        self.hits += hits
+        self.misses += len(found) - hits
+        return found
+
+    def invalidate(self, zoning_pk=None, parcel_pk=None):
+        """Drop the parcels of a zoning (``zoning_pk``), the zonings holding a parcel (``parcel_pk``) or all"""
+        with self._lock:
+            if zoning_pk is None and parcel_pk is None:
+                self._zonings = None
+                self._parcels.clear()
+                return
+            self._parcels.pop(zoning_pk, None)
+            if zoning_pk is not None and self._zonings is not None and zoning_pk not in self._zonings.pks:
+                # First parcel of that zoning
+                self._zonings = None
+            if parcel_pk is not None:
+                for key, parcels in list(self._parcels.items()):
+                    if parcel_pk in parcels.pks:
+                        del self._parcels[key]
+
+    def clear(self):
+        self.invalidate()
+
+
+parcel_lookup_cache = ParcelLookupCache()
+
+
+def cadastral_parcel_changed(sender, instance, **kwargs):
+    parcel_lookup_cache.invalidate(zoning_pk=instance.cadastral_zoning_id, parcel_pk=instance.pk)
+
+
+def cadastral_zoning_changed(sender, instance, **kwargs):
+    parcel_lookup_cache.clear()
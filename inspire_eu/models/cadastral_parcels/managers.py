@@ -0,0 +1,405 @@
+import functools
+import logging
+import operator
+import time
+
+from django.apps import apps
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import MultiPoint, Point, Polygon
+from django.db import connections, models, transaction
+from django.db.models.functions import Concat, Length, Substr
+
+from ...models.abstract import GeneralisedGeometryQuerySet, IdentifierManager
+from .cache import GeometryIndex, parcel_lookup_cache
+
+log = logging.getLogger(__name__)
+
+# Building a transformation is far more expensive than applying it: one per source SRID
+_transforms = dict()
+
+
+class CadastralParcelQuerySet(GeneralisedGeometryQuerySet):
+    """Cadastral parcels, with point-in-parcel lookups"""
+
+    def get_point(self, lon, lat, srid=4326):
+        """Point in the SRID of the parcel geometries"""
+        point = Point(float(lon), float(lat), srid=srid)
+        target = self.model._meta.get_field("geometry").srid
+        if srid != target:
+            if (srid, target) not in _transforms:
+                _transforms[(srid, target)] = CoordTransform(SpatialReference(srid), SpatialReference(target))
+            point.transform(_transforms[(srid, target)])
+        return point
+
+    def at_point(self, lon, lat, srid=4326):
+        """Cadastral parcels containing a point
+
+        The parcels are searched at :data:`~inspire_eu.models.cadastral_parcels.cache.parcel_lookup_cache` when it
+        is enabled, and otherwise with the spatial index of the geometry (bounding box prefilter) and an exact
+        containment test.
+
+        Args:
+            lon (float): Longitude, or X coordinate
+            lat (float): Latitude, or Y coordinate
+            srid (int, optional): SRID of the coordinates. Defaults to 4326.
+
+        Returns:
+            QuerySet: Parcels containing the point, usually one
+        """
+        point = self.get_point(lon, lat, srid)
+        pks = parcel_lookup_cache.lookup([point.x], [point.y])[0]
+        if pks is not None:
+            return self.filter(pk__in=pks)
+        return self.filter(geometry__bbcontains=point, geometry__contains=point)
+
+    def at_points(self, points, srid=4326):
+        """Cadastral parcel containing every point, with one single query
+
+        Points not answered by the cache are searched together: the parcels intersecting all of them are fetched
+        with one query and every point is then matched to its parcel in memory.
+
+        Args:
+            points (iterable): Pairs ``(lon, lat)``
+            srid (int, optional): SRID of the coordinates. Defaults to 4326.
+
+        Returns:
+            list: For every point, the parcel containing it (the one with the lowest primary key if several
+            do) or None
+        """
+        points = [self.get_point(lon, lat, srid) for lon, lat in points]
+        xs, ys = [p.x for p in points], [p.y for p in points]
+        found = parcel_lookup_cache.lookup(xs, ys)
+        parcels = dict()
+        missing = [i for i, pks in enumerate(found) if pks is None]
+        if missing:
+            multipoint = MultiPoint([points[i] for i in missing], srid=points[0].srid)
+            for parcel in self.filter(geometry__bboverlaps=multipoint, geometry__intersects=multipoint):
+                parcels[parcel.pk] = parcel
+            index = GeometryIndex((pk, parcel.geometry) for pk, parcel in parcels.items())
+            for i in missing:
+                found[i] = list()
+            for j, pk in index.query([xs[i] for i in missing], [ys[i] for i in missing]):
+                found[missing[j]].append(pk)
+        cached = {pk for pks in found for pk in pks if pk not in parcels}
+        if cached:
+            parcels.update(self.in_bulk(cached))
+        result = list()
+        for pks in found:
+            pks = sorted(pk for pk in pks if pk in parcels)
+            result.append(parcels[pks[0]] if pks else None)
+        return result
+
+    def assign_zonings(self, batch_size=1000, overlap=True, stdout=None):
+        """Set ``cadastral_zoning`` of the parcels of this queryset without it
+
+        Every parcel gets the lowest level zoning (the deepest one in the hierarchy, see ``hierarchy_path``)
+        containing its ``reference_point``, or a point on its surface when it has none. With ``overlap`` the
+        parcels whose point is in no zoning get the zoning overlapping the largest part of them, the lowest level
+        one on a tie. Zonings only touching a parcel, with no area in common, are not taken.
+
+        Parcels are read by batches of primary keys. On PostGIS every batch is assigned by one ``UPDATE`` joining
+        parcels and zonings through their spatial index (two with ``overlap``); elsewhere the zonings of the
+        extent of a batch are read once and matched in memory.
+
+        ``content_hash`` is not changed: it keeps describing the features as imported, so importing them again
+        with ``--update`` leaves the unchanged ones untouched. The changed ones keep the zoning assigned as well,
+        as ``cadastral_zoning`` is in ``keep_when_null`` of the manager.
+
+        Returns:
+            dict: Number of parcels ``read`` and ``assigned``, and ``elapsed`` seconds
+        """
+        started = time.monotonic()
+        stats = dict({"read": 0, "assigned": 0, "elapsed": 0})
+        using = self.db
+        postgis = getattr(connections[using].ops, "postgis", False)
+        qs = self.filter(cadastral_zoning__isnull=True).order_by("pk")
+        last_pk = None
+        while True:
+            batch = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            pks = list(batch.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            with transaction.atomic(using=using):
+                if postgis:
+                    assigned = self._assign_zonings_postgis(pks, overlap)
+                else:
+                    assigned = self._assign_zonings_python(pks, overlap)
+            stats["read"] += len(pks)
+            stats["assigned"] += assigned
+            last_pk = pks[-1]
+            stats["elapsed"] = time.monotonic() - started
+            if stdout:
+                stdout.write(
+                    f"CadastralParcel: {stats['assigned']} of {stats['read']} assigned "
+                    f"({stats['read'] / (stats['elapsed'] or 1):.0f}/s)",
+                )
+        # Bulk writes do not send signals
+        parcel_lookup_cache.clear()
+        stats["elapsed"] = time.monotonic() - started
+        return stats
+
+    def _assign_zonings_postgis(self, pks, overlap):
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        zoning_field = opts.get_field("cadastral_zoning")
+        zoning_opts = zoning_field.related_model._meta
+        columns = dict(
+            {
+                "parcel": qn(opts.db_table),
+                "parcel_pk": qn(opts.pk.column),
+                "parcel_zoning": qn(zoning_field.column),
+                "parcel_geometry": qn(opts.get_field("geometry").column),
+                "reference_point": qn(opts.get_field("reference_point").column),
+                "zoning": qn(zoning_opts.db_table),
+                "zoning_pk": qn(zoning_opts.pk.column),
+                "zoning_geometry": qn(zoning_opts.get_field("geometry").column),
+                "path": qn(zoning_opts.get_field("hierarchy_path").column),
+            },
+        )
+        # Depth in the hierarchy: number of separators of the path
+        depth = "length(z.{path}) - length(replace(z.{path}, '/', ''))".format(**columns)
+        sql = """
+            UPDATE {parcel} AS p SET {parcel_zoning} = m.zoning_id
+            FROM (
+                SELECT DISTINCT ON (p.{parcel_pk}) p.{parcel_pk} AS parcel_id, z.{zoning_pk} AS zoning_id
+                FROM {parcel} AS p
+                JOIN {zoning} AS z ON {join}
+                WHERE p.{parcel_pk} = ANY(%s) AND p.{parcel_zoning} IS NULL
+                ORDER BY p.{parcel_pk}, {order}, z.{zoning_pk}
+            ) AS m
+            WHERE p.{parcel_pk} = m.parcel_id
+        """
+        statements = [
+            sql.format(
+                join="ST_Contains(z.{zoning_geometry}, "
+                "COALESCE(p.{reference_point}, ST_PointOnSurface(p.{parcel_geometry})))".format(**columns),
+                order=f"{depth} DESC",
+                **columns,
+            ),
+        ]
+        if overlap:
+            area = "ST_Area(ST_Intersection(z.{zoning_geometry}, p.{parcel_geometry}))".format(**columns)
+            statements.append(
+                sql.format(
+                    join="ST_Intersects(z.{zoning_geometry}, p.{parcel_geometry}) AND {area} > 0".format(
+                        area=area,
+                        **columns,
+                    ),
+                    order=f"{area} DESC, {depth} DESC",
+                    **columns,
+                ),
+            )
+        assigned = 0
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement, [pks])
+                assigned += cursor.rowcount
+        return assigned
+
+    def _assign_zonings_python(self, pks, overlap):
+        zoning_model = self.model._meta.get_field("cadastral_zoning").related_model
+        parcels = list()
+        extent = None
+        for pk, point, geometry in self.model._default_manager.using(self.db).filter(pk__in=pks).values_list(
+            "pk",
+            "reference_point",
+            "geometry",
+        ):
+            if point is None and geometry is not None and not geometry.empty:
+                point = geometry.point_on_surface
+            if point is None:
+                continue
+            parcels.append((pk, point, geometry))
+            for g in (point, geometry):
+                if g is not None and not g.empty:
+                    xmin, ymin, xmax, ymax = g.extent
+                    if extent is not None:
+                        xmin, ymin = min(xmin, extent[0]), min(ymin, extent[1])
+                        xmax, ymax = max(xmax, extent[2]), max(ymax, extent[3])
+                    extent = (xmin, ymin, xmax, ymax)
+        if not parcels:
+            return 0
+        bbox = Polygon.from_bbox(extent)
+        bbox.srid = parcels[0][1].srid
+        zonings = list(
+            zoning_model._default_manager.using(self.db)
+            .filter(geometry__bboverlaps=bbox)
+            .values_list("pk", "hierarchy_path", "geometry"),
+        )
+        depths = {pk: path.count("/") for pk, path, _geometry in zonings}
+        index = GeometryIndex((pk, geometry) for pk, _path, geometry in zonings)
+        found = dict()
+        for i, pk in index.query([p[1].x for p in parcels], [p[1].y for p in parcels]):
+            found.setdefault(parcels[i][0], list()).append(pk)
+        assignments = {
+            pk: min(matches, key=lambda zoning_pk: (-depths[zoning_pk], zoning_pk)) for pk, matches in found.items()
+        }
+        if overlap:
+            for pk, _point, geometry in parcels:
+                if pk in assignments or geometry is None or geometry.empty:
+                    continue
+                best = None
+                for zoning_pk, _path, zoning_geometry in zonings:
+                    if zoning_geometry is None or not zoning_geometry.intersects(geometry):
+                        continue
+                    area = zoning_geometry.intersection(geometry).area
+                    if area <= 0:
+                        # Only touching
+                        continue
+                    key = (area, depths[zoning_pk], -zoning_pk)
+                    if best is None or key > best[0]:
+                        best = (key, zoning_pk)
+                if best is not None:
+                    assignments[pk] = best[1]
+        self.model._default_manager.using(self.db).bulk_update(
+            [self.model(pk=pk, cadastral_zoning_id=zoning_pk) for pk, zoning_pk in assignments.items()],
+            ["cadastral_zoning"],
+        )
+        return len(assignments)
+
+
+class CadastralParcelManager(IdentifierManager.from_queryset(CadastralParcelQuerySet)):
+    """Manager of :class:`~inspire_eu.models.cadastral_parcels.CadastralParcel`"""
+
+    # Parcels without a zoning in their dataset keep the one of assign_zonings when they are updated
+    keep_when_null = ("cadastral_zoning",)
+
+
+class CadastralZoningQuerySet(GeneralisedGeometryQuerySet):
+    """Cadastral zonings, with queries over their hierarchy
+
+    Every zoning stores at ``hierarchy_path`` the primary keys from the top of the hierarchy down to itself, as
+    ``/1/5/23/``: the zonings below one are the ones whose path starts with its path, and the ones above it are
+    the ones listed in its path. Both are answered by one query on the index of the column.
+    """
+
+    def get_hierarchy_paths(self, zonings):
+        """``hierarchy_path`` of zonings given as instances or primary keys
+
+        Paths of primary keys, and of instances without it, are read with one query.
+        """
+        paths = list()
+        pks = list()
+        for zoning in zonings:
+            if isinstance(zoning, self.model) and zoning.hierarchy_path:
+                paths.append((zoning.pk, zoning.hierarchy_path))
+            else:
+                pks.append(zoning.pk if isinstance(zoning, self.model) else zoning)
+        if pks:
+            paths.extend(self.model._default_manager.filter(pk__in=pks).values_list("pk", "hierarchy_path"))
+        missing = [str(pk) for pk, path in paths if not path]
+        if missing:
+            raise ValueError(
+                f"Cadastral zonings without hierarchy path: {', '.join(missing)}. Run rebuild_zoning_hierarchy",
+            )
+        return [path for _pk, path in paths]
+
+    def descendants(self, *zonings, include_self=False):
+        """Cadastral zonings below any of ``zonings`` in the hierarchy, at any level
+
+        Args:
+            zonings: Cadastral zonings, as instances or primary keys
+            include_self (bool, optional): Include ``zonings`` themselves. Defaults to False.
+
+        Returns:
+            QuerySet: Zonings of this queryset below ``zonings``
+        """
+        paths = self.get_hierarchy_paths(zonings)
+        if not paths:
+            return self.none()
+        qs = self.filter(functools.reduce(operator.or_, (models.Q(hierarchy_path__startswith=p) for p in paths)))
+        if not include_self:
+            qs = qs.exclude(hierarchy_path__in=paths)
+        return qs
+
+    def ancestors(self, *zonings, include_self=False):
+        """Cadastral zonings above any of ``zonings`` in the hierarchy, from the top one down
+
+        Args:
+            zonings: Cadastral zonings, as instances or primary keys
+            include_self (bool, optional): Include ``zonings`` themselves. Defaults to False.
+
+        Returns:
+            QuerySet: Zonings of this queryset above ``zonings``
+        """
+        pks = set()
+        for path in self.get_hierarchy_paths(zonings):
+            path = path.strip("/").split("/")
+            pks.update(int(pk) for pk in (path if include_self else path[:-1]))
+        return self.filter(pk__in=pks).order_by(Length("hierarchy_path"), "pk")
+
+    def parcels_within(self, *zonings):
+        """Cadastral parcels of ``zonings`` and of the zonings below them, at any level
+
+        Returns:
+            QuerySet: :class:`~inspire_eu.models.cadastral_parcels.CadastralParcel`
+        """
+        model = apps.get_model(self.model._meta.app_label, "CadastralParcel")
+        paths = self.get_hierarchy_paths(zonings)
+        if not paths:
+            return model._default_manager.none()
+        return model._default_manager.filter(
+            functools.reduce(operator.or_, (models.Q(cadastral_zoning__hierarchy_path__startswith=p) for p in paths)),
+        )
+
+
+class CadastralZoningManager(IdentifierManager.from_queryset(CadastralZoningQuerySet)):
+    """Manager of :class:`~inspire_eu.models.cadastral_parcels.CadastralZoning`"""
+
+    # Derived from the upper level units, which are linked once the zonings are written
+    hash_exclude = IdentifierManager.hash_exclude + ("hierarchy_path",)
+
+    def move_hierarchy(self, zoning, path):
+        """Set the ``hierarchy_path`` of a zoning and move the zonings below it along, with one query
+
+        Returns:
+            int: Number of zonings updated
+        """
+        old = self.filter(pk=zoning.pk).values_list("hierarchy_path", flat=True).first()
+        zoning.hierarchy_path = path
+        if old == path:
+            return 0
+        if not old:
+            return self.filter(pk=zoning.pk).update(hierarchy_path=path)
+        return self.filter(hierarchy_path__startswith=old).update(
+            hierarchy_path=Concat(
+                models.Value(path),
+                Substr("hierarchy_path", len(old) + 1),
+                output_field=models.CharField(),
+            ),
+        )
+
+    def rebuild_hierarchy(self, batch_size=None):
+        """Compute again ``hierarchy_path`` of every zoning from ``upper_level_unit``
+
+        Needed after writing zonings in bulk, as ``bulk_create`` and ``bulk_update`` skip ``save``. Only the
+        paths that changed are written. Zonings in a cycle of upper level units are logged and placed at the top.
+
+        Returns:
+            int: Number of zonings updated
+        """
+        parents = dict()
+        stored = dict()
+        for pk, upper_level_unit_id, path in self.values_list("pk", "upper_level_unit_id", "hierarchy_path"):
+            parents[pk] = upper_level_unit_id
+            stored[pk] = path
+        paths = dict()
+        for pk in parents:
+            chain = list()
+            seen = set()
+            while pk is not None and pk not in paths:
+                if pk in seen:
+                    log.warning(f"CadastralZoning {pk}: cycle of upper level units")
+                    chain = chain[:chain.index(pk) + 1]
+                    pk = None
+                    break
+                seen.add(pk)
+                chain.append(pk)
+                pk = parents[pk]
+            path = paths[pk] if pk is not None else "/"
+            for node in reversed(chain):
+                path = paths[node] = f"{path}{node}/"
+        updates = [self.model(pk=pk, hierarchy_path=path) for pk, path in paths.items() if stored[pk] != path]
+        self.bulk_update(updates, ["hierarchy_path"], batch_size=batch_size or self.batch_size)
+        return len(updates)
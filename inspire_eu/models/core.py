@@ -1,6 +1,9 @@
+import functools
 import logging
 
 from django.contrib.gis.db import models
+from django.db import transaction
+from django.utils.translation import get_language
 try:
     from django.utils.translation import gettext_lazy as _
 except ImportError:
@@ -11,6 +14,7 @@ except ImportError:
     from django.utils.text import slugify
 
 from ..utils import get_inspire_eu_base_model
+from .cache import code_list_value_cache
 
 log = logging.getLogger(__name__)
 
@@ -39,6 +43,27 @@ except AttributeError:
             abstract = True
 
 
+class RegistryTranslationMixin:
+    """Access to the translations loaded by ``load_initial_inspire`` (see :mod:`inspire_eu.models.translation`)"""
+
+    def get_translation(self, language=None):
+        """Translated label, definition and description
+
+        Works on top of ``prefetch_related("translations")`` without any extra query.
+
+        Args:
+            language (str, optional): Language code. Defaults to the active language.
+
+        Returns:
+            Translation row, or the object itself when there is no translation for that language
+        """
+        language = (language or get_language() or "en").split("-")[0]
+        for translation in self.translations.all():
+            if translation.language == language:
+                return translation
+        return self
+
+
 class Namespace(BaseInspireEUModel):
     """Namespace
 
@@ -98,7 +123,7 @@ class Status(BaseInspireEUModel):
         return super().save(*args, **kwargs)
 
 
-class Theme(BaseInspireEUModel):
+class Theme(RegistryTranslationMixin, BaseInspireEUModel):
     """INSPIRE theme register
 
     Definition
@@ -155,7 +180,7 @@ class Theme(BaseInspireEUModel):
         return super().save(*args, **kwargs)
 
 
-class ApplicationSchema(BaseInspireEUModel):
+class ApplicationSchema(RegistryTranslationMixin, BaseInspireEUModel):
     """INSPIRE Application schema register
 
     Definition
@@ -210,7 +235,7 @@ class ApplicationSchema(BaseInspireEUModel):
         return super().save(*args, **kwargs)
 
 
-class CodeList(BaseInspireEUModel):
+class CodeList(RegistryTranslationMixin, BaseInspireEUModel):
     """INSPIRE Code List Register
 
     Definition
@@ -267,11 +292,102 @@ class CodeList(BaseInspireEUModel):
         self.link = self.link.replace("http://", "https://")
         if not self.code:
             self.code = self.link.split("/")[-1]
-        self.slug = slugify(self.code)[:64]
+        self.slug = get_code_list_slug(self.code)
         return super().save(*args, **kwargs)
 
 
-class CodeListValue(BaseInspireEUModel):
+def get_code_list_slug(code):
+    """Slug of a code list code, as stored at ``CodeList.slug``"""
+    return slugify(code)[:64]
+
+
+def get_code_list_value_slug(code):
+    """Slug of a code list value code, as stored at ``CodeListValue.slug``
+
+    Every lookup by slug must go through it, as codes longer than the column are cut when stored.
+    """
+    return slugify(code)[:96]
+
+
+class CodeListValueManager(models.Manager):
+    batch_size = 500
+
+    def resolve_many(self, pairs, create=False):
+        """Resolve many code list values at once
+
+        Lookups are served from :data:`~inspire_eu.models.cache.code_list_value_cache` when possible, the rest
+        with one ``IN`` query per code list.
+
+        Args:
+            pairs (iterable): ``(code_list, code)`` tuples, as ``("CurrentUseValue", "residential")``. The code
+                may also be the link of the value.
+            create (bool, optional): Create the missing values with one bulk query per code list. Defaults to False.
+
+        Raises:
+            CodeList.DoesNotExist: When ``create`` is true and a code list does not exist
+
+        Returns:
+            dict: Primary key of every pair found, or created, keyed by the pair as given
+        """
+        result = dict()
+        pending = dict()
+        for pair in set(pairs):
+            code_list_slug, code = get_code_list_slug(pair[0]), pair[1].split("/")[-1]
+            slug = get_code_list_value_slug(code)
+            clv = code_list_value_cache.get(code_list_slug, slug)
+            if clv is not None:
+                result[pair] = clv.pk
+                continue
+            pending.setdefault(code_list_slug, dict()).setdefault(slug, [code, []])[1].append(pair)
+
+        status = None
+        for code_list_slug, codes in pending.items():
+            pks = self.get_pks(code_list_slug, list(codes))
+            missing = [slug for slug in codes if slug not in pks]
+            if missing and create:
+                try:
+                    code_list = CodeList.objects.get(slug=code_list_slug)
+                except CodeList.DoesNotExist:
+                    msg = _(f"There is no CodeList with code '{code_list_slug}'")
+                    raise CodeList.DoesNotExist(msg)
+                if status is None:
+                    status = Status.objects.get(slug="valid")
+                self.bulk_create(
+                    [
+                        CodeListValue(
+                            code_list=code_list,
+                            code=codes[slug][0],
+                            slug=slug,
+                            label=codes[slug][0],
+                            definition=codes[slug][0],
+                            description=_("Created ad-hoc"),
+                            status=status,
+                        )
+                        for slug in missing
+                    ],
+                    batch_size=self.batch_size,
+                )
+                log.warning(_(f"Created {len(missing)} new CodeListValue at '{code_list_slug}'"))
+                pks.update(self.get_pks(code_list_slug, missing))
+            for slug, (code, slug_pairs) in codes.items():
+                if slug in pks:
+                    for pair in slug_pairs:
+                        result[pair] = pks[slug]
+        return result
+
+    def get_pks(self, code_list_slug, slugs):
+        pks = dict()
+        for i in range(0, len(slugs), self.batch_size):
+            pks.update(
+                self.filter(code_list__slug=code_list_slug, slug__in=slugs[i:i + self.batch_size]).values_list(
+                    "slug",
+                    "pk",
+                ),
+            )
+        return pks
+
+
+class CodeListValue(RegistryTranslationMixin, BaseInspireEUModel):
     code_list = models.ForeignKey(CodeList, on_delete=models.PROTECT)
     code = models.CharField(max_length=96, db_index=True)
     slug = models.CharField(max_length=96, blank=True, db_index=True)
@@ -280,6 +396,9 @@ class CodeListValue(BaseInspireEUModel):
     label = models.CharField(max_length=200)
     definition = models.TextField(blank=True)
     description = models.TextField(blank=True)
+    parent = models.ForeignKey("self", blank=True, null=True, on_delete=models.PROTECT)
+
+    objects = CodeListValueManager()
 
     class Meta:
         verbose_name = _("Code list value")
@@ -294,13 +413,15 @@ class CodeListValue(BaseInspireEUModel):
             self.link = self.link.replace("http://", "https://")
         if not self.code:
             self.code = self.link.split("/")[-1]
-        self.slug = slugify(self.code)[:96]
+        self.slug = get_code_list_value_slug(self.code)
         return super().save(*args, **kwargs)
 
     @classmethod
     def search(cls, slug, code_list_slug=None, create=True):
         """Search CodeListValue
 
+        Lookups are served from :data:`~inspire_eu.models.cache.code_list_value_cache` when possible.
+
         Args:
             slug (str): Slug of CodeList
             code_list_slug (str, optional): Slug of CodeList foreign key. Defaults to None.
@@ -319,12 +440,15 @@ class CodeListValue(BaseInspireEUModel):
             code_list_slug = slug_list[-2]
         kw = dict(
             {
-                "code_list__slug": slugify(code_list_slug),
-                "slug": slugify(slug_list[-1]),
+                "code_list__slug": get_code_list_slug(code_list_slug),
+                "slug": get_code_list_value_slug(slug_list[-1]),
             },
         )
+        clv = code_list_value_cache.get(kw["code_list__slug"], kw["slug"])
+        if clv is not None:
+            return clv
         try:
-            clv = CodeListValue.objects.get(**kw)
+            clv = CodeListValue.objects.select_related("code_list").get(**kw)
         except CodeListValue.DoesNotExist:
             if create:
                 kw_new = dict(
@@ -346,9 +470,13 @@ class CodeListValue(BaseInspireEUModel):
                 clv = CodeListValue.objects.create(**kw_new)
                 msg = _(f"Created new CodeListValue: '{slug}' at '{code_list_slug}'")
                 log.warning(msg)
+                # Cached once committed: a rollback would leave every process resolving to a missing row
+                transaction.on_commit(functools.partial(code_list_value_cache.set, clv))
+                return clv
             else:
                 msg = _(f"There is no CodeListValue '{slug}' at '{code_list_slug}'")
                 raise CodeListValue.DoesNotExist(msg)
+        code_list_value_cache.set(clv)
         return clv
 
 
@@ -0,0 +1,113 @@
+import logging
+
+from django.contrib.gis.db import models
+try:
+    from django.utils.translation import gettext_lazy as _
+except ImportError:
+    from django.utils.translation import ugettext_lazy as _
+
+from .core import BaseInspireEUModel, CodeList
+
+log = logging.getLogger(__name__)
+
+
+###############################################################################
+#              ____            _     _                                        #
+#             |  _ \ ___  __ _(_)___| |_ _ __ _   _                           #
+#             | |_) / _ \/ _` | / __| __| '__| | | |                          #
+#             |  _ <  __/ (_| | \__ \ |_| |  | |_| |                          #
+#             |_| \_\___|\__, |_|___/\__|_|   \__, |                          #
+#                        |___/                |___/                           #
+#                                                                             #
+###############################################################################
+
+
+class RegistrySyncState(BaseInspireEUModel):
+    """Registry Sync State
+
+    Definition
+        Last successful synchronisation of a code list, per language, with the INSPIRE registry.
+
+    Description
+        Used by ``load_initial_inspire`` to skip the code lists that have not changed since the last sync:
+        either because its Atom feed entry has the same ``updated`` date (``--incremental``), or because the
+        downloaded payload has the same hash.
+    """
+
+    code_list = models.ForeignKey(CodeList, on_delete=models.CASCADE)
+    language = models.CharField(max_length=8)
+    payload_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text=_("Hash of the last payload successfully synchronised"),
+    )
+    feed_updated = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text=_("Date of the code list entry at the registry Atom feed when it was synchronised"),
+    )
+    synced_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text=_("Date of the last successful synchronisation"),
+    )
+
+    class Meta:
+        verbose_name = _("Registry sync state")
+        verbose_name_plural = _("Registry sync states")
+        ordering = ["code_list__code", "language"]
+        unique_together = ["code_list", "language"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.code_list.code, self.language, self.synced_at)
+
+
+class RegistrySyncRun(BaseInspireEUModel):
+    """Registry Sync Run
+
+    Definition
+        One execution of ``load_initial_inspire``.
+
+    Description
+        A run is only marked as finished when every code list has been processed without errors. Until then,
+        ``load_initial_inspire --resume`` continues it, skipping the code lists already recorded as
+        :class:`RegistrySyncCheckpoint`.
+    """
+
+    languages = models.CharField(max_length=200, help_text=_("Comma separated list of languages"))
+    stage = models.CharField(max_length=32, blank=True, help_text=_("Last stage completed"))
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = _("Registry sync run")
+        verbose_name_plural = _("Registry sync runs")
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.started_at, self.languages, self.stage)
+
+
+class RegistrySyncCheckpoint(BaseInspireEUModel):
+    """Registry Sync Checkpoint
+
+    Definition
+        Code list completely processed by a :class:`RegistrySyncRun`.
+
+    Description
+        Written in the same transaction as the values of the code list, so a code list is either fully
+        synchronised and checkpointed, or neither.
+    """
+
+    run = models.ForeignKey(RegistrySyncRun, on_delete=models.CASCADE, related_name="checkpoints")
+    code_list = models.ForeignKey(CodeList, on_delete=models.CASCADE)
+    completed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Registry sync checkpoint")
+        verbose_name_plural = _("Registry sync checkpoints")
+        ordering = ["run", "completed_at"]
+        unique_together = ["run", "code_list"]
+
+    def __str__(self):
+        return "%s: %s" % (self.run_id, self.code_list.code)
@@ -0,0 +1,95 @@
+import logging
+
+from django.contrib.gis.db import models
+try:
+    from django.utils.translation import gettext_lazy as _
+except ImportError:
+    from django.utils.translation import ugettext_lazy as _
+
+from .core import ApplicationSchema, BaseInspireEUModel, CodeList, CodeListValue, Theme
+
+log = logging.getLogger(__name__)
+
+
+###############################################################################
+#     _____                    _       _   _                                  #
+#    |_   _| __ __ _ _ __  ___| | __ _| |_(_) ___  _ __  ___                  #
+#      | || '__/ _` | '_ \/ __| |/ _` | __| |/ _ \| '_ \/ __|                 #
+#      | || | | (_| | | | \__ \ | (_| | |_| | (_) | | | \__ \                 #
+#      |_||_|  \__,_|_| |_|___/_|\__,_|\__|_|\___/|_| |_|___/                 #
+#                                                                             #
+###############################################################################
+
+
+class AbstractRegistryTranslation(models.Model):
+    """Registry Translation
+
+    Definition
+        Label, definition and description of a registry item in one of the languages published by the
+        INSPIRE registry.
+
+    Description
+        The columns of the translated model keep the values of the main language loaded by
+        ``load_initial_inspire`` (the first one given), while every loaded language, main one included, is
+        stored as a translation row.
+    """
+
+    language = models.CharField(max_length=8, db_index=True)
+    label = models.CharField(max_length=200)
+    definition = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class ThemeTranslation(BaseInspireEUModel, AbstractRegistryTranslation):
+    theme = models.ForeignKey(Theme, on_delete=models.CASCADE, related_name="translations")
+
+    class Meta:
+        verbose_name = _("Theme translation")
+        verbose_name_plural = _("Theme translations")
+        ordering = ["theme", "language"]
+        unique_together = ["theme", "language"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.theme.code, self.language, self.label)
+
+
+class ApplicationSchemaTranslation(BaseInspireEUModel, AbstractRegistryTranslation):
+    application_schema = models.ForeignKey(ApplicationSchema, on_delete=models.CASCADE, related_name="translations")
+
+    class Meta:
+        verbose_name = _("Application Schema translation")
+        verbose_name_plural = _("Application Schema translations")
+        ordering = ["application_schema", "language"]
+        unique_together = ["application_schema", "language"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.application_schema.code, self.language, self.label)
+
+
+class CodeListTranslation(BaseInspireEUModel, AbstractRegistryTranslation):
+    code_list = models.ForeignKey(CodeList, on_delete=models.CASCADE, related_name="translations")
+
+    class Meta:
+        verbose_name = _("Code list translation")
+        verbose_name_plural = _("Code list translations")
+        ordering = ["code_list", "language"]
+        unique_together = ["code_list", "language"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.code_list.code, self.language, self.label)
+
+
+class CodeListValueTranslation(BaseInspireEUModel, AbstractRegistryTranslation):
+    code_list_value = models.ForeignKey(CodeListValue, on_delete=models.CASCADE, related_name="translations")
+
+    class Meta:
+        verbose_name = _("Code list value translation")
+        verbose_name_plural = _("Code list value translations")
+        ordering = ["code_list_value", "language"]
+        unique_together = ["code_list_value", "language"]
+
+    def __str__(self):
+        return "%s (%s): %s" % (self.code_list_value.code, self.language, self.label)
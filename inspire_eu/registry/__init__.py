@@ -0,0 +1,16 @@
+"""Helpers used to synchronise the local models with the INSPIRE registry (https://inspire.ec.europa.eu)"""
+import logging
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_REGISTRY_CACHE_DIR = settings.INSPIRE_EU_REGISTRY_CACHE_DIR
+except AttributeError:
+    INSPIRE_EU_REGISTRY_CACHE_DIR = None
+
+
+from .cache import RegistryCache  # noqa
+from .fetch import HostRateLimiter, RegistryFetcher, RegistryResponse  # noqa
+from .snapshot import SnapshotFetcher, SnapshotWriter  # noqa
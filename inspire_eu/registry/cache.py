@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+log = logging.getLogger(__name__)
+
+
+class RegistryCache:
+    """Registry Cache
+
+    Definition
+        Persistent cache of the documents downloaded from the INSPIRE registry.
+
+    Description
+        Each url is stored as two files named after the sha256 of the url: ``<hash>.body`` with the payload as
+        received and ``<hash>.json`` with its metadata:
+
+            * ``etag`` and ``last_modified``: validators sent back by the server, used to build conditional
+              requests (``If-None-Match`` / ``If-Modified-Since``)
+            * ``sha256``: hash of the payload
+
+        Files are written to a temporary file and moved into place, so a cache shared by several threads or
+        interrupted in the middle of a write is never left with half written entries.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, url, extension):
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.{extension}")
+
+    def write(self, path, data):
+        """Atomic write of ``data``: bytes or a binary file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_metadata(self, url):
+        try:
+            with open(self.get_path(url, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def set_metadata(self, url, metadata):
+        self.write(self.get_path(url, "json"), json.dumps(metadata).encode("utf-8"))
+
+    def open_body(self, url):
+        try:
+            return open(self.get_path(url, "body"), "rb")
+        except OSError:
+            return None
+
+    def get_conditional_headers(self, url):
+        metadata = self.get_metadata(url)
+        headers = dict()
+        if not os.path.exists(self.get_path(url, "body")):
+            return headers
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def store(self, url, content, headers, sha256=None):
+        """Store a payload (bytes or binary file) and the validators sent with it"""
+        metadata = self.get_metadata(url)
+        if sha256 is None:
+            sha256 = hashlib.sha256(content).hexdigest()
+        self.write(self.get_path(url, "body"), content)
+        metadata.update(
+            {
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "sha256": sha256,
+            },
+        )
+        self.set_metadata(url, metadata)
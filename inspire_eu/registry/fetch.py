@@ -0,0 +1,311 @@
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+log = logging.getLogger(__name__)
+
+# Bodies bigger than this are spooled to a temporary file instead of being kept in memory
+SPOOL_MAX_SIZE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class HostRateLimiter:
+    """Per host rate limiter
+
+    Definition
+        Spaces out the requests sent to the same host so that no more than ``rate`` requests per second are
+        started against it, whatever the number of threads sharing the limiter.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot = dict()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RegistryResponse:
+    """Registry Response
+
+    Definition
+        Document downloaded from the registry, or read back from the cache when the server answered that it was
+        not modified.
+
+    Description
+        The payload is either kept in memory (``content``) or, for documents streamed from the network or the
+        cache, in a binary file (``body``) that is only read on demand. :meth:`iter_items` parses it
+        incrementally when `ijson <https://github.com/ICRAR/ijson>`_ is installed, so big code lists are never
+        fully loaded in memory.
+    """
+
+    def __init__(self, url, status_code, content=None, headers=None, from_cache=False, body=None, sha256=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.from_cache = from_cache
+        self.body = body
+        self._content = content
+        self._sha256 = sha256
+
+    def __repr__(self):
+        return f"<RegistryResponse [{self.status_code}] {self.url}>"
+
+    @property
+    def content(self):
+        if self._content is None:
+            if self.body is None:
+                return b""
+            with self.open() as f:
+                return f.read()
+        return self._content
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            h = hashlib.sha256()
+            with self.open() as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+            self._sha256 = h.hexdigest()
+        return self._sha256
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def open(self):
+        """Binary file with the payload, positioned at its beginning. Closing it leaves the body open"""
+        if self.body is None:
+            return io.BytesIO(self._content or b"")
+        self.body.seek(0)
+        return _Unclosable(self.body)
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+            self.body = None
+
+    def json(self):
+        with self.open() as f:
+            return json.load(f)
+
+    def iter_items(self, *path):
+        """Items of the array found at ``path``, one at a time
+
+        For instance ``iter_items("codelist", "containeditems")`` yields every value of a code list document.
+        Without ijson the whole document is parsed first. Missing keys yield nothing.
+        """
+        with self.open() as f:
+            if ijson is not None:
+                yield from ijson.items(f, ".".join(path + ("item",)), use_float=True)
+                return
+            data = json.load(f)
+        for key in path:
+            try:
+                data = data[key]
+            except (KeyError, TypeError):
+                return
+        yield from data
+
+
+class _Unclosable(io.BufferedIOBase):
+    """Read only proxy of a file that is not closed with the ``with`` block"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._f.read(size)
+
+    def read1(self, size=-1):
+        return self._f.read(size)
+
+    def readinto(self, b):
+        return self._f.readinto(b)
+
+
+class RegistryFetcher:
+    """Registry Fetcher
+
+    Definition
+        Downloads documents from the INSPIRE registry using a bounded pool of threads.
+
+    Description
+        Only network I/O happens inside the worker threads: responses are handed back to the caller, which keeps
+        doing all the parsing and database work in its own thread.
+
+        Failed requests (connection errors, timeouts and ``RETRY_STATUS`` responses) are retried ``retries``
+        times, waiting ``backoff * 2 ** attempt`` seconds between attempts (or ``Retry-After`` when the server
+        sends it).
+
+        When a ``cache`` is given, requests are sent with the validators of the cached copy and a
+        ``304 Not Modified`` answer is served from the cache.
+
+        When a ``snapshot`` (:class:`~inspire_eu.registry.snapshot.SnapshotWriter`) is given, every response is
+        also recorded into it.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, concurrency=8, rate=10, retries=3, backoff=0.5, timeout=60, cache=None, snapshot=None):
+        self.cache = cache
+        self.snapshot = snapshot
+        self.concurrency = max(1, concurrency or 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate)
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session is not guaranteed to be thread safe: one per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=self.concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def get_retry_delay(self, attempt, response=None):
+        if response is not None:
+            try:
+                return float(response.headers["Retry-After"])
+            except (KeyError, TypeError, ValueError):
+                pass
+        return self.backoff * 2 ** attempt
+
+    def get(self, url):
+        """Fetch one url
+
+        Args:
+            url (str): Url to fetch
+
+        Raises:
+            requests.RequestException: When the request is still failing after all retries
+
+        Returns:
+            RegistryResponse: Last response received
+        """
+        response = self.get_response(url)
+        if self.snapshot:
+            self.snapshot.add(response)
+        return response
+
+    def get_response(self, url):
+        headers = self.cache.get_conditional_headers(url) if self.cache else dict()
+        response = self.request(url, headers=headers, stream=True)
+        if self.cache and response.status_code == 304:
+            response.close()
+            body = self.cache.open_body(url)
+            if body is not None:
+                return RegistryResponse(url, 200, headers=response.headers, from_cache=True, body=body)
+            # Cached body vanished meanwhile: fetch it again without validators
+            response = self.request(url, stream=True)
+        body, sha256 = self.spool(response)
+        registry_response = RegistryResponse(url, response.status_code, headers=response.headers, body=body,
+                                             sha256=sha256)
+        if self.cache and response.status_code == 200:
+            self.cache.store(url, registry_response.open(), response.headers, sha256=sha256)
+        return registry_response
+
+    def spool(self, response):
+        """Download the body of a streamed response into a spooled temporary file, hashing it on the way"""
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        h = hashlib.sha256()
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                h.update(chunk)
+                body.write(chunk)
+        except BaseException:
+            body.close()
+            raise
+        finally:
+            response.close()
+        return body, h.hexdigest()
+
+    def request(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(url)
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries:
+                    raise
+                delay = self.get_retry_delay(attempt)
+                log.warning(f"{url}: {e}. Retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in self.RETRY_STATUS or attempt >= self.retries:
+                    return response
+                delay = self.get_retry_delay(attempt, response)
+                response.close()
+                log.warning(f"{url}: HTTP {response.status_code}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def fetch_many(self, urls):
+        """Fetch several urls concurrently
+
+        At most ``2 * concurrency`` downloads are pending at the same time, so the memory used by responses that
+        have not been consumed yet stays bounded.
+
+        Args:
+            urls (iterable): Urls to fetch
+
+        Yields:
+            tuple: ``(url, response)`` in completion order. ``response`` is None when the url could not be fetched.
+        """
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = dict()
+
+            def submit_next():
+                url = next(urls, None)
+                if url is not None:
+                    pending[executor.submit(self.get, url)] = url
+                return url is not None
+
+            while len(pending) < 2 * self.concurrency and submit_next():
+                pass
+            while pending:
+                done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    try:
+                        response = future.result()
+                    except requests.RequestException as e:
+                        log.error(f"{url}: {e}")
+                        response = None
+                    submit_next()
+                    yield url, response
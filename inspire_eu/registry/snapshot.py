@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import zipfile
+
+from .fetch import SPOOL_MAX_SIZE, RegistryResponse
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class SnapshotWriter:
+    """Snapshot Writer
+
+    Definition
+        Records every document fetched from the registry into a single compressed (zip) archive, so that the
+        same sync can be replayed later without network by :class:`SnapshotFetcher`.
+
+    Description
+        Payloads are stored as ``payloads/<sha256 of the url>`` and ``manifest.json`` maps every url to its
+        member name and HTTP status, 404 answers included.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.manifest = dict()
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, response):
+        name = "payloads/" + hashlib.sha256(response.url.encode("utf-8")).hexdigest()
+        with self._lock:
+            if response.url in self.manifest:
+                return
+            with self._zip.open(name, "w") as member, response.open() as body:
+                shutil.copyfileobj(body, member)
+            self.manifest[response.url] = {
+                "member": name,
+                "status_code": response.status_code,
+            }
+
+    def close(self):
+        if self._zip is None:
+            return
+        with self._lock:
+            self._zip.writestr(MANIFEST_NAME, json.dumps(self.manifest, indent=2))
+            self._zip.close()
+            self._zip = None
+
+
+class SnapshotFetcher:
+    """Snapshot Fetcher
+
+    Definition
+        Drop-in replacement of :class:`~inspire_eu.registry.fetch.RegistryFetcher` that serves the documents
+        from an archive written by :class:`SnapshotWriter`, without any network access.
+
+    Description
+        Urls missing from the snapshot are answered with a 404 response, as the registry would do.
+    """
+
+    cache = None
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(path, "r")
+        self.manifest = json.loads(self._zip.read(MANIFEST_NAME))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, url):
+        try:
+            entry = self.manifest[url]
+        except KeyError:
+            log.warning(f"{url}: not found at snapshot {self.path}")
+            return RegistryResponse(url, 404, b"")
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        with self._lock, self._zip.open(entry["member"]) as member:
+            shutil.copyfileobj(member, body)
+        return RegistryResponse(url, entry["status_code"], body=body)
+
+    def fetch_many(self, urls):
+        for url in urls:
+            yield url, self.get(url)
+
+    def close(self):
+        self._zip.close()
@@ -0,0 +1,11 @@
+"""Mapbox Vector Tiles of the theme models
+
+Layers (see :func:`~inspire_eu.tiles.layers.get_tile_layers`) are served at ``tiles/<layer>/<z>/<x>/<y>.pbf``.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+from .cache import FileSystemTileCache, SQLiteTileCache, TileCache, get_cached_tile, get_tile_cache  # noqa
+from .layers import TileLayer, get_tile_layers, is_valid_tile, tile_bounds, tile_range  # noqa
+from .mvt import LayerEncoder, encode_tile  # noqa
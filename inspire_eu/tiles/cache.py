@@ -0,0 +1,270 @@
+import abc
+import functools
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .layers import get_model_tile_layers, get_tile_layers, tile_range, to_web_mercator
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_TILES_CACHE = settings.INSPIRE_EU_TILES_CACHE
+except AttributeError:
+    INSPIRE_EU_TILES_CACHE = None
+
+try:
+    INSPIRE_EU_TILES_CACHE_MAX_ZOOM = settings.INSPIRE_EU_TILES_CACHE_MAX_ZOOM
+except AttributeError:
+    INSPIRE_EU_TILES_CACHE_MAX_ZOOM = 18
+
+
+class TileCache(abc.ABC):
+    """Tile Cache
+
+    Definition
+        Persistent store of encoded vector tiles, keyed by layer, zoom level, column and row (XYZ grid).
+
+    Description
+        Tiles without features are stored as well, as empty values, for them not to be built again. Tiles
+        dropped by :meth:`invalidate` (the dirty ones) are built again on their next request or by
+        ``seed_tiles``.
+    """
+
+    @abc.abstractmethod
+    def get(self, layer, z, x, y):
+        """Encoded tile, or None when it is not cached"""
+
+    @abc.abstractmethod
+    def set(self, layer, z, x, y, data):
+        """Store an encoded tile, replacing the cached one"""
+
+    @abc.abstractmethod
+    def delete_range(self, layer, z, xmin, ymin, xmax, ymax):
+        """Drop the tiles of a zoom level whose column and row are within the given ones"""
+
+    @abc.abstractmethod
+    def clear(self, layer=None):
+        """Drop every tile of a layer, or of all of them"""
+
+    def invalidate(self, tile_layer, bounds, max_zoom=INSPIRE_EU_TILES_CACHE_MAX_ZOOM):
+        """Drop the tiles of a layer touching Web Mercator ``bounds`` (including their buffer), at every zoom"""
+        for z in range(tile_layer.min_zoom, min(tile_layer.max_zoom, max_zoom) + 1):
+            self.delete_range(tile_layer.name, z, *tile_range(bounds, z, tile_layer.buffer / tile_layer.extent))
+
+
+class FileSystemTileCache(TileCache):
+    """Tiles stored as ``<path>/<layer>/<z>/<x>/<y>.pbf``, written atomically"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, layer, z, x, y):
+        return os.path.join(self.path, layer, str(z), str(x), f"{y}.pbf")
+
+    def get(self, layer, z, x, y):
+        try:
+            with open(self.get_path(layer, z, x, y), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, layer, z, x, y, data):
+        path = self.get_path(layer, z, x, y)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete_range(self, layer, z, xmin, ymin, xmax, ymax):
+        directory = os.path.join(self.path, layer, str(z))
+        try:
+            columns = [name for name in os.listdir(directory) if name.isdigit() and xmin <= int(name) <= xmax]
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for column in columns:
+            column_directory = os.path.join(directory, column)
+            for name in os.listdir(column_directory):
+                row, ext = os.path.splitext(name)
+                if ext == ".pbf" and row.isdigit() and ymin <= int(row) <= ymax:
+                    try:
+                        os.unlink(os.path.join(column_directory, name))
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+        return deleted
+
+    def clear(self, layer=None):
+        shutil.rmtree(os.path.join(self.path, layer) if layer else self.path, ignore_errors=True)
+
+
+class SQLiteTileCache(TileCache):
+    """Tiles of every layer stored in a single SQLite file
+
+    It is not an MBTiles file, which holds a single tileset: its ``tiles`` table has the columns of the MBTiles
+    one (rows in TMS order, counted from the bottom) plus ``layer``, part of the primary key, and tiles are not
+    compressed. Every process and thread opens its own connection and the database is in WAL mode, so tiles
+    can be read while the seeding workers write them.
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            # Connections must not be shared with forked processes
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tiles (layer TEXT NOT NULL, zoom_level INTEGER NOT NULL, "
+                "tile_column INTEGER NOT NULL, tile_row INTEGER NOT NULL, tile_data BLOB NOT NULL, "
+                "PRIMARY KEY (layer, zoom_level, tile_column, tile_row))",
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("INSERT OR IGNORE INTO metadata (name, value) VALUES ('format', 'pbf')")
+            self._local.pid = pid
+            self._local.connection = connection
+        return self._local.connection
+
+    def get(self, layer, z, x, y):
+        row = self.connection.execute(
+            "SELECT tile_data FROM tiles WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (layer, z, x, 2 ** z - 1 - y),
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, layer, z, x, y, data):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO tiles (layer, zoom_level, tile_column, tile_row, tile_data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (layer, z, x, 2 ** z - 1 - y, sqlite3.Binary(data)),
+        )
+
+    def delete_range(self, layer, z, xmin, ymin, xmax, ymax):
+        cursor = self.connection.execute(
+            "DELETE FROM tiles WHERE layer = ? AND zoom_level = ? AND tile_column BETWEEN ? AND ? "
+            "AND tile_row BETWEEN ? AND ?",
+            (layer, z, xmin, xmax, 2 ** z - 1 - ymax, 2 ** z - 1 - ymin),
+        )
+        return cursor.rowcount
+
+    def clear(self, layer=None):
+        if layer:
+            self.connection.execute("DELETE FROM tiles WHERE layer = ?", (layer,))
+        else:
+            self.connection.execute("DELETE FROM tiles")
+
+
+@functools.lru_cache(maxsize=None)
+def get_tile_cache():
+    """Tile cache of ``INSPIRE_EU_TILES_CACHE``: a ``.sqlite`` file or a directory. None when it is not set"""
+    if not INSPIRE_EU_TILES_CACHE:
+        return None
+    if str(INSPIRE_EU_TILES_CACHE).endswith((".sqlite", ".sqlite3")):
+        return SQLiteTileCache(INSPIRE_EU_TILES_CACHE)
+    return FileSystemTileCache(INSPIRE_EU_TILES_CACHE)
+
+
+def get_cached_tile(tile_layer, z, x, y, force=False):
+    """Encoded tile from the cache, built and stored when it is missing (or with ``force``)
+
+    Tiles deeper than ``INSPIRE_EU_TILES_CACHE_MAX_ZOOM`` are always built on the fly.
+    """
+    cache = get_tile_cache()
+    if cache is None or z > INSPIRE_EU_TILES_CACHE_MAX_ZOOM:
+        return tile_layer.get_tile(z, x, y)
+    if not tile_layer.min_zoom <= z <= tile_layer.max_zoom:
+        return b""
+    if not force:
+        data = cache.get(tile_layer.name, z, x, y)
+        if data is not None:
+            return data
+    data = tile_layer.get_tile(z, x, y)
+    cache.set(tile_layer.name, z, x, y, data)
+    return data
+
+
+def invalidate_tiles(model, extent, srid):
+    """Drop the cached tiles of every layer of a model touching an extent ``(xmin, ymin, xmax, ymax)``"""
+    cache = get_tile_cache()
+    if cache is None or extent is None:
+        return
+    bounds = to_web_mercator(extent, srid)
+    for tile_layer in get_model_tile_layers(model):
+        cache.invalidate(tile_layer, bounds)
+
+
+def seed_tiles(layer, tiles, force=False):
+    """Build and store tiles of a layer, skipping the cached ones unless ``force``
+
+    Args:
+        layer (str): Name of the layer
+        tiles (list): ``(z, x, y)`` of the tiles
+
+    Returns:
+        dict: Number of tiles ``built``, ``empty`` (built without features) and ``cached`` (skipped)
+    """
+    cache = get_tile_cache()
+    tile_layer = get_tile_layers()[layer]
+    stats = dict({"built": 0, "empty": 0, "cached": 0})
+    for z, x, y in tiles:
+        if not force and cache.get(layer, z, x, y) is not None:
+            stats["cached"] += 1
+            continue
+        data = tile_layer.get_tile(z, x, y)
+        cache.set(layer, z, x, y, data)
+        stats["built"] += 1
+        if not data:
+            stats["empty"] += 1
+    return stats
+
+
+# Signals #####################################################################
+
+
+def get_geometry_extents(model, instance):
+    """Extents of the geometries of an instance used by the tile layers of its model"""
+    extents = list()
+    for tile_layer in get_model_tile_layers(model):
+        geometry = getattr(instance, tile_layer.geometry_field, None)
+        if geometry is not None and not geometry.empty:
+            extents.append((geometry.extent, geometry.srid))
+    return extents
+
+
+def tiled_model_pre_save(sender, instance, raw=False, **kwargs):
+    """Remember where the instance was, as the tiles there must be dropped as well"""
+    if raw or instance.pk is None:
+        return
+    fields = {tile_layer.geometry_field for tile_layer in get_model_tile_layers(sender)}
+    old = sender._default_manager.filter(pk=instance.pk).only(*fields).first()
+    instance._inspire_eu_tile_extents = get_geometry_extents(sender, old) if old is not None else list()
+
+
+def tiled_model_changed(sender, instance, raw=False, **kwargs):
+    """Drop the cached tiles touching the old and the new geometries of an instance"""
+    if raw:
+        return
+    extents = getattr(instance, "_inspire_eu_tile_extents", list()) + get_geometry_extents(sender, instance)
+    instance._inspire_eu_tile_extents = list()
+    for extent, srid in extents:
+        invalidate_tiles(sender, extent, srid)
@@ -0,0 +1,238 @@
+import functools
+import logging
+import math
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import Polygon
+from django.db import connections, router
+
+from ..models import INSPIRE_EU_THEMES
+from .mvt import LayerEncoder, encode_tile
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_TILES_SIMPLIFY = settings.INSPIRE_EU_TILES_SIMPLIFY
+except AttributeError:
+    INSPIRE_EU_TILES_SIMPLIFY = 1.0
+
+WEB_MERCATOR = 3857
+# Half the side of the Web Mercator square, in meters
+WEB_MERCATOR_HALF_SIDE = math.pi * 6378137
+MAX_ZOOM = 24
+
+
+def tile_bounds(z, x, y, buffer=0):
+    """``(xmin, ymin, xmax, ymax)`` in Web Mercator of a tile of the XYZ grid, grown by ``buffer`` of its side"""
+    side = 2 * WEB_MERCATOR_HALF_SIDE / 2 ** z
+    xmin = -WEB_MERCATOR_HALF_SIDE + x * side
+    ymax = WEB_MERCATOR_HALF_SIDE - y * side
+    margin = buffer * side
+    return xmin - margin, ymax - side - margin, xmin + side + margin, ymax + margin
+
+
+def to_web_mercator(extent, srid):
+    """Web Mercator bounds of an extent ``(xmin, ymin, xmax, ymax)`` in ``srid``"""
+    polygon = Polygon.from_bbox(extent)
+    polygon.srid = srid
+    if srid != WEB_MERCATOR:
+        polygon.transform(WEB_MERCATOR)
+    return polygon.extent
+
+
+def tile_range(bounds, z, buffer=0):
+    """``(xmin, ymin, xmax, ymax)`` of the tiles of a zoom level touching Web Mercator ``bounds``, or their
+    buffer of ``buffer`` of their side"""
+    side = 2 * WEB_MERCATOR_HALF_SIDE / 2 ** z
+    margin = buffer * side
+    last = 2 ** z - 1
+    xmin, ymin, xmax, ymax = bounds
+    return (
+        min(max(math.floor((xmin - margin + WEB_MERCATOR_HALF_SIDE) / side), 0), last),
+        min(max(math.floor((WEB_MERCATOR_HALF_SIDE - ymax - margin) / side), 0), last),
+        min(max(math.floor((xmax + margin + WEB_MERCATOR_HALF_SIDE) / side), 0), last),
+        min(max(math.floor((WEB_MERCATOR_HALF_SIDE - ymin + margin) / side), 0), last),
+    )
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+class TileLayer:
+    """Tile Layer
+
+    Definition
+        Features of a model served as a layer of `Mapbox Vector Tiles
+        <https://github.com/mapbox/vector-tile-spec>`_ on the XYZ grid of Web Mercator.
+
+    Description
+        Only the primary key (feature id) and ``fields`` are encoded as properties. Geometries are simplified
+        with a tolerance of ``INSPIRE_EU_TILES_SIMPLIFY`` pixels of the tile, so the deeper the zoom the more
+        detail is kept, and clipped to the tile grown by ``buffer`` pixels. Models with generalised geometries
+        are read at the level of the zoom instead of at full resolution.
+
+        On PostGIS the tile is built by the database with ``ST_AsMVTGeom`` and ``ST_AsMVT`` (PostGIS 3.0 or
+        later); on other databases features are read with a bounding box query and encoded by
+        :mod:`inspire_eu.tiles.mvt`. Tiles out of ``min_zoom`` and ``max_zoom`` are empty.
+    """
+
+    model = None
+    geometry_field = "geometry"
+    fields = ()
+    min_zoom = 0
+    max_zoom = MAX_ZOOM
+    extent = 4096
+    buffer = 64
+
+    def __init__(self, name, model=None, fields=None, min_zoom=None, max_zoom=None, simplify=None):
+        self.name = name
+        if model is not None:
+            self.model = model
+        if fields is not None:
+            self.fields = tuple(fields)
+        if min_zoom is not None:
+            self.min_zoom = min_zoom
+        if max_zoom is not None:
+            self.max_zoom = max_zoom
+        self.simplify = INSPIRE_EU_TILES_SIMPLIFY if simplify is None else simplify
+        self._transform = None
+
+    def get_model(self):
+        if isinstance(self.model, str):
+            return apps.get_model(self.model)
+        return self.model
+
+    def get_queryset(self):
+        return self.get_model()._default_manager.all()
+
+    @property
+    def srid(self):
+        return self.get_model()._meta.get_field(self.geometry_field).srid
+
+    def get_geometry_fields(self, z):
+        """Geometry fields to read at a zoom level, the first one not empty is used: the generalised ones of the
+        level (see :class:`~inspire_eu.models.abstract.AbstractGeneralisedGeometry`), when the model has them"""
+        model = self.get_model()
+        if self.geometry_field == "geometry" and hasattr(model, "get_generalised_fields"):
+            # Vector tiles are usually drawn at 512 pixels: their pixels are the ones of 256 pixels tiles at z + 1
+            return model.get_generalised_fields(z + 1)
+        return [self.geometry_field]
+
+    def get_tolerance(self, z):
+        """Simplification tolerance at a zoom level, in meters of Web Mercator"""
+        return self.simplify * 2 * WEB_MERCATOR_HALF_SIDE / 2 ** z / self.extent
+
+    def get_tile(self, z, x, y, using=None):
+        """Vector tile of the layer
+
+        Returns:
+            bytes: Encoded tile, ``b""`` when it has no feature
+        """
+        if not self.min_zoom <= z <= self.max_zoom:
+            return b""
+        using = using or router.db_for_read(self.get_model())
+        if getattr(connections[using].ops, "postgis", False):
+            return self.get_tile_postgis(z, x, y, using)
+        return self.get_tile_python(z, x, y, using)
+
+    def get_tile_postgis(self, z, x, y, using):
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        opts = self.get_model()._meta
+        geometry = qn(opts.get_field(self.geometry_field).column)
+        columns = [qn(opts.get_field(name).column) for name in self.fields]
+        tolerance = self.get_tolerance(z)
+        expression = ", ".join(qn(opts.get_field(name).column) for name in self.get_geometry_fields(z))
+        expression = f"ST_Transform(COALESCE({expression}), {WEB_MERCATOR})"
+        if tolerance:
+            expression = f"ST_Simplify({expression}, %s, true)"
+        sql = f"""
+            SELECT ST_AsMVT(tile, %s, %s, 'mvt_geometry', %s)
+            FROM (
+                SELECT {", ".join([qn(opts.pk.column)] + columns)},
+                    ST_AsMVTGeom({expression}, ST_MakeEnvelope(%s, %s, %s, %s, {WEB_MERCATOR}), %s, %s, true)
+                    AS mvt_geometry
+                FROM {qn(opts.db_table)}
+                WHERE {geometry} && ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, {WEB_MERCATOR}), {self.srid})
+            ) AS tile
+            WHERE mvt_geometry IS NOT NULL
+        """
+        params = [self.name, self.extent, opts.pk.column]
+        if tolerance:
+            params.append(tolerance)
+        params.extend(tile_bounds(z, x, y))
+        params.extend([self.extent, self.buffer])
+        params.extend(tile_bounds(z, x, y, self.buffer / self.extent))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        return bytes(row[0]) if row and row[0] else b""
+
+    def get_transform(self):
+        # Building the transformation is far more expensive than applying it
+        if self._transform is None:
+            self._transform = CoordTransform(SpatialReference(self.srid), SpatialReference(WEB_MERCATOR))
+        return self._transform
+
+    def get_tile_python(self, z, x, y, using):
+        bounds = tile_bounds(z, x, y)
+        clip = Polygon.from_bbox(tile_bounds(z, x, y, self.buffer / self.extent))
+        clip.srid = WEB_MERCATOR
+        envelope = clip.transform(self.srid, clone=True)
+        transform = self.get_transform()
+        tolerance = self.get_tolerance(z)
+        layer = LayerEncoder(self.name, bounds, self.extent)
+        qs = self.get_queryset().using(using).filter(**{f"{self.geometry_field}__bboverlaps": envelope})
+        geometry_fields = self.get_geometry_fields(z)
+        for row in qs.values_list("pk", *self.fields, *geometry_fields).iterator():
+            geometry = next((g for g in row[len(self.fields) + 1:] if g is not None), None)
+            if geometry is None:
+                continue
+            geometry.transform(transform)
+            if tolerance:
+                geometry = geometry.simplify(tolerance, preserve_topology=True)
+            geometry = geometry.intersection(clip)
+            if geometry.empty:
+                continue
+            layer.add_feature(geometry, dict(zip(self.fields, row[1:len(self.fields) + 1])), id=row[0])
+        return encode_tile([layer])
+
+
+@functools.lru_cache(maxsize=None)
+def get_tile_layers():
+    """Tile layers of the enabled themes, by name"""
+    layers = list()
+    if INSPIRE_EU_THEMES.get("cadastral_parcels"):
+        layers.append(
+            TileLayer(
+                "cadastral-zonings",
+                "inspire_eu.CadastralZoning",
+                fields=("label", "national_cadastal_zoning_reference"),
+            ),
+        )
+        layers.append(
+            TileLayer(
+                "cadastral-parcels",
+                "inspire_eu.CadastralParcel",
+                fields=("label", "national_cadastral_reference"),
+                min_zoom=13,
+            ),
+        )
+    if INSPIRE_EU_THEMES.get("buildings"):
+        layers.append(
+            TileLayer(
+                "buildings",
+                "inspire_eu.Building",
+                fields=("local_id", "number_of_floors_above_ground"),
+                min_zoom=14,
+            ),
+        )
+    return dict({layer.name: layer for layer in layers})
+
+
+def get_model_tile_layers(model):
+    """Tile layers of a model"""
+    return [layer for layer in get_tile_layers().values() if layer.get_model() is model]
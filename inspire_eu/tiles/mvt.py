@@ -0,0 +1,255 @@
+"""Pure Python encoder of `Mapbox Vector Tiles <https://github.com/mapbox/vector-tile-spec/tree/master/2.1>`_
+
+Used by the tile layers on databases without ``ST_AsMVT``. Geometries must be in the CRS of the tile bounds
+(Web Mercator) and already clipped to them.
+"""
+import logging
+import struct
+
+log = logging.getLogger(__name__)
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+
+WIRE_VARINT = 0
+WIRE_64BIT = 1
+WIRE_LENGTH_DELIMITED = 2
+
+
+def encode_varint(value):
+    data = bytearray()
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def encode_key(number, wire_type):
+    return encode_varint((number << 3) | wire_type)
+
+
+def encode_message(number, data):
+    return encode_key(number, WIRE_LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+
+def encode_packed(number, values):
+    return encode_message(number, b"".join(encode_varint(value) for value in values))
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def encode_value(value):
+    """``Value`` message of a property"""
+    if isinstance(value, bool):
+        return encode_key(7, WIRE_VARINT) + encode_varint(int(value))
+    if isinstance(value, int):
+        if value < 0:
+            return encode_key(6, WIRE_VARINT) + encode_varint(zigzag(value))
+        return encode_key(5, WIRE_VARINT) + encode_varint(value)
+    if isinstance(value, float):
+        return encode_key(3, WIRE_64BIT) + struct.pack("<d", value)
+    return encode_message(1, str(value).encode())
+
+
+class TileTransform:
+    """Maps coordinates of the tile CRS to integer coordinates of the tile grid (origin at the top left)"""
+
+    def __init__(self, bounds, extent=4096):
+        xmin, ymin, xmax, ymax = bounds
+        self.xmin = xmin
+        self.ymax = ymax
+        self.sx = extent / (xmax - xmin)
+        self.sy = extent / (ymax - ymin)
+
+    def __call__(self, coords):
+        points = list()
+        for x, y in coords:
+            point = (round((x - self.xmin) * self.sx), round((self.ymax - y) * self.sy))
+            if not points or points[-1] != point:
+                points.append(point)
+        return points
+
+
+GEOM_TYPES = dict(
+    {
+        "Point": GEOM_POINT,
+        "LineString": GEOM_LINESTRING,
+        "LinearRing": GEOM_LINESTRING,
+        "Polygon": GEOM_POLYGON,
+    },
+)
+
+
+def iter_parts(geometry):
+    """Simple, non empty, geometries of a geometry"""
+    if geometry.empty:
+        return
+    if geometry.geom_type in GEOM_TYPES:
+        yield geometry
+        return
+    for part in geometry:
+        yield from iter_parts(part)
+
+
+def ring_area(points):
+    """Twice the signed area of a ring, positive when it is clockwise on screen (y axis down)"""
+    area = 0
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        area += x1 * y2 - x2 * y1
+    return area
+
+
+class GeometryEncoder:
+    """Encodes GEOS geometries to the commands of the ``geometry`` field of a feature"""
+
+    def __init__(self, transform):
+        self.transform = transform
+        self.cursor = (0, 0)
+        self.commands = list()
+
+    def move_to(self, points):
+        self.commands.append(command(CMD_MOVE_TO, len(points)))
+        self.add_points(points)
+
+    def line_to(self, points):
+        self.commands.append(command(CMD_LINE_TO, len(points)))
+        self.add_points(points)
+
+    def add_points(self, points):
+        cx, cy = self.cursor
+        for x, y in points:
+            self.commands.append(zigzag(x - cx))
+            self.commands.append(zigzag(y - cy))
+            cx, cy = x, y
+        self.cursor = (cx, cy)
+
+    def add_ring(self, coords, exterior):
+        points = self.transform(coords)
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        if len(points) < 3:
+            return False
+        area = ring_area(points)
+        if area == 0:
+            return False
+        # Exterior rings are clockwise and interior rings counter-clockwise
+        if (area > 0) != exterior:
+            points.reverse()
+        self.move_to(points[:1])
+        self.line_to(points[1:])
+        self.commands.append(command(CMD_CLOSE_PATH, 1))
+        return True
+
+    def add_polygon(self, polygon):
+        if not self.add_ring(polygon.exterior_ring.coords, exterior=True):
+            return False
+        for ring in polygon[1:]:
+            self.add_ring(ring.coords, exterior=False)
+        return True
+
+    def add_line(self, line):
+        points = self.transform(line.coords)
+        if len(points) < 2:
+            return False
+        self.move_to(points[:1])
+        self.line_to(points[1:])
+        return True
+
+    def encode(self, geometry):
+        """Geometry type and commands, or ``(None, None)`` when nothing is left at the tile resolution
+
+        Of geometry collections, as the ones an intersection may return, only the parts with the highest
+        dimension are kept.
+        """
+        parts = list(iter_parts(geometry))
+        if not parts:
+            return None, None
+        geom_type = max(GEOM_TYPES[part.geom_type] for part in parts)
+        parts = [part for part in parts if GEOM_TYPES[part.geom_type] == geom_type]
+        if geom_type == GEOM_POINT:
+            self.move_to([self.transform([part.coords])[0] for part in parts])
+            return geom_type, self.commands
+        add = self.add_polygon if geom_type == GEOM_POLYGON else self.add_line
+        added = [add(part) for part in parts]
+        if not any(added):
+            return None, None
+        return geom_type, self.commands
+
+
+class LayerEncoder:
+    """Vector tile layer
+
+    Args:
+        name (str): Name of the layer
+        bounds (tuple): ``(xmin, ymin, xmax, ymax)`` of the tile
+        extent (int, optional): Size of the tile grid. Defaults to 4096.
+    """
+
+    version = 2
+
+    def __init__(self, name, bounds, extent=4096):
+        self.name = name
+        self.extent = extent
+        self.transform = TileTransform(bounds, extent)
+        self.keys = dict()
+        self.values = dict()
+        self.features = list()
+
+    def __len__(self):
+        return len(self.features)
+
+    def get_tags(self, properties):
+        tags = list()
+        for key, value in properties.items():
+            if value is None or value == "":
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            value = encode_value(value)
+            tags.append(self.values.setdefault(value, len(self.values)))
+        return tags
+
+    def add_feature(self, geometry, properties=None, id=None):
+        """Add a feature, unless its geometry vanishes at the tile resolution
+
+        Returns:
+            bool: Whether it was added
+        """
+        geom_type, commands = GeometryEncoder(self.transform).encode(geometry)
+        if geom_type is None:
+            return False
+        data = b""
+        if id is not None:
+            data += encode_key(1, WIRE_VARINT) + encode_varint(id)
+        tags = self.get_tags(properties or dict())
+        if tags:
+            data += encode_packed(2, tags)
+        data += encode_key(3, WIRE_VARINT) + encode_varint(geom_type)
+        data += encode_packed(4, commands)
+        self.features.append(data)
+        return True
+
+    def encode(self):
+        data = encode_key(15, WIRE_VARINT) + encode_varint(self.version)
+        data += encode_message(1, self.name.encode())
+        data += b"".join(encode_message(2, feature) for feature in self.features)
+        data += b"".join(encode_message(3, key.encode()) for key in self.keys)
+        data += b"".join(encode_message(4, value) for value in self.values)
+        data += encode_key(5, WIRE_VARINT) + encode_varint(self.extent)
+        return data
+
+
+def encode_tile(layers):
+    """Tile with the layers that have features, ``b""`` when none has"""
+    return b"".join(encode_message(3, layer.encode()) for layer in layers if len(layer))
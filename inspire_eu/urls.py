@@ -1,9 +1,28 @@
 # -*- coding: utf-8 -*-
-from django.conf.urls import url
+try:
+    from django.conf.urls import url
+except ImportError:
+    from django.urls import re_path as url
 from django.views.generic import TemplateView
 
+from . import views
+from .models import INSPIRE_EU_THEMES
+
 app_name = "inspire_eu"
 
 urlpatterns = [
+    url(r"^tiles/(?P<layer>[\w-]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.pbf$", views.tile, name="tile"),
+]
+
+if INSPIRE_EU_THEMES.get("cadastral_parcels"):
+    urlpatterns += [
+        url(
+            r"^cadastral-parcels/at-point/$",
+            views.cadastral_parcels_at_point,
+            name="cadastral_parcels_at_point",
+        ),
+    ]
+
+urlpatterns += [
     url(r"", TemplateView.as_view(template_name="base.html")),
 ]
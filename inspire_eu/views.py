@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.gis.gdal import GDALException, SRSException
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET, require_http_methods
+
+try:
+    from django.utils.translation import gettext as _
+except ImportError:
+    from django.utils.translation import ugettext as _
+
+log = logging.getLogger(__name__)
+
+try:
+    INSPIRE_EU_TILES_MAX_AGE = settings.INSPIRE_EU_TILES_MAX_AGE
+except AttributeError:
+    INSPIRE_EU_TILES_MAX_AGE = 3600
+
+CADASTRAL_PARCELS_AT_POINT_MAX_POINTS = 1000
+
+
+def cadastral_parcel_to_dict(parcel):
+    if parcel is None:
+        return None
+    return dict(
+        {
+            "id": parcel.pk,
+            "namespace": parcel.namespace.code,
+            "local_id": parcel.local_id,
+            "version_id": parcel.version_id,
+            "label": parcel.label,
+            "national_cadastral_reference": parcel.national_cadastral_reference,
+            "cadastral_zoning": parcel.cadastral_zoning_id,
+        },
+    )
+
+
+@require_http_methods(["GET", "POST"])
+def cadastral_parcels_at_point(request):
+    """Cadastral parcels containing a point, as JSON
+
+    ``GET ?lon=-3.7038&lat=40.4168[&srid=4326]`` returns ``{"parcels": [...]}`` with every parcel containing the
+    point. ``POST {"points": [[lon, lat], ...], "srid": 4326}`` returns ``{"parcels": [...]}`` with the parcel
+    containing every point, or ``null``, in the same order. ``POST`` requests go through the CSRF protection:
+    they must carry the CSRF token, unless a project wraps the view with its own checks.
+    """
+    from .models.cadastral_parcels import CadastralParcel
+
+    qs = CadastralParcel.objects.select_related("namespace")
+    try:
+        if request.method == "POST":
+            data = json.loads(request.body)
+            points = [(float(lon), float(lat)) for lon, lat in data["points"]]
+            if len(points) > CADASTRAL_PARCELS_AT_POINT_MAX_POINTS:
+                return JsonResponse(
+                    {"error": _("At most %(max)d points") % {"max": CADASTRAL_PARCELS_AT_POINT_MAX_POINTS}},
+                    status=400,
+                )
+            parcels = qs.at_points(points, srid=int(data.get("srid", 4326)))
+        else:
+            parcels = qs.at_point(
+                float(request.GET["lon"]),
+                float(request.GET["lat"]),
+                srid=int(request.GET.get("srid", 4326)),
+            )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return JsonResponse({"error": _("Invalid coordinates")}, status=400)
+    except (GDALException, SRSException):
+        return JsonResponse({"error": _("Invalid SRID")}, status=400)
+    return JsonResponse({"parcels": [cadastral_parcel_to_dict(parcel) for parcel in parcels]})
+
+
+def get_tile_digest(data):
+    """Digest of an encoded tile for its ``ETag``, not used for security (FIPS builds refuse MD5 otherwise)"""
+    try:
+        return hashlib.md5(data, usedforsecurity=False).hexdigest()
+    except TypeError:
+        # Python < 3.9
+        return hashlib.md5(data).hexdigest()
+
+
+@require_GET
+def tile(request, layer, z, x, y):
+    """Mapbox Vector Tile of a layer, ``204 No Content`` when it has no feature
+
+    Responses can be cached for ``INSPIRE_EU_TILES_MAX_AGE`` seconds and carry an ``ETag``, so revalidations
+    get a ``304 Not Modified`` when the tile did not change.
+    """
+    from .tiles import get_cached_tile, get_tile_layers, is_valid_tile
+
+    z, x, y = int(z), int(x), int(y)
+    tile_layer = get_tile_layers().get(layer)
+    if tile_layer is None or not is_valid_tile(z, x, y):
+        raise Http404
+    data = get_cached_tile(tile_layer, z, x, y)
+    etag = quote_etag(get_tile_digest(data))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(data, status=200 if data else 204, content_type="application/vnd.mapbox-vector-tile")
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=INSPIRE_EU_TILES_MAX_AGE)
+    return response